@@ -0,0 +1,30 @@
+"""drop ctr from ad_metric_rollups
+
+Revision ID: 2b76bfa8fc3d
+Revises: f60acbdd5916
+Create Date: 2026-10-18 12:03:04.756826
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b76bfa8fc3d'
+down_revision: Union[str, None] = 'f60acbdd5916'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a sum of CTRs isn't a CTR, the charts recompute it from the summed clicks and impressions
+    op.drop_column('ad_metric_rollups', 'ctr')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # comes back empty, rebuild the rollups to fill it
+    op.add_column('ad_metric_rollups', sa.Column('ctr', sa.Float(), nullable=True))
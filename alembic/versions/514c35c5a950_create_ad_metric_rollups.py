@@ -0,0 +1,67 @@
+"""Create ad_metric_rollups
+
+Revision ID: 514c35c5a950
+Revises: 55177957acf7
+Create Date: 2026-10-18 10:03:27.640915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '514c35c5a950'
+down_revision: Union[str, None] = '55177957acf7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# bucket size in seconds of each rollup, months are 30 days like everywhere else in the charts
+ROLLUP_STEPS = {
+    'month': 30 * 86400,
+    'week': 7 * 86400,
+    'day': 86400,
+    'hour': 3600,
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ad_metric_rollups',
+        sa.Column('ad_id', sa.String(), sa.ForeignKey('ads.id'), nullable=False),
+        sa.Column('device', postgresql.ENUM('mobile', 'desktop', 'tablet', 'other', name='devicetype', create_type=False), nullable=False),
+        sa.Column('granularity', postgresql.ENUM('month', 'week', 'day', 'hour', name='periodtype', create_type=False), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('campaign_id', sa.String(), sa.ForeignKey('campaigns.id'), nullable=False),
+        sa.Column('ctr', sa.Float(), nullable=True),
+        sa.Column('impressions', sa.Integer(), nullable=True),
+        sa.Column('views', sa.Integer(), nullable=True),
+        sa.Column('clicks', sa.Integer(), nullable=True),
+        sa.Column('spend', sa.Integer(), nullable=True),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('ad_id', 'device', 'granularity', 'bucket_start'),
+    )
+    op.create_index('ix_ad_metric_rollups_campaign', 'ad_metric_rollups', ['campaign_id', 'granularity', 'bucket_start'])
+
+    # backfill from the metrics already ingested, new ones are rolled up as they are written
+    for granularity, step in ROLLUP_STEPS.items():
+        op.execute(f"""
+            INSERT INTO ad_metric_rollups
+                (ad_id, campaign_id, device, granularity, bucket_start, ctr, impressions, views, clicks, spend, samples, updated_at)
+            SELECT m.ad_id, a.campaign_id, m.device, '{granularity}',
+                   timezone('UTC', to_timestamp(floor(extract(epoch FROM m.date) / {step}) * {step})) AS bucket_start,
+                   sum(m.ctr), sum(m.impressions), sum(m.views), sum(m.clicks), sum(m.spend), count(*), localtimestamp
+            FROM ad_metrics m
+            JOIN ads a ON a.id = m.ad_id
+            WHERE m.date IS NOT NULL
+            GROUP BY m.ad_id, a.campaign_id, m.device, bucket_start
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ad_metric_rollups_campaign', table_name='ad_metric_rollups')
+    op.drop_table('ad_metric_rollups')
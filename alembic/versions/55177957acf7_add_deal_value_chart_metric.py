@@ -0,0 +1,29 @@
+"""Add deal_value chart metric
+
+Revision ID: 55177957acf7
+Revises: 17d803ff1b36
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '55177957acf7'
+down_revision: Union[str, None] = '17d803ff1b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TYPE chartmetric ADD VALUE IF NOT EXISTS 'deal_value'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # postgres can't drop a value from an enum, charts using it have to be removed by hand
+    pass
@@ -0,0 +1,114 @@
+"""Partition ad_metrics by month
+
+Revision ID: 96bcd5146f59
+Revises: f930e875ffbb
+Create Date: 2026-10-18 12:41:09.551872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '96bcd5146f59'
+down_revision: Union[str, None] = 'f930e875ffbb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, ad_id, ctr, impressions, views, clicks, device, spend, date, hour, day, month, year, updated_at"
+
+
+def ad_metrics_columns() -> list[sa.Column]:
+    return [
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('ad_id', sa.String(), sa.ForeignKey('ads.id'), nullable=False),
+        sa.Column('ctr', sa.Float(), nullable=True),
+        sa.Column('impressions', sa.Integer(), nullable=True),
+        sa.Column('views', sa.Integer(), nullable=True),
+        sa.Column('clicks', sa.Integer(), nullable=True),
+        sa.Column('device', postgresql.ENUM('mobile', 'desktop', 'tablet', 'other', name='devicetype', create_type=False), nullable=False),
+        sa.Column('spend', sa.Integer(), nullable=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('hour', sa.Integer(), nullable=True),
+        sa.Column('day', sa.Integer(), nullable=True),
+        sa.Column('month', sa.Integer(), nullable=True),
+        sa.Column('year', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    ]
+
+
+def create_indexes(table: str) -> None:
+    op.create_index(f'ux_{table}_ad_id_date_device', table, ['ad_id', 'date', 'device'], unique=True)
+    op.create_index(
+        f'ix_{table}_ad_id_date',
+        table,
+        ['ad_id', 'date'],
+        postgresql_include=['device', 'clicks', 'impressions', 'ctr', 'spend', 'views'],
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.rename_table('ad_metrics', 'ad_metrics_unpartitioned')
+    op.execute("ALTER INDEX ad_metrics_pkey RENAME TO ad_metrics_unpartitioned_pkey")
+    op.execute("ALTER INDEX ux_ad_metrics_ad_id_date_device RENAME TO ux_ad_metrics_unpartitioned_ad_id_date_device")
+    op.execute("ALTER INDEX ix_ad_metrics_ad_id_date RENAME TO ix_ad_metrics_unpartitioned_ad_id_date")
+    op.execute("ALTER TABLE ad_metrics_unpartitioned RENAME CONSTRAINT ad_metrics_ad_id_fkey TO ad_metrics_unpartitioned_ad_id_fkey")
+
+    # the partition key has to be in the primary key and can't be null
+    op.create_table(
+        'ad_metrics',
+        *ad_metrics_columns(),
+        sa.PrimaryKeyConstraint('id', 'date'),
+        postgresql_partition_by='RANGE (date)',
+    )
+    create_indexes('ad_metrics')
+
+    # one partition per month of existing data, plus the next three months
+    op.execute("""
+        DO $$
+        DECLARE
+            partition_month timestamp := date_trunc('month', coalesce((SELECT min(date) FROM ad_metrics_unpartitioned), now()));
+            last_month timestamp := greatest(
+                date_trunc('month', (SELECT max(date) FROM ad_metrics_unpartitioned)),
+                date_trunc('month', now()) + interval '3 months'
+            );
+        BEGIN
+            WHILE partition_month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF ad_metrics FOR VALUES FROM (%L) TO (%L)',
+                    'ad_metrics_' || to_char(partition_month, 'YYYY_MM'),
+                    partition_month,
+                    partition_month + interval '1 month'
+                );
+                partition_month := partition_month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+
+    # metrics without a date never showed up in a chart, they are dropped
+    op.execute(f"""
+        INSERT INTO ad_metrics ({COLUMNS})
+        SELECT {COLUMNS} FROM ad_metrics_unpartitioned WHERE date IS NOT NULL
+    """)
+    op.drop_table('ad_metrics_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table(
+        'ad_metrics_unpartitioned',
+        *ad_metrics_columns(),
+        sa.PrimaryKeyConstraint('id', name='ad_metrics_unpartitioned_pkey'),
+    )
+    op.alter_column('ad_metrics_unpartitioned', 'date', nullable=True)
+    op.execute(f"INSERT INTO ad_metrics_unpartitioned ({COLUMNS}) SELECT {COLUMNS} FROM ad_metrics")
+
+    # dropping the parent drops every partition with it
+    op.drop_table('ad_metrics')
+    op.rename_table('ad_metrics_unpartitioned', 'ad_metrics')
+    op.execute("ALTER INDEX ad_metrics_unpartitioned_pkey RENAME TO ad_metrics_pkey")
+    op.execute("ALTER TABLE ad_metrics RENAME CONSTRAINT ad_metrics_unpartitioned_ad_id_fkey TO ad_metrics_ad_id_fkey")
+    create_indexes('ad_metrics')
@@ -0,0 +1,35 @@
+"""Create sync checkpoints
+
+Revision ID: bcb1958bdce1
+Revises: 96bcd5146f59
+Create Date: 2026-10-18 11:28:54.144302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bcb1958bdce1'
+down_revision: Union[str, None] = '96bcd5146f59'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sync_checkpoints',
+        sa.Column('integration_id', sa.String(), sa.ForeignKey('account_configs.id'), nullable=False),
+        sa.Column('resource', sa.String(), nullable=False),
+        sa.Column('synced_until', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('integration_id', 'resource'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sync_checkpoints')
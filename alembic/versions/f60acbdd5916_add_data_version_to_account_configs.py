@@ -0,0 +1,28 @@
+"""add data_version to account_configs
+
+Revision ID: f60acbdd5916
+Revises: bcb1958bdce1
+Create Date: 2026-10-18 11:36:28.844250
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f60acbdd5916'
+down_revision: Union[str, None] = 'bcb1958bdce1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('account_configs', sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('account_configs', 'data_version')
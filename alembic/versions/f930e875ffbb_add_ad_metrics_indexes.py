@@ -0,0 +1,73 @@
+"""Add ad_metrics indexes
+
+Revision ID: f930e875ffbb
+Revises: 514c35c5a950
+Create Date: 2026-10-18 11:20:54.113087
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f930e875ffbb'
+down_revision: Union[str, None] = '514c35c5a950'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_STEPS = {
+    'month': 30 * 86400,
+    'week': 7 * 86400,
+    'day': 86400,
+    'hour': 3600,
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the unique index can't be built while there are duplicates, keep the most recently updated row
+    op.execute("""
+        CREATE TEMPORARY TABLE duplicated_ad_metrics ON COMMIT DROP AS
+        SELECT id, ad_id FROM (
+            SELECT id, ad_id, row_number() OVER (
+                PARTITION BY ad_id, date, device ORDER BY updated_at DESC, id
+            ) AS position
+            FROM ad_metrics
+            WHERE date IS NOT NULL
+        ) ranked
+        WHERE position > 1
+    """)
+    op.execute("DELETE FROM ad_metrics WHERE id IN (SELECT id FROM duplicated_ad_metrics)")
+
+    # the rollups of those ads summed the duplicates too
+    op.execute("DELETE FROM ad_metric_rollups WHERE ad_id IN (SELECT ad_id FROM duplicated_ad_metrics)")
+    for granularity, step in ROLLUP_STEPS.items():
+        op.execute(f"""
+            INSERT INTO ad_metric_rollups
+                (ad_id, campaign_id, device, granularity, bucket_start, ctr, impressions, views, clicks, spend, samples, updated_at)
+            SELECT m.ad_id, a.campaign_id, m.device, '{granularity}',
+                   timezone('UTC', to_timestamp(floor(extract(epoch FROM m.date) / {step}) * {step})) AS bucket_start,
+                   sum(m.ctr), sum(m.impressions), sum(m.views), sum(m.clicks), sum(m.spend), count(*), localtimestamp
+            FROM ad_metrics m
+            JOIN ads a ON a.id = m.ad_id
+            WHERE m.date IS NOT NULL AND m.ad_id IN (SELECT ad_id FROM duplicated_ad_metrics)
+            GROUP BY m.ad_id, a.campaign_id, m.device, bucket_start
+        """)
+
+    op.create_index('ux_ad_metrics_ad_id_date_device', 'ad_metrics', ['ad_id', 'date', 'device'], unique=True)
+    op.create_index(
+        'ix_ad_metrics_ad_id_date',
+        'ad_metrics',
+        ['ad_id', 'date'],
+        postgresql_include=['device', 'clicks', 'impressions', 'ctr', 'spend', 'views'],
+    )
+    op.create_index('ix_ads_campaign_id', 'ads', ['campaign_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ads_campaign_id', table_name='ads')
+    op.drop_index('ix_ad_metrics_ad_id_date', table_name='ad_metrics')
+    op.drop_index('ux_ad_metrics_ad_id_date_device', table_name='ad_metrics')
@@ -13,6 +13,26 @@ class Settings(BaseSettings):
     APP_ID: int
     APP_SECRET: str
     ASSISTANT_ID: str
+    # chart queries a request runs at once, each on its own pooled connection
+    CHART_DATA_CONCURRENCY: int = 4
+    # the same source/metric/period shown in several charts of a dashboard is only queried once
+    CHART_DEDUPE_REQUESTS: bool = True
+    # chart data cached in process, until the integration is refreshed or the TTL ends. 0 entries disables it
+    CHART_CACHE_MAX_ENTRIES: int = 512
+    CHART_CACHE_TTL_SECONDS: float = 3600
+    # rows fetched per round trip from the server-side cursor of the streaming chart endpoint
+    CHART_STREAM_BATCH_SIZE: int = 1000
+    # response bodies shorter than this (in bytes) go out uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = 1000
+    # Graph API requests in flight at once during a Meta Ads refresh
+    META_CONCURRENCY: int = 4
+    # 'per_ad' asks the insights of each ad, 'report' runs one async insights report for the whole account
+    META_INSIGHTS_MODE: str = 'per_ad'
+    META_GRAPH_URL: str = 'https://graph.facebook.com/v22.0'
+    META_REPORT_POLL_SECONDS: float = 5
+    META_REPORT_TIMEOUT_SECONDS: float = 1800
+    # days before the latest stored metric that are requested again on each refresh
+    META_ATTRIBUTION_WINDOW_DAYS: int = 3
 
     class Config:
         env_file = ".env"
@@ -4,19 +4,25 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config.application import get_http_client
-from app.config.database import create_tables
+from app.config.application import http_client
+from app.config.database import create_tables, AsyncSessionLocal
+from app.repositories.ad_metric_partition import AdMetricPartitionRepository
 from app.routers import insights, account, account_config, chart, refresh, campaign, ad, chat, event
+from app.utils.compression import CompressionMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_tables()
 
+    # partitions for the coming months, older ones are created when metrics for them are written
+    async with AsyncSessionLocal() as session:
+        await AdMetricPartitionRepository(session).ensure_ahead()
+
     yield  # Server start taking requests
 
     # shutdown logic
-    await get_http_client().aclose()
+    await http_client.aclose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -41,6 +47,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# chart data and chat histories are large JSON bodies, sent to the frontend hosted out of S3
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(insights.router)
 app.include_router(account.router)
 app.include_router(account_config.router)
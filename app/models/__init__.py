@@ -4,11 +4,13 @@ from .account import Account
 from .account_config import AccountConfig, AccountType
 from .ad import Ad
 from .ad_metric import AdMetric, DeviceType
+from .ad_metric_rollup import AdMetricRollup
 from .campaign import Campaign
 from .chart import Chart, ChartType
 from .chart_source import ChartSource, ChartMetric, SourceTable
 from .event import Event
 from .period import Period
+from .sync_checkpoint import SyncCheckpoint
 
 from .message import Message
 from .deal import Deal
@@ -23,3 +23,5 @@ class AccountConfig(Base):
     api_secret: Mapped[str] = mapped_column(nullable=True)
     access_token: Mapped[str]  = mapped_column(nullable=True)
     last_refresh: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    # bumped every time the integration data is refreshed, cached chart data of older versions is stale
+    data_version: Mapped[int] = mapped_column(default=0, server_default="0")
@@ -11,7 +11,7 @@ class Ad(Base):
     id: Mapped[str] = mapped_column(primary_key=True)
     remote_id: Mapped[str]
     integration_id: Mapped[str] = mapped_column(ForeignKey("account_configs.id"))
-    campaign_id: Mapped[str] = mapped_column(ForeignKey("campaigns.id"))
+    campaign_id: Mapped[str] = mapped_column(ForeignKey("campaigns.id"), index=True)
     name: Mapped[str]
     created_at: Mapped[datetime] = mapped_column(nullable=True)
     updated_at: Mapped[datetime] = mapped_column(default=datetime.now())
@@ -2,7 +2,7 @@ import enum
 from datetime import datetime
 
 from dateutil import parser
-from sqlalchemy import ForeignKey, Enum, Float
+from sqlalchemy import ForeignKey, Enum, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.config.database import Base
@@ -18,6 +18,19 @@ class DeviceType(str, enum.Enum):
 
 class AdMetric(Base):
     __tablename__ = "ad_metrics"
+    __table_args__ = (
+        # one row per ad, date and device, also serves the lookup in AdMetricRepository.create_or_update
+        Index("ux_ad_metrics_ad_id_date_device", "ad_id", "date", "device", unique=True),
+        # latest date / period range scans of the charts, covering so they don't touch the heap
+        Index(
+            "ix_ad_metrics_ad_id_date",
+            "ad_id",
+            "date",
+            postgresql_include=["device", "clicks", "impressions", "ctr", "spend", "views"],
+        ),
+        # one partition per calendar month, see AdMetricPartitionRepository
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
     id: Mapped[str] = mapped_column(primary_key=True)
     ad_id: Mapped[str] = mapped_column(ForeignKey("ads.id"))
@@ -27,7 +40,8 @@ class AdMetric(Base):
     clicks: Mapped[int] = mapped_column(nullable=True)
     device: Mapped[DeviceType] = mapped_column(Enum(DeviceType))
     spend: Mapped[int] = mapped_column(nullable=True)
-    date: Mapped[datetime] = mapped_column(nullable=True)
+    # partition key, so it has to be part of the primary key
+    date: Mapped[datetime] = mapped_column(primary_key=True)
     hour: Mapped[int] = mapped_column(nullable=True)
     day: Mapped[int] = mapped_column(nullable=True)
     month: Mapped[int] = mapped_column(nullable=True)
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Enum, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config.database import Base
+from app.models.ad_metric import DeviceType
+from app.models.period import PeriodType
+
+
+class AdMetricRollup(Base):
+    """Sum of the `ad_metrics` rows of one ad and device inside a fixed hour/day/week/month bucket.
+
+    Buckets are aligned the same way the charts align them (epoch floor, 30 day months), so a rollup
+    can be re-bucketed into any chart granularity that is a multiple of its own.
+    Only metrics that can be summed are kept, ratios like the CTR are recomputed from them.
+    """
+    __tablename__ = "ad_metric_rollups"
+    __table_args__ = (
+        Index("ix_ad_metric_rollups_campaign", "campaign_id", "granularity", "bucket_start"),
+    )
+
+    ad_id: Mapped[str] = mapped_column(ForeignKey("ads.id"), primary_key=True)
+    device: Mapped[DeviceType] = mapped_column(Enum(DeviceType), primary_key=True)
+    granularity: Mapped[PeriodType] = mapped_column(Enum(PeriodType), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(primary_key=True)
+    campaign_id: Mapped[str] = mapped_column(ForeignKey("campaigns.id"))
+    impressions: Mapped[int] = mapped_column(nullable=True)
+    views: Mapped[int] = mapped_column(nullable=True)
+    clicks: Mapped[int] = mapped_column(nullable=True)
+    spend: Mapped[int] = mapped_column(nullable=True)
+    samples: Mapped[int]  # how many ad_metrics rows were summed into this bucket
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.now)
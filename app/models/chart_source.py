@@ -1,4 +1,5 @@
 import enum
+from dataclasses import dataclass
 from typing import TYPE_CHECKING, List
 
 from sqlalchemy import ForeignKey, Enum, ARRAY
@@ -23,8 +24,49 @@ class ChartMetric(str, enum.Enum):
     spend = 'spend'
     contact = 'contact'
     deal = 'deal'
+    deal_value = 'deal_value'
     message = 'message'
 
+    @property
+    def aggregation(self) -> "MetricAggregation":
+        return METRIC_AGGREGATIONS[self]
+
+
+class Aggregation(str, enum.Enum):
+    sum = 'sum'
+    count = 'count'
+    # numerator / denominator, each summed over the bucket first
+    ratio = 'ratio'
+
+
+@dataclass(frozen=True)
+class MetricAggregation:
+    """How the values of a metric combine into a bucket. Sums and counts can be summed again at any coarser
+    granularity, ratios are recomputed from their summed parts, so they are never summed themselves."""
+    kind: Aggregation
+    numerator: ChartMetric | None = None
+    denominator: ChartMetric | None = None
+    scale: float = 1
+
+    @property
+    def inputs(self) -> list[ChartMetric]:
+        """Metrics that have to be loaded (and summed) to compute this one."""
+        return [self.numerator, self.denominator] if self.kind == Aggregation.ratio else []
+
+
+METRIC_AGGREGATIONS: dict[ChartMetric, MetricAggregation] = {
+    ChartMetric.click: MetricAggregation(Aggregation.sum),
+    ChartMetric.impression: MetricAggregation(Aggregation.sum),
+    ChartMetric.spend: MetricAggregation(Aggregation.sum),
+    # Meta reports the CTR as a percentage
+    ChartMetric.ctr: MetricAggregation(Aggregation.ratio, numerator=ChartMetric.click,
+                                       denominator=ChartMetric.impression, scale=100),
+    ChartMetric.contact: MetricAggregation(Aggregation.count),
+    ChartMetric.deal: MetricAggregation(Aggregation.count),
+    ChartMetric.deal_value: MetricAggregation(Aggregation.sum),
+    ChartMetric.message: MetricAggregation(Aggregation.count),
+}
+
 
 class ChartSource(Base):
     __tablename__ = "chart_sources"
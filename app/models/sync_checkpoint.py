@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config.database import Base
+
+
+class SyncCheckpoint(Base):
+    """Until when the records of one resource (deals, contacts...) of an integration were synced."""
+    __tablename__ = "sync_checkpoints"
+
+    integration_id: Mapped[str] = mapped_column(ForeignKey("account_configs.id"), primary_key=True)
+    resource: Mapped[str] = mapped_column(primary_key=True)
+    synced_until: Mapped[datetime]
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.now)
@@ -72,6 +72,18 @@ class AccountConfigRepository:
 
         return result.scalar_one_or_none() 
 
+    async def bump_data_version(self, id: str) -> int | None:
+        result = await self.__session.execute(
+            update(AccountConfig)
+                .where(AccountConfig.id == id)
+                .values(data_version=AccountConfig.data_version + 1)
+                .returning(AccountConfig.data_version)
+        )
+
+        await self.__session.commit()
+
+        return result.scalar_one_or_none()
+
     async def delete(self, id: str) -> AccountConfig:
         result = await self.__session.execute(
             delete(AccountConfig)
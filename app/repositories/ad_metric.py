@@ -3,7 +3,8 @@ from uuid import uuid4
 from datetime import datetime
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.config.database import get_db
@@ -11,10 +12,18 @@ from app.config.database import get_db
 from app.models.ad_metric import AdMetric
 from app.models.ad import Ad
 from app.models.account_config import AccountConfig
+from app.repositories.ad_metric_partition import AdMetricPartitionRepository
+from app.repositories.ad_metric_rollup import AdMetricRollupRepository
+from app.utils.extension import Extension
+
+# 14 columns per row, well below the 32767 bind parameters postgres accepts per statement
+UPSERT_CHUNK_SIZE = 1000
 
 class AdMetricRepository:
     def __init__(self, session: AsyncSession):
         self.__session = session
+        self.__rollups = AdMetricRollupRepository(session)
+        self.__partitions = AdMetricPartitionRepository(session)
 
     async def index(self, ad_id: str) -> list[Ad]:
         result = await self.__session.execute(
@@ -25,7 +34,21 @@ class AdMetricRepository:
 
         return result.scalars().all()
     
+    async def latest_dates(self, ad_ids: list[str]) -> dict[str, datetime]:
+        """Date of the latest metric stored for each ad, ads without metrics are left out."""
+        if not ad_ids:
+            return {}
+
+        result = await self.__session.execute(
+            select(AdMetric.ad_id, func.max(AdMetric.date))
+            .where(AdMetric.ad_id.in_(ad_ids))
+            .group_by(AdMetric.ad_id)
+        )
+
+        return {ad_id: latest_date for ad_id, latest_date in result.all()}
+
     async def create(self, ad_metric: AdMetric) -> AdMetric:
+        await self.__partitions.ensure(ad_metric.date, ad_metric.date)
         await self.__session.execute(
             insert(AdMetric)
                 .values(
@@ -44,10 +67,15 @@ class AdMetricRepository:
                 ).returning(AdMetric)
         )   
 
+        await self.__rollups.refresh([ad_metric.ad_id], ad_metric.date, ad_metric.date)
+        await self.__bump_data_versions([ad_metric.ad_id])
         await self.__session.commit()
 
     async def create_or_update(self, data: AdMetric) -> AdMetric:
+        """Inserts or updates the metric of (ad, date, device). For batches use `upsert_many`."""
         try:
+            await self.__partitions.ensure(data.date, data.date)
+
             stmt = select(AdMetric).where(
                 (AdMetric.ad_id == data.ad_id) &
                 (AdMetric.date == data.date) &
@@ -68,13 +96,16 @@ class AdMetricRepository:
                 instance.month = data.month
                 instance.year = data.year
                 await self.__session.flush()
-                return instance
             else:
                 data.updated_at = datetime.now()
                 data.id = str(uuid4())
                 self.__session.add(data)
                 await self.__session.flush()
-                return data
+                instance = data
+
+            await self.__rollups.refresh([instance.ad_id], instance.date, instance.date)
+
+            return instance
 
         except SQLAlchemyError:
             if self.__session.in_transaction():
@@ -91,6 +122,67 @@ class AdMetricRepository:
                     await self.__session.rollback()
                     raise
 
+    async def upsert_many(self, metrics: list[AdMetric], chunk_size: int = UPSERT_CHUNK_SIZE) -> int:
+        """Inserts or updates many metrics with multi-row `INSERT ... ON CONFLICT (ad_id, date, device) DO UPDATE`
+        statements of `chunk_size` rows, refreshes the rollups they touch and commits once.
+
+        Metrics without a date are skipped (they have no partition). Returns how many rows were written.
+        """
+        # a statement can't update the same row twice, the last metric of an (ad, date, device) wins
+        rows = {
+            (metric.ad_id, metric.date, metric.device): metric
+            for metric in metrics
+            if metric.date is not None
+        }
+
+        if not rows:
+            return 0
+
+        dates = [date for _, date, _ in rows]
+        now = datetime.now()
+
+        try:
+            await self.__partitions.ensure(min(dates), max(dates))
+
+            for chunk in Extension.chunked(list(rows.values()), chunk_size):
+                stmt = pg_insert(AdMetric).values([
+                    dict(
+                        id=str(uuid4()),
+                        ad_id=metric.ad_id,
+                        ctr=metric.ctr,
+                        impressions=metric.impressions,
+                        views=metric.views,
+                        clicks=metric.clicks,
+                        device=metric.device,
+                        spend=metric.spend,
+                        date=metric.date,
+                        hour=metric.hour,
+                        day=metric.day,
+                        month=metric.month,
+                        year=metric.year,
+                        updated_at=now,
+                    )
+                    for metric in chunk
+                ])
+                # id is kept, spend isn't sent by every source so an update doesn't erase it
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[AdMetric.ad_id, AdMetric.date, AdMetric.device],
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in ("ctr", "impressions", "views", "clicks", "hour", "day", "month", "year",
+                                       "updated_at")
+                    },
+                )
+                await self.__session.execute(stmt)
+
+            await self.__rollups.refresh(list({ad_id for ad_id, _, _ in rows}), min(dates), max(dates))
+            await self.__session.commit()
+        except SQLAlchemyError:
+            await self.__session.rollback()
+            raise
+
+        return len(rows)
+
     async def save(self, campaign_id: int, metrics: dict) -> AdMetric:
         metric = AdMetric(
             ad_id=metrics.get("ad_id"),
@@ -100,15 +192,32 @@ class AdMetricRepository:
             clicks=metrics.get("clicks"),
             device=metrics.get("device"),
             date=metrics.get("date"),
-            hour=metrics.get("hour"),
-            day=metrics.get("day"),
-            month=metrics.get("month"),
-            year=metrics.get("year")
         )
+        # hour, day, month and year are taken from the date
+        metric.id = str(uuid4())
+        await self.__partitions.ensure(metric.date, metric.date)
         self.__session.add(metric)
-        await self.__session.commit()
+        await self.__session.flush()
         await self.__session.refresh(metric)
+
+        # the metrics of a campaign have no ad, so no rollup either
+        ad_ids = [metric.ad_id] if metric.ad_id else []
+        await self.__rollups.refresh(ad_ids, metric.date, metric.date)
+        await self.__bump_data_versions(ad_ids)
+        await self.__session.commit()
         return metric
+
+    async def __bump_data_versions(self, ad_ids: list[str]):
+        """Bumps the data version of the integrations of the ads, in the caller's transaction.
+        Writes outside of a refresh aren't followed by its bump, without this cached chart data would stay."""
+        if not ad_ids:
+            return
+
+        await self.__session.execute(
+            update(AccountConfig)
+                .where(AccountConfig.id.in_(select(Ad.integration_id).where(Ad.id.in_(ad_ids))))
+                .values(data_version=AccountConfig.data_version + 1)
+        )
     
     @classmethod
     async def get_service(cls, db: AsyncSession = Depends(get_db)):
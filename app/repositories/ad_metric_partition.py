@@ -0,0 +1,112 @@
+from datetime import datetime
+
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config.database import get_db
+
+
+def month_start(date: datetime) -> datetime:
+    return datetime(date.year, date.month, 1)
+
+
+def next_month(date: datetime) -> datetime:
+    return datetime(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"ad_metrics_{month.year}_{month.month:02d}"
+
+
+# partitions committed by this process, the ones created in an open transaction wait in the session info
+known_partitions: set[str] = set()
+PENDING_KEY = "ad_metric_partitions"
+
+
+def remember_pending_partitions(session: Session):
+    known_partitions.update(session.info.pop(PENDING_KEY, ()))
+
+
+def forget_pending_partitions(session: Session, transaction):
+    # a rollback (of a savepoint too) may have undone the CREATE TABLE, it is run again next time
+    session.info.pop(PENDING_KEY, None)
+
+
+class AdMetricPartitionRepository:
+    """Manages the monthly range partitions of `ad_metrics`.
+
+    Postgres rejects rows that don't fall in any partition, so every write path calls `ensure`
+    for the dates it is about to insert. Partitions this process has seen committed are cached.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.__session = session
+
+        sync_session = session.sync_session
+        if not event.contains(sync_session, "after_commit", remember_pending_partitions):
+            event.listen(sync_session, "after_commit", remember_pending_partitions)
+            event.listen(sync_session, "after_soft_rollback", forget_pending_partitions)
+
+    async def ensure(self, start: datetime, end: datetime):
+        """Creates the missing partitions for every month between start and end (inclusive).
+
+        Runs in the caller's transaction, which should commit soon: attaching a partition locks `ad_metrics`.
+        """
+        month, last = month_start(start), month_start(end)
+
+        while month <= last:
+            name = partition_name(month)
+
+            if name not in known_partitions:
+                await self.__session.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF ad_metrics "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                ))
+                # only known once the caller's transaction commits
+                self.__session.sync_session.info.setdefault(PENDING_KEY, set()).add(name)
+
+            month = next_month(month)
+
+    async def ensure_ahead(self, months: int = 3):
+        """Creates the partitions from the current month to `months` months ahead."""
+        end = month_start(datetime.now())
+        for _ in range(months):
+            end = next_month(end)
+
+        await self.ensure(datetime.now(), end)
+        await self.__session.commit()
+
+    async def names(self) -> list[str]:
+        result = await self.__session.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'ad_metrics' ORDER BY child.relname"
+        ))
+
+        return list(result.scalars().all())
+
+    async def detach_before(self, date: datetime) -> list[str]:
+        """Detaches (without deleting) the partitions of every month before `date`.
+
+        Their rows stop showing up in `ad_metrics` but stay in the detached tables, and the rollups
+        keep serving charts for those months. Only detach months the ingestion no longer re-sends,
+        a rollup refresh over a detached month would rebuild it from the (now missing) raw rows.
+        """
+        detached = []
+
+        for name in await self.names():
+            if name < partition_name(month_start(date)):
+                await self.__session.execute(text(f"ALTER TABLE ad_metrics DETACH PARTITION {name}"))
+                known_partitions.discard(name)
+                detached.append(name)
+
+        await self.__session.commit()
+
+        return detached
+
+    @classmethod
+    async def get_service(cls, db: AsyncSession = Depends(get_db)):
+        return cls(db)
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+from fastapi import Depends
+from sqlalchemy import select, insert, delete, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import get_db
+from app.models.ad import Ad
+from app.models.ad_metric import AdMetric
+from app.models.ad_metric_rollup import AdMetricRollup
+from app.models.chart_source import ChartMetric, Aggregation
+from app.models.period import PeriodType
+from app.schemas.chart import PeriodSchema
+from app.utils.period import timedelta_from_period, bucket_expression, floor_datetime
+
+# coarsest first, so the chart planner can pick the first one that fits
+ROLLUP_GRANULARITIES = [PeriodType.month, PeriodType.week, PeriodType.day, PeriodType.hour]
+
+# the `ad_metrics` column of each ad chart metric
+AD_METRIC_COLUMNS = {
+    ChartMetric.click: "clicks",
+    ChartMetric.impression: "impressions",
+    ChartMetric.spend: "spend",
+    ChartMetric.ctr: "ctr",
+}
+
+# summed into the rollups: the ad metrics that can be summed (see METRIC_AGGREGATIONS), a ratio is recomputed
+# from them. views has no chart metric yet, it is kept for when it does
+ROLLUP_COLUMNS = [
+    column for metric, column in AD_METRIC_COLUMNS.items() if metric.aggregation.kind != Aggregation.ratio
+] + ["views"]
+
+
+def rollup_step(granularity: PeriodType) -> timedelta:
+    return timedelta_from_period(PeriodSchema(type=granularity, amount=1))
+
+
+class AdMetricRollupRepository:
+    def __init__(self, session: AsyncSession):
+        self.__session = session
+
+    async def refresh(self, ad_ids: list[str], start: datetime, end: datetime):
+        """Recomputes, from `ad_metrics`, every rollup bucket of the given ads that overlaps [start, end].
+
+        Buckets are rebuilt instead of incremented so updated (or re-sent) metric rows are never counted twice.
+        Does not commit, the caller owns the transaction.
+        """
+        if not ad_ids:
+            return
+
+        for granularity in ROLLUP_GRANULARITIES:
+            step = rollup_step(granularity)
+            lower = floor_datetime(start, step)
+            upper = floor_datetime(end, step) + step
+
+            await self.__session.execute(
+                delete(AdMetricRollup)
+                .where(AdMetricRollup.ad_id.in_(ad_ids))
+                .where(AdMetricRollup.granularity == granularity)
+                .where(AdMetricRollup.bucket_start >= lower)
+                .where(AdMetricRollup.bucket_start < upper)
+            )
+
+            await self.__insert(
+                granularity,
+                AdMetric.ad_id.in_(ad_ids),
+                AdMetric.date >= lower,
+                AdMetric.date < upper,
+            )
+
+    async def rebuild(self):
+        """Drops every rollup and computes them again from all the raw metrics."""
+        await self.__session.execute(delete(AdMetricRollup))
+
+        for granularity in ROLLUP_GRANULARITIES:
+            await self.__insert(granularity, AdMetric.date.is_not(None))
+
+        await self.__session.commit()
+
+    async def __insert(self, granularity: PeriodType, *filters):
+        bucket_start = func.timezone(
+            "UTC", func.to_timestamp(bucket_expression(AdMetric.date, PeriodSchema(type=granularity, amount=1)))
+        ).label("bucket_start")
+
+        await self.__session.execute(
+            insert(AdMetricRollup).from_select(
+                ["ad_id", "campaign_id", "device", "granularity", "bucket_start", *ROLLUP_COLUMNS, "samples", "updated_at"],
+                select(
+                    AdMetric.ad_id,
+                    Ad.campaign_id,
+                    AdMetric.device,
+                    literal(granularity, AdMetricRollup.granularity.type),
+                    bucket_start,
+                    *(func.sum(getattr(AdMetric, column)) for column in ROLLUP_COLUMNS),
+                    func.count(),
+                    func.localtimestamp(),
+                )
+                .join(Ad, Ad.id == AdMetric.ad_id)
+                .where(*filters)
+                .group_by(AdMetric.ad_id, Ad.campaign_id, AdMetric.device, bucket_start)
+            )
+        )
+
+    @classmethod
+    async def get_service(cls, db: AsyncSession = Depends(get_db)):
+        return cls(db)
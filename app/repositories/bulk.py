@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+
+from sqlalchemy import tuple_, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.extension import Extension
+
+# rows per INSERT, ~10 columns each stays well below the 32767 bind parameters of postgres
+INSERT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class BulkWriteResult:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+
+async def insert_ignoring_conflicts(
+    session: AsyncSession,
+    model,
+    rows: list[dict],
+    conflict_column: str = 'remote_id',
+    chunk_size: int = INSERT_CHUNK_SIZE,
+) -> BulkWriteResult:
+    """Inserts `rows` with multi-row `INSERT ... ON CONFLICT (conflict_column) DO NOTHING` statements,
+    all in one transaction. Rows that already exist (or repeat in `rows`) are counted as skipped."""
+    result = BulkWriteResult()
+
+    try:
+        for chunk in Extension.chunked(rows, chunk_size):
+            stmt = (
+                insert(model)
+                .on_conflict_do_nothing(index_elements=[conflict_column])
+                # only the rows actually inserted come back
+                .returning(model.id)
+            )
+            # sqlalchemy batches the parameter list into multi-row VALUES ("insertmanyvalues")
+            inserted = len((await session.execute(stmt, chunk)).all())
+
+            result.inserted += inserted
+            result.skipped += len(chunk) - inserted
+
+        await session.commit()
+    except SQLAlchemyError:
+        await session.rollback()
+        raise
+
+    return result
+
+
+async def upsert_changed(
+    session: AsyncSession,
+    model,
+    rows: list[dict],
+    update_columns: list[str],
+    conflict_column: str = 'remote_id',
+    chunk_size: int = INSERT_CHUNK_SIZE,
+) -> BulkWriteResult:
+    """Inserts `rows`, updating `update_columns` of the rows that already exist, all in one transaction.
+
+    Existing rows are only rewritten when one of `update_columns` changed, unchanged ones are counted
+    as skipped. When `rows` repeats a key, the last one wins.
+    """
+    result = BulkWriteResult()
+    # a statement can't update the same row twice
+    rows = list({row[conflict_column]: row for row in rows}.values())
+
+    try:
+        for chunk in Extension.chunked(rows, chunk_size):
+            stmt = insert(model)
+            stmt = (
+                stmt.on_conflict_do_update(
+                    index_elements=[conflict_column],
+                    set_={column: stmt.excluded[column] for column in update_columns},
+                    where=tuple_(*(model.__table__.c[column] for column in update_columns))
+                    .is_distinct_from(tuple_(*(stmt.excluded[column] for column in update_columns))),
+                )
+                # xmax is 0 for a freshly inserted row, and set when the row was updated
+                .returning(literal_column("xmax = 0"))
+            )
+            written = (await session.execute(stmt, chunk)).scalars().all()
+            inserted = sum(1 for was_inserted in written if was_inserted)
+
+            result.inserted += inserted
+            result.updated += len(written) - inserted
+            result.skipped += len(chunk) - len(written)
+
+        await session.commit()
+    except SQLAlchemyError:
+        await session.rollback()
+        raise
+
+    return result
@@ -6,32 +6,44 @@ from datetime import datetime
 
 from app.config.database import get_db
 from app.models.contact import Contact
+from app.repositories.bulk import BulkWriteResult, insert_ignoring_conflicts, upsert_changed
+
+# columns refreshed when the CRM sends a contact again
+UPDATE_COLUMNS = ["email", "first_name", "last_name", "created_at", "source"]
+
 
 class ContactRepository:
     def __init__(self, session: AsyncSession):
         self.__session = session
 
-    async def create(self, contact: Contact) -> Contact:
-        insert_stmt = insert(Contact).values(
+    @staticmethod
+    def __values(contact: Contact) -> dict:
+        return dict(
             id=contact.id,
             integration_id=contact.integration_id,
             remote_id=contact.remote_id,
             email=contact.email,
             first_name=contact.first_name,
+            last_name=contact.last_name,
             created_at=contact.created_at,
-            source=contact.source
-        ).on_conflict_do_nothing(index_elements=['remote_id'])
+            source=contact.source,
+        )
+
+    async def create(self, contact: Contact) -> Contact:
+        insert_stmt = insert(Contact).values(self.__values(contact)).on_conflict_do_nothing(index_elements=['remote_id'])
 
         await self.__session.execute(insert_stmt)
         await self.__session.commit()
 
         return contact
 
-    async def create_many(self, contacts: list[Contact]) -> list[Contact]:
-        for contact in contacts:
-            await self.create(contact)
+    async def create_many(self, contacts: list[Contact]) -> BulkWriteResult:
+        """Inserts all the contacts in one transaction, skipping the remote ids already stored."""
+        return await insert_ignoring_conflicts(self.__session, Contact, [self.__values(contact) for contact in contacts])
 
-        return contacts
+    async def upsert_many(self, contacts: list[Contact]) -> BulkWriteResult:
+        """Inserts the new contacts and updates the stored ones that changed, in one transaction."""
+        return await upsert_changed(self.__session, Contact, [self.__values(contact) for contact in contacts], UPDATE_COLUMNS)
 
     async def get_or_create(
         self,
@@ -4,13 +4,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.config.database import get_db
 from app.models.deal import Deal
+from app.repositories.bulk import BulkWriteResult, insert_ignoring_conflicts, upsert_changed
+
+# columns refreshed when the CRM sends a deal again
+UPDATE_COLUMNS = ["contact_id", "title", "status", "value", "currency", "created_at", "closed_at"]
+
 
 class DealRepository:
     def __init__(self, session: AsyncSession):
         self.__session = session
 
-    async def create(self, deal: Deal) -> Deal:
-        insert_stmt = insert(Deal).values(
+    @staticmethod
+    def __values(deal: Deal) -> dict:
+        return dict(
             id=deal.id,
             remote_id=deal.remote_id,
             contact_id=deal.contact_id,
@@ -20,19 +26,24 @@ class DealRepository:
             value=deal.value,
             currency=deal.currency,
             created_at=deal.created_at,
-            closed_at=deal.closed_at
-        ).on_conflict_do_nothing(index_elements=['remote_id'])
+            closed_at=deal.closed_at,
+        )
+
+    async def create(self, deal: Deal) -> Deal:
+        insert_stmt = insert(Deal).values(self.__values(deal)).on_conflict_do_nothing(index_elements=['remote_id'])
 
         await self.__session.execute(insert_stmt)
         await self.__session.commit()
 
         return deal
-    
-    async def create_many(self, deals: list[Deal]) -> list[Deal]:
-        for deal in deals:
-            await self.create(deal)
-        
-        return deals
+
+    async def create_many(self, deals: list[Deal]) -> BulkWriteResult:
+        """Inserts all the deals in one transaction, skipping the remote ids already stored."""
+        return await insert_ignoring_conflicts(self.__session, Deal, [self.__values(deal) for deal in deals])
+
+    async def upsert_many(self, deals: list[Deal]) -> BulkWriteResult:
+        """Inserts the new deals and updates the stored ones that changed, in one transaction."""
+        return await upsert_changed(self.__session, Deal, [self.__values(deal) for deal in deals], UPDATE_COLUMNS)
 
     async def get_or_create(
         self,
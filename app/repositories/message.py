@@ -5,32 +5,42 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.config.database import get_db
 from app.models.message import Message
+from app.repositories.bulk import BulkWriteResult, insert_ignoring_conflicts, upsert_changed
+
+# columns refreshed when the CRM sends a message again
+UPDATE_COLUMNS = ["subject", "priority", "create_date"]
+
 
 class MessageRepository:
     def __init__(self, session: AsyncSession):
         self.__session = session
 
-    async def create(self, message: Message) -> Message:
-        insert_stmt = insert(Message).values(
+    @staticmethod
+    def __values(message: Message) -> dict:
+        return dict(
             id=message.id,
             integration_id=message.integration_id,
             remote_id=message.remote_id,
             subject=message.subject,
             priority=message.priority,
-            create_date=message.create_date
-        ).on_conflict_do_nothing(index_elements=['remote_id'])
+            create_date=message.create_date,
+        )
+
+    async def create(self, message: Message) -> Message:
+        insert_stmt = insert(Message).values(self.__values(message)).on_conflict_do_nothing(index_elements=['remote_id'])
 
         await self.__session.execute(insert_stmt)
-        
         await self.__session.commit()
 
         return message
-    
-    async def create_many(self, messages: list[Message]) -> list[Message]:
-        for message in messages:
-            await self.create(message)
 
-        return messages
+    async def create_many(self, messages: list[Message]) -> BulkWriteResult:
+        """Inserts all the messages in one transaction, skipping the remote ids already stored."""
+        return await insert_ignoring_conflicts(self.__session, Message, [self.__values(message) for message in messages])
+
+    async def upsert_many(self, messages: list[Message]) -> BulkWriteResult:
+        """Inserts the new messages and updates the stored ones that changed, in one transaction."""
+        return await upsert_changed(self.__session, Message, [self.__values(message) for message in messages], UPDATE_COLUMNS)
 
     async def get_or_create(
         self,
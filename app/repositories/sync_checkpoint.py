@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import get_db
+from app.models.sync_checkpoint import SyncCheckpoint
+
+
+class SyncCheckpointRepository:
+    def __init__(self, session: AsyncSession):
+        self.__session = session
+
+    async def get(self, integration_id: str, resource: str) -> datetime | None:
+        result = await self.__session.execute(
+            select(SyncCheckpoint.synced_until)
+            .where(SyncCheckpoint.integration_id == integration_id)
+            .where(SyncCheckpoint.resource == resource)
+        )
+
+        return result.scalar_one_or_none()
+
+    async def save(self, integration_id: str, resource: str, synced_until: datetime):
+        stmt = insert(SyncCheckpoint).values(
+            integration_id=integration_id,
+            resource=resource,
+            synced_until=synced_until,
+            updated_at=datetime.now(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SyncCheckpoint.integration_id, SyncCheckpoint.resource],
+            set_={"synced_until": stmt.excluded.synced_until, "updated_at": stmt.excluded.updated_at},
+        )
+
+        await self.__session.execute(stmt)
+        await self.__session.commit()
+
+    @classmethod
+    async def get_service(cls, db: AsyncSession = Depends(get_db)):
+        return cls(db)
@@ -7,7 +7,7 @@ from app.repositories.message import MessageRepository
 from app.repositories.campaign import CampaignRepository
 from app.repositories.ad import AdRepository
 from app.repositories.ad_metric import AdMetricRepository
-from app.services.activecampaign_service import get_campaign_links, get_campaigns, get_campaign_report, get_contacts, get_deals, get_contact_activities
+from app.services.activecampaign_service import ActiveCampaignClient
 from datetime import datetime, timezone
 
 router = APIRouter(
@@ -16,12 +16,13 @@ router = APIRouter(
 )
 
 @router.post("/sync-campaigns")
-async def sync_campaigns(db: AsyncSession = Depends(get_db)):
+async def sync_campaigns(db: AsyncSession = Depends(get_db),
+                         client: ActiveCampaignClient = Depends(ActiveCampaignClient.get_service)):
     campaign_repo = await CampaignRepository.get_service(db)
     ad_repo = await AdRepository.get_service(db)
     ad_metric_repo = await AdMetricRepository.get_service(db)
 
-    api_campaigns = get_campaigns()
+    api_campaigns = await client.get_campaigns()
     today = datetime.now(timezone.utc)
 
     for camp in api_campaigns:
@@ -31,7 +32,7 @@ async def sync_campaigns(db: AsyncSession = Depends(get_db)):
 
         db_campaign = await campaign_repo.get_or_create(remote_id, name, start_date, "activecampaign")
 
-        report = get_campaign_report(remote_id)
+        report = await client.get_campaign_report(remote_id)
 
         metrics = {
             "ad_id": None,
@@ -49,7 +50,7 @@ async def sync_campaigns(db: AsyncSession = Depends(get_db)):
 
         await ad_metric_repo.save(db_campaign.id, metrics)
 
-        links = get_campaign_links(remote_id)
+        links = await client.get_campaign_links(remote_id)
 
         for link in links:
             ad = await ad_repo.get_or_create(link["id"], "activecampaign", db_campaign.id, link["url"])
@@ -73,9 +74,10 @@ async def sync_campaigns(db: AsyncSession = Depends(get_db)):
     return {"message": "Sincronização concluída!"}
 
 @router.post("/sync-contacts")
-async def sync_contacts(db: AsyncSession = Depends(get_db)):
+async def sync_contacts(db: AsyncSession = Depends(get_db),
+                        client: ActiveCampaignClient = Depends(ActiveCampaignClient.get_service)):
     contact_repo = await ContactRepository.get_service(db)
-    contacts = get_contacts()
+    contacts = await client.get_contacts()
 
     for contact in contacts:
         await contact_repo.get_or_create(
@@ -89,9 +91,10 @@ async def sync_contacts(db: AsyncSession = Depends(get_db)):
     return {"message": "Contatos sincronizados"}
 
 @router.post("/sync-deals")
-async def sync_deals(db: AsyncSession = Depends(get_db)):
+async def sync_deals(db: AsyncSession = Depends(get_db),
+                     client: ActiveCampaignClient = Depends(ActiveCampaignClient.get_service)):
     deal_repo = await DealRepository.get_service(db)
-    deals = get_deals()
+    deals = await client.get_deals()
 
     for deal in deals:
         await deal_repo.get_or_create(
@@ -110,9 +113,10 @@ async def sync_deals(db: AsyncSession = Depends(get_db)):
     return {"message": "Deals sincronizados"}
 
 @router.post("/sync-messages")
-async def sync_messages(db: AsyncSession = Depends(get_db)):
+async def sync_messages(db: AsyncSession = Depends(get_db),
+                        client: ActiveCampaignClient = Depends(ActiveCampaignClient.get_service)):
     message_repo = await MessageRepository.get_service(db)
-    activities = get_contact_activities()
+    activities = await client.get_contact_activities()
 
     for act in activities:
         await message_repo.get_or_create(
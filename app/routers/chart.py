@@ -1,24 +1,59 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from starlette import status
-from app.services.charts import ChartService
-from app.schemas.chart import ChartRequest, ChartResponse, UpdateChartOrderRequest
+from app.services.charts import ChartService, VARY
+from app.schemas.chart import ChartRequest, ChartResponse, UpdateChartOrderRequest, ChartFormat, COLUMNAR_MEDIA_TYPE
+from app.utils.compression import EncodedBody
 
 router = APIRouter(
     prefix="/chart",
     tags=["chart"]
 )
 
+def chart_format(format: ChartFormat | None = None, accept: str | None = Header(default=None)) -> ChartFormat:
+    """The columnar shape is opt-in, with `?format=columnar` or by accepting its media type."""
+    if format is not None:
+        return format
+    if accept and COLUMNAR_MEDIA_TYPE in accept:
+        return ChartFormat.columnar
+    return ChartFormat.json
+
+def chart_response(body: EncodedBody, etag: str, format: ChartFormat) -> Response:
+    """The body is already JSON and already compressed, the compression middleware leaves it alone."""
+    media_type = COLUMNAR_MEDIA_TYPE if format == ChartFormat.columnar else "application/json"
+    headers = {"ETag": etag, "Vary": VARY}
+    if body.encoding:
+        headers["Content-Encoding"] = body.encoding
+    return Response(content=body.content, media_type=media_type, headers=headers)
+
+# at most this many points per series, downsampled with LTTB. Fewer than 3 can't keep the first and last points
+MaxPoints = Query(default=None, ge=3)
+
 @router.get("/{chart_id}", status_code=status.HTTP_200_OK, response_model=ChartResponse)
-async def get_chart(chart_id: str, service: ChartService = Depends(ChartService.get_service)):
-    return await service.get_chart(chart_id)
+async def get_chart(chart_id: str, if_none_match: str | None = Header(default=None),
+                    accept_encoding: str | None = Header(default=None),
+                    format: ChartFormat = Depends(chart_format),
+                    max_points: int | None = MaxPoints,
+                    service: ChartService = Depends(ChartService.get_service)):
+    body, etag = await service.get_encoded_chart(chart_id, if_none_match, format, accept_encoding, max_points)
+    return chart_response(body, etag, format)
+
+@router.get("/{chart_id}/stream", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def stream_chart(chart_id: str, service: ChartService = Depends(ChartService.get_service)):
+    return StreamingResponse(await service.stream_chart(chart_id), media_type="application/x-ndjson")
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_chart(chart: ChartRequest, service: ChartService = Depends(ChartService.get_service)):
     return await service.create_chart(chart)
 
 @router.get("/{account_id}/all", status_code=status.HTTP_200_OK, response_model=list[ChartResponse])
-async def list_chart(account_id: str, service: ChartService = Depends(ChartService.get_service)):
-    return await service.list_charts(account_id)
+async def list_chart(account_id: str, if_none_match: str | None = Header(default=None),
+                     accept_encoding: str | None = Header(default=None),
+                     format: ChartFormat = Depends(chart_format),
+                     max_points: int | None = MaxPoints,
+                     service: ChartService = Depends(ChartService.get_service)):
+    body, etag = await service.list_encoded_charts(account_id, if_none_match, format, accept_encoding, max_points)
+    return chart_response(body, etag, format)
 
 @router.delete("/{chart_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chart(chart_id: str, service: ChartService = Depends(ChartService.get_service)):
@@ -3,6 +3,7 @@ from starlette import status
 
 from app.schemas.chat import ChatRequest, ChatResponse, History
 from app.services.chat import ChatService
+from app.utils.responses import ModelResponse
 
 router = APIRouter(
     prefix="/chat",
@@ -12,8 +13,8 @@ router = APIRouter(
 
 @router.post("/", status_code=status.HTTP_200_OK, response_model=ChatResponse)
 async def chat(chat_data: ChatRequest, service: ChatService = Depends(ChatService.get_service)):
-    return await service.chat(chat_data)
+    return ModelResponse(await service.chat(chat_data))
 
 @router.post("/assistant", response_model=ChatResponse)
 async def chat_assistant(chat_data: ChatRequest, service: ChatService = Depends(ChatService.get_service)):
-    return await service.chat_assistant(chat_data)
+    return ModelResponse(await service.chat_assistant(chat_data))
@@ -1,3 +1,4 @@
+import enum
 from datetime import datetime
 from typing import Optional, Dict
 
@@ -71,6 +72,30 @@ class ChartResponse(BaseModel):
     data: list[ChartDataPoint]
 
 
+class ChartFormat(str, enum.Enum):
+    json = 'json'
+    # one series per source/metric/device, with parallel arrays of dates and values
+    columnar = 'columnar'
+
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.revforce.chart-series+json"
+
+
+class ChartSeries(BaseModel):
+    source_id: str
+    source_table: SourceTable
+    metric: ChartMetric
+    device: DeviceType | None
+    # epoch seconds (UTC) of each point, in order
+    dates: list[int]
+    values: list[float]
+
+
+class ColumnarChartResponse(BaseModel):
+    chart: CompleteChart
+    series: list[ChartSeries]
+
+
 class UpdateChartOrderRequest(BaseModel):
     positions: Dict[str, int]
 
@@ -0,0 +1,92 @@
+"""
+Times the python side of the chart pipeline on random data points: group_by_date + group_by_device +
+aggregate_data_points (one pydantic object per point and step) against ColumnarDataPoints, and checks both
+give the same points. "columnar" includes building the ChartDataPoints back, "columnar core" only the arrays.
+
+    python -m app.scripts.benchmark_aggregation --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app.models.ad_metric import DeviceType
+from app.models.chart_source import ChartMetric, SourceTable
+from app.models.period import PeriodType
+from app.schemas.chart import ChartDataPoint, PeriodSchema
+from app.services.chart_data import group_by_date, group_by_device, aggregate_data_points
+from app.utils.columnar import ColumnarDataPoints
+
+GRANULARITY = PeriodSchema(type=PeriodType.day, amount=1)
+
+
+def random_data_points(size: int, sources: int) -> list[ChartDataPoint]:
+    start = datetime(2025, 1, 1)
+    devices = list(DeviceType)
+    metrics = [ChartMetric.click, ChartMetric.impression, ChartMetric.ctr, ChartMetric.spend]
+
+    return [
+        ChartDataPoint(
+            source_table=SourceTable.ad,
+            source_id=f"ad-{random.randrange(sources)}",
+            date=start + timedelta(hours=random.randrange(24 * 365)),
+            device=random.choice(devices),
+            metric=random.choice(metrics),
+            value=random.randint(0, 1000),
+        )
+        for _ in range(size)
+    ]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def current(data_points: list[ChartDataPoint]) -> list[ChartDataPoint]:
+    return aggregate_data_points(group_by_device(group_by_date(data_points, GRANULARITY)))
+
+
+def columnar(data_points: list[ChartDataPoint]) -> list[ChartDataPoint]:
+    return columnar_core(ColumnarDataPoints.from_data_points(data_points)).to_data_points()
+
+
+def columnar_core(points: ColumnarDataPoints) -> ColumnarDataPoints:
+    return points.group_by_date(GRANULARITY).group_by_device().aggregate()
+
+
+def key(dp: ChartDataPoint):
+    return dp.source_table, dp.source_id, dp.date, dp.device, dp.metric
+
+
+def main(sizes: list[int], sources: int) -> int:
+    failures = 0
+
+    for size in sizes:
+        data_points = random_data_points(size, sources)
+        points = ColumnarDataPoints.from_data_points(data_points)
+
+        expected, current_time = timed(current, data_points)
+        result, columnar_time = timed(columnar, data_points)
+        _, core_time = timed(columnar_core, points)
+
+        same = sorted((key(dp), dp.value) for dp in expected) == sorted((key(dp), dp.value) for dp in result)
+        failures += not same
+
+        print(f"\n[{'ok' if same else 'FAIL'}] {size} points -> {len(expected)} buckets")
+        print(f"  current:        {current_time * 1000:10.1f} ms")
+        print(f"  columnar:       {columnar_time * 1000:10.1f} ms ({current_time / columnar_time:.1f}x)")
+        print(f"  columnar core:  {core_time * 1000:10.1f} ms ({current_time / core_time:.1f}x)")
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--sources", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.exit(1 if main(args.sizes, args.sources) else 0)
@@ -0,0 +1,183 @@
+"""
+Seeds a throwaway account with campaigns, ads and a year of 4-hourly metrics per device, then runs EXPLAIN ANALYZE on
+the hot ad_metrics queries (chart latest date, chart period range, upsert lookup) and checks that they are
+answered from the indexes. Everything it creates is deleted at the end.
+
+    python -m app.scripts.benchmark_indexes --ads 20 --campaigns 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, desc, text
+from sqlalchemy.dialects import postgresql
+
+from app.config.database import engine, create_tables, AsyncSessionLocal
+from app.models.account import Account
+from app.models.account_config import AccountConfig, AccountType
+from app.models.ad import Ad
+from app.models.ad_metric import AdMetric, DeviceType
+from app.models.campaign import Campaign
+from app.repositories.ad_metric_partition import AdMetricPartitionRepository
+
+INSERT_CHUNK = 2000
+
+
+def plan_nodes(plan: dict) -> list[dict]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+async def seed(prefix: str, ads: int, days: int, campaigns: int) -> tuple[list[str], str, datetime]:
+    campaign_ids = [f"{prefix}-campaign-{i}" for i in range(campaigns)]
+    ad_ids = [f"{prefix}-ad-{i}" for i in range(ads)]
+    start = datetime(2025, 1, 1)
+
+    async with AsyncSessionLocal() as session:
+        await AdMetricPartitionRepository(session).ensure(start, start + timedelta(days=days))
+        await session.commit()
+
+    async with engine.begin() as conn:
+        await conn.execute(insert(Account).values(id=prefix, name=prefix))
+        await conn.execute(insert(AccountConfig).values(
+            id=prefix, account_id=prefix, type=AccountType.facebook_ads, last_refresh=datetime.now()
+        ))
+        await conn.execute(insert(Campaign), [
+            dict(id=campaign_id, remote_id=campaign_id, integration_id=prefix, name=campaign_id,
+                 updated_at=datetime.now())
+            for campaign_id in campaign_ids
+        ])
+        await conn.execute(insert(Ad), [
+            dict(id=ad_id, remote_id=ad_id, integration_id=prefix, campaign_id=campaign_ids[i % campaigns],
+                 name=ad_id, updated_at=datetime.now())
+            for i, ad_id in enumerate(ad_ids)
+        ])
+
+        rows = []
+        for ad_id in ad_ids:
+            curr = start
+            while curr < start + timedelta(days=days):
+                for device in DeviceType:
+                    rows.append(dict(
+                        id=str(uuid.uuid4()), ad_id=ad_id, device=device, date=curr, updated_at=datetime.now(),
+                        ctr=random.random() * 5, impressions=random.randint(50, 10000),
+                        views=random.randint(10, 5000), clicks=random.randint(1, 1000), spend=random.randint(10, 50),
+                    ))
+                curr += timedelta(hours=4)
+
+            if len(rows) >= INSERT_CHUNK:
+                await conn.execute(insert(AdMetric), rows)
+                rows = []
+
+        if rows:
+            await conn.execute(insert(AdMetric), rows)
+
+    # index only scans need an up to date visibility map
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE ad_metrics"))
+        await conn.execute(text("VACUUM ANALYZE ads"))
+
+    # latest metric seeded, what DataService uses as the end of the chart period
+    return ad_ids, campaign_ids[0], start + timedelta(days=days) - timedelta(hours=4)
+
+
+async def cleanup(prefix: str):
+    async with engine.begin() as conn:
+        await conn.execute(delete(AdMetric).where(AdMetric.ad_id.like(f"{prefix}-%")))
+        await conn.execute(delete(Ad).where(Ad.integration_id == prefix))
+        await conn.execute(delete(Campaign).where(Campaign.integration_id == prefix))
+        await conn.execute(delete(AccountConfig).where(AccountConfig.id == prefix))
+        await conn.execute(delete(Account).where(Account.id == prefix))
+
+
+async def explain(statement) -> dict:
+    sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+
+    async with engine.connect() as conn:
+        result = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"))
+        plan = result.scalar()
+
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+async def main(ads: int, days: int, campaigns: int) -> int:
+    await create_tables()
+
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    print(f"Seeding {ads} ads in {campaigns} campaigns x {days} days of 4-hourly metrics per device under {prefix}...")
+    ad_ids, campaign_id, end = await seed(prefix, ads, days, campaigns)
+    ad_id = ad_ids[len(ad_ids) // 2]
+    week_ago = end - timedelta(days=7)
+
+    queries = {
+        # DataService: latest metric of the source
+        "latest date of an ad": (
+            select(AdMetric.date).where(AdMetric.ad_id == ad_id).order_by(desc(AdMetric.date)).limit(1),
+            "Index Only Scan",
+        ),
+        # DataService: metrics of the chart period
+        "period range of an ad": (
+            select(AdMetric.date, AdMetric.device, AdMetric.clicks, AdMetric.impressions, AdMetric.ctr)
+            .where(AdMetric.ad_id == ad_id)
+            .where(AdMetric.date > week_ago)
+            .where(AdMetric.date <= end),
+            "Index Only Scan",
+        ),
+        "period range of a campaign": (
+            select(AdMetric.date, AdMetric.device, AdMetric.clicks)
+            .join(Ad)
+            .where(Ad.campaign_id == campaign_id)
+            .where(AdMetric.date > week_ago)
+            .where(AdMetric.date <= end),
+            "Index Only Scan",
+        ),
+        # AdMetricRepository.create_or_update
+        "upsert lookup": (
+            select(AdMetric)
+            .where(AdMetric.ad_id == ad_id)
+            .where(AdMetric.date == week_ago.replace(hour=0))
+            .where(AdMetric.device == DeviceType.mobile),
+            "Index Scan",
+        ),
+    }
+
+    failures = 0
+
+    try:
+        for name, (statement, expected) in queries.items():
+            result = await explain(statement)
+            nodes = plan_nodes(result["Plan"])
+            # ad_metrics itself or its monthly partitions
+            metric_nodes = [n for n in nodes if n.get("Relation Name", "").startswith("ad_metrics")]
+            ok = bool(metric_nodes) and all(n["Node Type"] == expected for n in metric_nodes)
+            failures += not ok
+
+            print(f"\n[{'ok' if ok else 'FAIL'}] {name} (expected {expected} on ad_metrics)")
+            print(f"  execution time: {result['Execution Time']:.3f} ms")
+            for node in nodes:
+                detail = f" using {node['Index Name']}" if "Index Name" in node else ""
+                relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+                heap = f", heap fetches: {node['Heap Fetches']}" if "Heap Fetches" in node else ""
+                print(f"  - {node['Node Type']}{relation}{detail} (rows: {node['Actual Rows']}{heap})")
+    finally:
+        await cleanup(prefix)
+        await engine.dispose()
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--campaigns", type=int, default=10)
+    args = parser.parse_args()
+
+    sys.exit(1 if asyncio.run(main(args.ads, args.days, args.campaigns)) else 0)
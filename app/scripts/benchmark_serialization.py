@@ -0,0 +1,102 @@
+"""
+Times writing chart responses to bytes: what FastAPI does with `response_model` (validate the returned models
+again, dump them to dicts, json.dumps in JSONResponse) against ModelResponse (pydantic-core straight to bytes),
+and checks both write the same JSON. Prints the cost per 10k data points.
+
+    python -m app.scripts.benchmark_serialization --points 10000 100000 --charts 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.ad_metric import DeviceType
+from app.models.chart import ChartType
+from app.models.chart_source import ChartMetric, SourceTable
+from app.models.period import PeriodType
+from app.schemas.chart import ChartDataPoint, ChartResponse, CompleteChart, PeriodResponse
+from app.utils.responses import ModelResponse
+
+REPEAT = 5
+
+
+def random_chart_responses(points: int, charts: int) -> list[ChartResponse]:
+    start = datetime(2025, 1, 1)
+    period = PeriodResponse(type=PeriodType.day, amount=30)
+
+    return [
+        ChartResponse(
+            chart=CompleteChart(
+                id=f"chart-{c}", name=f"Chart {c}", position=c, type=ChartType.line,
+                period=period, granularity=period, sources=[], segment=None,
+            ),
+            data=[
+                ChartDataPoint(
+                    source_table=SourceTable.ad,
+                    source_id=f"ad-{random.randrange(20)}",
+                    date=start + timedelta(days=random.randrange(365)),
+                    device=random.choice(list(DeviceType)),
+                    metric=random.choice(list(ChartMetric)),
+                    value=random.random() * 1000,
+                )
+                for _ in range(points // charts)
+            ],
+        )
+        for c in range(charts)
+    ]
+
+
+async def response_model_body(field, charts: list[ChartResponse]) -> bytes:
+    content = await serialize_response(field=field, response_content=charts)
+    return JSONResponse(content).body
+
+
+def model_response_body(charts: list[ChartResponse]) -> bytes:
+    return ModelResponse(charts).body
+
+
+def best_of(function, *args) -> tuple[bytes, float]:
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        body = function(*args)
+        times.append(time.perf_counter() - start)
+    return body, min(times)
+
+
+def main(sizes: list[int], charts: int) -> int:
+    field = create_model_field(name="Response_list_chart", type_=list[ChartResponse], mode="serialization")
+    loop = asyncio.new_event_loop()
+    failures = 0
+
+    for size in sizes:
+        responses = random_chart_responses(size, charts)
+
+        expected, current_time = best_of(lambda: loop.run_until_complete(response_model_body(field, responses)))
+        result, fast_time = best_of(model_response_body, responses)
+
+        same = json.loads(expected) == json.loads(result)
+        failures += not same
+        per_10k = 10_000 / size * 1000
+
+        print(f"\n[{'ok' if same else 'FAIL'}] {size} points in {charts} charts, {len(result) / 1e6:.1f} MB")
+        print(f"  response_model: {current_time * per_10k:8.1f} ms / 10k points")
+        print(f"  ModelResponse:  {fast_time * per_10k:8.1f} ms / 10k points ({current_time / fast_time:.1f}x)")
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--charts", type=int, default=10)
+    args = parser.parse_args()
+
+    sys.exit(1 if main(args.points, args.charts) else 0)
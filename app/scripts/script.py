@@ -17,6 +17,8 @@ from app.models.campaign import Campaign
 from app.models.contact import Contact
 from app.models.deal import Deal
 from app.models.message import Message
+from app.repositories.ad_metric_partition import AdMetricPartitionRepository
+from app.repositories.ad_metric_rollup import AdMetricRollupRepository
 
 
 adjectives = [
@@ -205,6 +207,7 @@ async def populate_db(
     await db.commit()
 
     # Insert ad metrics
+    await AdMetricPartitionRepository(db).ensure(datetime.strptime(min_campaign_start, "%Y-%m-%d"), datetime.now())
     ads = await db.scalars(select(Ad).join(Ad.campaign))
 
     metrics_created = 0
@@ -240,6 +243,9 @@ async def populate_db(
 
     print(f"Created {metrics_created} metrics for {ads_created} ads between {campaign_count} campaings")
 
+    # metrics were added straight through the session, so the rollups have to be built from scratch
+    await AdMetricRollupRepository(db).rebuild()
+
     print("Creating CRM stuff...")
 
     # Create some contacts
@@ -1,78 +1,171 @@
-import requests, os
-from typing import Any, Dict, List, Optional
-from app.config.application import settings
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from httpx import AsyncClient
+
+from app.config.application import settings, http_client as shared_http_client
 
 API_URL = settings.APP_ID
 API_KEY = settings.APP_SECRET
 
-headers = {
-    "Api-Token": API_KEY,
-    "Content-Type": "application/json"
-}
+PAGE_SIZE = 100
+# ActiveCampaign allows 5 requests per second per account
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 5
+
+
+class ActiveCampaignClient:
+    """Async ActiveCampaign API v3 client on the shared (keep-alive) httpx client.
+
+    List endpoints are read with offset/limit pagination: the first page tells the total, the next
+    ones are prefetched concurrently (at most MAX_CONCURRENT_REQUESTS requests in flight per client)
+    and yielded in order. 429 responses are retried after Retry-After, or with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        http_client: AsyncClient | None = None,
+        api_url: str | None = None,
+        api_key: str | None = None,
+        page_size: int = PAGE_SIZE,
+        max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+        max_retries: int = MAX_RETRIES,
+        backoff_seconds: float = 1,
+    ):
+        self.__http_client = http_client or shared_http_client
+        self.__api_url = str(api_url or API_URL).rstrip("/")
+        self.__headers = {"Api-Token": api_key or API_KEY, "Content-Type": "application/json"}
+        self.__page_size = page_size
+        self.__prefetch = max_concurrent_requests
+        self.__semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self.__max_retries = max_retries
+        self.__backoff_seconds = backoff_seconds
+
+    async def get(self, path: str, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        for attempt in range(self.__max_retries + 1):
+            async with self.__semaphore:
+                res = await self.__http_client.get(f"{self.__api_url}{path}", params=params, headers=self.__headers)
+
+            if res.status_code != 429 or attempt == self.__max_retries:
+                break
+
+            retry_after = res.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.__backoff_seconds * 2 ** attempt
+            await asyncio.sleep(delay)
+
+        res.raise_for_status()
+        return res.json()
+
+    async def iter_pages(self, path: str, key: str, params: Dict[str, Any] | None = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yields every page of a list endpoint, in order."""
+        def page_params(offset: int) -> Dict[str, Any]:
+            return {**(params or {}), "limit": self.__page_size, "offset": offset}
+
+        first = await self.get(path, page_params(0))
+        yield first.get(key, [])
+
+        total = first.get("meta", {}).get("total")
+
+        # endpoints without a total are read one page at a time, until a short page
+        if total is None:
+            page, offset = first.get(key, []), 0
+            while len(page) == self.__page_size:
+                offset += self.__page_size
+                page = (await self.get(path, page_params(offset))).get(key, [])
+                yield page
+            return
+
+        offsets = deque(range(self.__page_size, int(total), self.__page_size))
+        pending = deque()
 
-def get_campaigns() -> List[Dict[str, Any]]:
         try:
-            res = requests.get(f"{API_URL}/api/3/campaigns", headers=headers)
-            res.raise_for_status()
-            return res.json().get("campaigns", [])
+            while offsets or pending:
+                # keep a bounded window of pages in flight, so a slow consumer doesn't buffer everything
+                while offsets and len(pending) < self.__prefetch:
+                    pending.append(asyncio.create_task(self.get(path, page_params(offsets.popleft()))))
+
+                yield (await pending.popleft()).get(key, [])
+        finally:
+            for task in pending:
+                task.cancel()
+            # awaited so they don't outlive the client, and a failed one isn't reported as never retrieved
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def get_all(self, path: str, key: str, params: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+        return [item async for page in self.iter_pages(path, key, params) for item in page]
+
+    @staticmethod
+    def __updated_after(updated_after: datetime | None) -> Dict[str, Any] | None:
+        """The API reads the filter in the account's time zone, `updated_after` must be a wall time of that zone
+        (like the dates it returns, without their offset)."""
+        if updated_after is None:
+            return None
+        return {"filters[updated_after]": updated_after.strftime("%Y-%m-%d %H:%M:%S")}
+
+    async def list_deals(self, updated_after: datetime | None = None) -> List[Dict[str, Any]]:
+        """Every deal, or only the ones changed after `updated_after`. Raises on API errors."""
+        return await self.get_all("/api/3/deals", "deals", self.__updated_after(updated_after))
+
+    async def list_contacts(self, updated_after: datetime | None = None) -> List[Dict[str, Any]]:
+        """Every contact, or only the ones changed after `updated_after`. Raises on API errors."""
+        return await self.get_all("/api/3/contacts", "contacts", self.__updated_after(updated_after))
+
+    async def list_messages(self) -> List[Dict[str, Any]]:
+        """Every message, the API has no updated filter for them. Raises on API errors."""
+        return await self.get_all("/api/3/messages", "messages")
+
+    async def get_campaigns(self) -> List[Dict[str, Any]]:
+        try:
+            return await self.get_all("/api/3/campaigns", "campaigns")
         except Exception as e:
             print(f"Erro ao buscar campanhas: {e}")
             return []
 
-def get_campaign_report(campaign_id: str) -> Optional[Dict[str, Any]]:
-    try:
-        res = requests.get(f"{API_URL}/api/3/campaigns/{campaign_id}/report", headers=headers)
-        res.raise_for_status()
-        return res.json()
-    except Exception as e:
-        print(f"Erro ao buscar relatório da campanha {campaign_id}: {e}")
-        return {}
-
-def get_campaign_links(campaign_id: str) -> List[Dict[str, Any]]:
-    try:
-        response = requests.get(
-            f"{API_URL}/api/3/campaigns/{campaign_id}/links",
-            headers=headers
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("links", [])
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar links da campanha {campaign_id}: {e}")
-        return []
-
-def get_contacts() -> List[Dict[str, Any]]:
-    try:
-        res = requests.get(f"{API_URL}/api/3/contacts?limit=100", headers=headers)
-        res.raise_for_status()
-        return res.json().get("contacts", [])
-    except Exception as e:
-        print(f"Erro ao buscar contatos: {e}")
-        return []
-
-def get_deals() -> List[Dict[str, Any]]:
-    try:
-        res = requests.get(f"{API_URL}/api/3/deals?limit=100", headers=headers)
-        res.raise_for_status()
-        return res.json().get("deals", [])
-    except Exception as e:
-        print(f"Erro ao buscar deals: {e}")
-        return []
-
-def get_contact_activities() -> List[Dict[str, Any]]:
-    try:
-        res = requests.get(f"{API_URL}/api/3/activities", headers=headers)
-        res.raise_for_status()
-        return res.json().get("activity", [])
-    except Exception as e:
-        print(f"Erro ao buscar atividades: {e}")
-        return []
-
-def get_messages() -> List[Dict[str, Any]]:
-    try:
-        res = requests.get(f"{API_URL}/api/3/messages?limit=100", headers=headers)
-        res.raise_for_status()
-        return res.json().get("messages", [])
-    except Exception as e:
-        print(f"Erro ao buscar mensagens: {e}")
-        return []
\ No newline at end of file
+    async def get_campaign_report(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.get(f"/api/3/campaigns/{campaign_id}/report")
+        except Exception as e:
+            print(f"Erro ao buscar relatório da campanha {campaign_id}: {e}")
+            return {}
+
+    async def get_campaign_links(self, campaign_id: str) -> List[Dict[str, Any]]:
+        try:
+            return await self.get_all(f"/api/3/campaigns/{campaign_id}/links", "links")
+        except httpx.HTTPError as e:
+            print(f"Erro ao buscar links da campanha {campaign_id}: {e}")
+            return []
+
+    async def get_contacts(self) -> List[Dict[str, Any]]:
+        try:
+            return await self.list_contacts()
+        except Exception as e:
+            print(f"Erro ao buscar contatos: {e}")
+            return []
+
+    async def get_deals(self) -> List[Dict[str, Any]]:
+        try:
+            return await self.list_deals()
+        except Exception as e:
+            print(f"Erro ao buscar deals: {e}")
+            return []
+
+    async def get_contact_activities(self) -> List[Dict[str, Any]]:
+        try:
+            return await self.get_all("/api/3/activities", "activity")
+        except Exception as e:
+            print(f"Erro ao buscar atividades: {e}")
+            return []
+
+    async def get_messages(self) -> List[Dict[str, Any]]:
+        try:
+            return await self.list_messages()
+        except Exception as e:
+            print(f"Erro ao buscar mensagens: {e}")
+            return []
+
+    @classmethod
+    async def get_service(cls):
+        return cls()
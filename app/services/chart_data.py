@@ -1,31 +1,216 @@
+import hashlib
+import json
 import math
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from fastapi import Depends
-from asyncio import gather
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from asyncio import gather, create_task, Lock, Semaphore, Task
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, desc, func, null, union_all, values, column, case, and_, cast, Integer, String, DateTime, \
+    Boolean, Float, Select
 from datetime import datetime, timedelta
 from collections import defaultdict
+from typing import AsyncIterator
 
-from app.config.database import get_db
+from app.config.application import settings
+from app.config.database import get_db, AsyncSessionLocal
 
 from app.schemas.chart import ChartDataPoint, PeriodSchema
 
+from app.models.account_config import AccountConfig
 from app.models.contact import Contact
 from app.models.deal import Deal
 from app.models.message import Message
 from app.models.chart import ChartSegment, Chart
 from app.models.ad import Ad
 from app.models.ad_metric import AdMetric, DeviceType
-from app.models.chart_source import ChartMetric, SourceTable
+from app.models.ad_metric_rollup import AdMetricRollup
+from app.models.chart_source import ChartMetric, SourceTable, Aggregation
 from app.models.period import PeriodType
+from app.repositories.ad_metric_rollup import ROLLUP_GRANULARITIES, AD_METRIC_COLUMNS, rollup_step
+from app.utils.cache import CacheBackend, MemoryCache
+from app.utils.columnar import ColumnarDataPoints
+from app.utils.downsample import lttb
+from app.utils.period import timedelta_from_period, bucket_expression, datetime_from_bucket, floor_datetime
 
-def timedelta_from_period(period: PeriodSchema) -> timedelta:
-    match period.type:
-        case PeriodType.month: return timedelta(days=30 * period.amount)
-        case PeriodType.week: return timedelta(weeks=period.amount)
-        case PeriodType.day: return timedelta(days=period.amount)
-        case PeriodType.hour: return timedelta(hours=period.amount)
-        case _: raise NotImplementedError(f"Unsupported period type: {period.type}")
+# shared by every request of the process
+chart_data_cache = MemoryCache(max_entries=settings.CHART_CACHE_MAX_ENTRIES, ttl_seconds=settings.CHART_CACHE_TTL_SECONDS)
+
+def ad_metric_column(metric: ChartMetric, model: type[AdMetric] | type[AdMetricRollup] = AdMetric):
+    """Column summed for `metric`. Ratios have none: they are summed wrong, load their parts (`summed_metrics`)."""
+    if metric not in AD_METRIC_COLUMNS:
+        raise ValueError(f"Unsupported metric: {metric}")
+    if metric.aggregation.kind == Aggregation.ratio:
+        raise ValueError(f"{metric} is a ratio, it is computed from {metric.aggregation.inputs}")
+
+    return getattr(model, AD_METRIC_COLUMNS[metric])
+
+def summed_metrics(metrics: list[ChartMetric]) -> list[ChartMetric]:
+    """The metrics that are actually loaded and summed for `metrics`: each one, or the parts of a ratio."""
+    return list(dict.fromkeys(part for metric in metrics for part in metric.aggregation.inputs or [metric]))
+
+def metric_aggregate(metric: ChartMetric, columns):
+    """SQL aggregate of `metric` over rows whose `columns` hold the summed metrics, by name."""
+    aggregation = metric.aggregation
+
+    if aggregation.kind == Aggregation.ratio:
+        numerator = cast(func.sum(columns[aggregation.numerator.value]), Float) * aggregation.scale
+        return func.coalesce(numerator / func.nullif(func.sum(columns[aggregation.denominator.value]), 0), 0)
+
+    return func.coalesce(func.sum(columns[metric.value]), 0)
+
+def combine_metrics(dps: list[ChartDataPoint], metrics: list[ChartMetric]) -> list[ChartDataPoint]:
+    """Python side of `metric_aggregate`: from the aggregated points of the summed metrics to the points of
+    `metrics`, with each ratio computed from the sums of its parts in the same bucket."""
+    if all(metric.aggregation.kind != Aggregation.ratio for metric in metrics):
+        return [dp for dp in dps if dp.metric in metrics]
+
+    buckets: defaultdict[tuple, dict[ChartMetric, float]] = defaultdict(dict)
+    for dp in dps:
+        buckets[(dp.source_table, dp.source_id, dp.date, dp.device)][dp.metric] = dp.value
+
+    final = []
+
+    for (source_table, source_id, date, device), sums in buckets.items():
+        for metric in metrics:
+            aggregation = metric.aggregation
+
+            if aggregation.kind == Aggregation.ratio:
+                denominator = sums.get(aggregation.denominator, 0)
+                value = sums.get(aggregation.numerator, 0) * aggregation.scale / denominator if denominator else 0
+            elif metric in sums:
+                value = sums[metric]
+            else:
+                continue
+
+            final.append(ChartDataPoint(
+                source_table=source_table,
+                source_id=source_id,
+                date=date,
+                device=device,
+                value=value,
+                metric=metric,
+            ))
+
+    return final
+
+def latest_ad_metric_query(source_table: SourceTable, source_id: str) -> Select:
+    match source_table:
+        case SourceTable.campaign: query = select(AdMetric.date).join(Ad).where(Ad.campaign_id == source_id)
+        case SourceTable.ad: query = select(AdMetric.date).where(AdMetric.ad_id == source_id)
+
+    return query.order_by(desc(AdMetric.date)).limit(1)
+
+def ad_bucket_data_points(rows, *, source_table: SourceTable, source_id: str, metrics: list[ChartMetric], **_):
+    """Data points of the rows of an ad metrics buckets query: bucket, device and then one value per metric."""
+    for (bucket, device, *values) in rows:
+        for metric, value in zip(metrics, values):
+            yield ChartDataPoint(
+                date=datetime_from_bucket(bucket),
+                device=device,
+                source_id=source_id,
+                source_table=source_table,
+                value=value,
+                metric=metric,
+            )
+
+def crm_metric_columns(metric: ChartMetric):
+    match metric:
+        case ChartMetric.contact: return Contact, Contact.created_at
+        case ChartMetric.deal | ChartMetric.deal_value: return Deal, Deal.created_at
+        case ChartMetric.message: return Message, Message.create_date
+        case _: raise ValueError(f"Unsupported metric for CRM source: {metric}")
+
+def crm_buckets_query(metric: ChartMetric, start_time: datetime, granularity: PeriodSchema) -> Select:
+    model, created_at = crm_metric_columns(metric)
+
+    # every contact/deal/message counts as one, except for deal_value which sums the deal values
+    match metric.aggregation.kind:
+        case Aggregation.count: value = func.count()
+        case _: value = func.coalesce(func.sum(Deal.value), 0)
+    bucket = bucket_expression(created_at, granularity).label("bucket")
+
+    return (
+        select(bucket, value.label("value"))
+        .select_from(model)
+        .where(created_at > start_time)
+        .group_by(bucket)
+    )
+
+def crm_bucket_data_points(rows, *, source_table: SourceTable, metric: ChartMetric):
+    for (bucket, value) in rows:
+        yield ChartDataPoint(
+            date=datetime_from_bucket(bucket),
+            device=None,
+            source_id="",
+            source_table=source_table,
+            value=value,
+            metric=metric,
+        )
+
+def data_request_key(metric: ChartMetric, *, source_table: SourceTable, source_id: str, period: PeriodSchema,
+                     granularity: PeriodSchema, segment: ChartSegment, **_) -> tuple:
+    """Identifies the data of one metric of a source, charts asking the same key get the same data points."""
+    return (source_table, source_id, metric, period.type, period.amount, granularity.type, granularity.amount, segment)
+
+@dataclass
+class SourceRequest:
+    """One ad/campaign source as the charts of a dashboard ask for it, with every metric any of them wants."""
+    source_table: SourceTable
+    source_id: str
+    period: PeriodSchema
+    granularity: PeriodSchema
+    segment: ChartSegment
+    metrics: list[ChartMetric] = field(default_factory=list)
+    data_points: list[ChartDataPoint] = field(default_factory=list)
+
+def plan_chart_requests(charts: list[Chart]) -> dict[tuple, SourceRequest]:
+    """Every distinct ad/campaign source of the charts, by source, period, granularity and segment."""
+    requests: dict[tuple, SourceRequest] = {}
+
+    for chart in charts:
+        for source in chart.sources:
+            if source.source_table == SourceTable.crm:
+                continue
+
+            request = requests.setdefault(source_request_key(chart, source), SourceRequest(
+                source_table=source.source_table,
+                source_id=source.source_id,
+                period=chart.period,
+                granularity=chart.granularity,
+                segment=chart.segment,
+            ))
+            request.metrics.extend(metric for metric in source.metrics or [] if metric not in request.metrics)
+
+    return requests
+
+def source_request_key(chart: Chart, source) -> tuple:
+    return (source.source_table, source.source_id, chart.period.type, chart.period.amount,
+            chart.granularity.type, chart.granularity.amount, chart.segment)
+
+def chart_cache_key(chart: Chart, data_versions: dict[str, int]) -> str:
+    """Hash of everything the data of a chart depends on: its definition and the data version of each
+    integration of its account. Refreshing an integration bumps its version, so older entries are never hit again."""
+    definition = {
+        "account_id": chart.account_id,
+        "period": [chart.period.type, chart.period.amount],
+        "granularity": [chart.granularity.type, chart.granularity.amount],
+        "segment": chart.segment,
+        "sources": [[source.source_table, source.source_id, source.metrics or []] for source in chart.sources],
+        "data_versions": sorted(data_versions.items()),
+    }
+
+    return hashlib.sha256(json.dumps(definition, default=str).encode()).hexdigest()
+
+def pick_rollup(granularity: PeriodSchema) -> PeriodType | None:
+    """Coarsest rollup whose buckets fit exactly inside the chart's buckets, if there is one."""
+    step = timedelta_from_period(granularity)
+
+    for rollup in ROLLUP_GRANULARITIES:
+        if step % rollup_step(rollup) == timedelta(0):
+            return rollup
+
+    return None
 
 def group_by_date(
     data_points: list[ChartDataPoint],
@@ -68,12 +253,85 @@ def aggregate_data_points(dps: list[ChartDataPoint]) -> list[ChartDataPoint]:
 
     return final
 
+def downsample_data_points(dps: list[ChartDataPoint], max_points: int) -> list[ChartDataPoint]:
+    """At most `max_points` points per series (source, metric and device), picked with LTTB.
+    The kept points are untouched, so peaks and dips keep their real values."""
+    series: defaultdict[tuple, list[ChartDataPoint]] = defaultdict(list)
+
+    for dp in dps:
+        series[(dp.source_table, dp.source_id, dp.metric, dp.device)].append(dp)
+
+    final = []
+
+    for points in series.values():
+        points.sort(key=lambda dp: dp.date)
+        kept = lttb([dp.date.timestamp() for dp in points], [dp.value for dp in points], max_points)
+        final.extend(points[index] for index in kept)
+
+    return final
+
 class DataService:
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        aggregate_in_db: bool = True,
+        use_rollups: bool = True,
+        session_factory: async_sessionmaker | None = None,
+        max_concurrency: int | None = None,
+        dedupe: bool = False,
+        cache: CacheBackend | None = None,
+    ):
         self.__session = session
-
-    async def get_for_crm_source_and_metric(
+        # with a factory every source/metric is loaded in its own session, in parallel on the connection pool.
+        # without one they all share `session`, which can't run two queries at once, so they take turns
+        self.__session_factory = session_factory
+        self.__semaphore = Semaphore(max_concurrency or settings.CHART_DATA_CONCURRENCY)
+        self.__session_lock = Lock()
+        # when set, ad metrics are bucketed and summed by postgres instead of loading every row
+        self.__aggregate_in_db = aggregate_in_db
+        # when set, the aggregation reads ad_metric_rollups instead of ad_metrics whenever the granularity allows it
+        self.__use_rollups = use_rollups
+        # when set, a metric of a source asked by more than one chart (same period, granularity and segment)
+        # is loaded once for the lifetime of the service, which is a single request
+        self.__shared: dict[tuple, Task[list[ChartDataPoint]]] | None = {} if dedupe else None
+        # when set, the data of whole charts is kept there and a hit doesn't query any metric
+        self.__cache = cache
+
+    @asynccontextmanager
+    async def __session_scope(self):
+        if self.__session_factory is None:
+            async with self.__session_lock:
+                yield self.__session
+            return
+
+        await self.__release_session()
+
+        async with self.__semaphore:
+            async with self.__session_factory() as session:
+                yield session
+
+    async def __release_session(self):
+        # an open transaction keeps its pool connection. held while taking more from the same pool, enough
+        # concurrent requests end up holding every connection and waiting for one of them until the pool timeout
+        async with self.__session_lock:
+            if self.__session.in_transaction():
+                await self.__session.commit()
+
+    async def get_for_crm_source_and_metric(self, **kwargs) -> list[ChartDataPoint]:
+        async with self.__session_scope() as session:
+            return await self.__get_for_crm_source_and_metric(session, **kwargs)
+
+    async def get_for_source_and_metrics(self, **kwargs) -> list[ChartDataPoint]:
+        """Every metric of an ad/campaign source from one latest-date lookup and one scan of its rows."""
+        async with self.__session_scope() as session:
+            return await self.__get_for_source_and_metrics(session, **kwargs)
+
+    async def get_for_source_and_metric(self, *, metric: ChartMetric, **kwargs) -> list[ChartDataPoint]:
+        return await self.get_for_source_and_metrics(**kwargs, metrics=[metric])
+
+    async def __get_for_crm_source_and_metric(
         self, 
+        session: AsyncSession,
         *,
         source_table: SourceTable, 
         # source_id: str, 
@@ -82,128 +340,223 @@ class DataService:
         metric: ChartMetric,
         **_
     ) -> list[ChartDataPoint]:
-        model = None
-
-        if metric == ChartMetric.contact: 
-            model = Contact
-            model.created_at = Contact.created_at
-        elif metric == ChartMetric.deal: 
-            model = Deal
-            model.created_at = Deal.created_at
-        elif metric == ChartMetric.message: 
-            model = Message
-            model.created_at = Message.timestamp
-        else: raise ValueError(f"Unsupported metric for CRM source: {metric}")
-
-        created_at = await self.__session.scalar(select(model.created_at).order_by(desc(model.created_at)).limit(1))
-        if created_at is None:
+        model, created_at = crm_metric_columns(metric)
+
+        latest = await session.scalar(select(created_at).order_by(desc(created_at)).limit(1))
+        if latest is None:
             return []
-        
-        start_time = created_at - timedelta_from_period(period)
-        raw_data = await self.__session.execute(
-            select(model).where(model.created_at > start_time)
-        )
 
-        dps = [ChartDataPoint(
-            date=d.created_at,
-            device=None,
-            source_id="",
-            source_table=source_table,
-            value=1,  # each message is one data point
-            metric=metric,
-        ) for d in raw_data.scalars().all()]
+        start_time = latest - timedelta_from_period(period)
+
+        if self.__aggregate_in_db:
+            result = await session.execute(crm_buckets_query(metric, start_time, granularity))
+
+            return list(crm_bucket_data_points(result.all(), source_table=source_table, metric=metric))
 
-        grouped = group_by_date(dps, granularity)
+        raw_data = await session.execute(
+            select(model).where(created_at > start_time)
+        )
 
-        return aggregate_data_points(grouped)
+        rows = raw_data.scalars().all()
+        return ColumnarDataPoints.from_columns(
+            dates=(getattr(d, created_at.key) for d in rows),
+            devices=(None for _ in rows),
+            # each row is one data point
+            values=(d.value if metric.aggregation.kind == Aggregation.sum else 1 for d in rows),
+            metric=metric,
+            source_table=source_table,
+            source_id="",
+        ).group_by_date(granularity).aggregate().to_data_points()
 
 
-    async def get_for_source_and_metric(
+    async def __get_for_source_and_metrics(
         self, 
+        session: AsyncSession,
         *,
         source_table: SourceTable, 
         source_id: str, 
         period: PeriodSchema,
         granularity: PeriodSchema,
-        metric: ChartMetric,
+        metrics: list[ChartMetric],
         segment: ChartSegment,
         **_
     ) -> list[ChartDataPoint]:
-        # create a variable `value_field` to get the right metric as the value
-        match metric:
-            case ChartMetric.click: value_field = AdMetric.clicks.label("value")
-            case ChartMetric.ctr: value_field = AdMetric.ctr.label("value")
-            case ChartMetric.impression: value_field = AdMetric.impressions.label("value")
-            case ChartMetric.spend: value_field = AdMetric.spend.label("value")
-            case _: raise ValueError(f"Unsupported metric: {metric}")
+        # ratios are loaded as their parts and computed after the sums
+        summed = summed_metrics(metrics)
+        value_fields = [ad_metric_column(metric).label(metric.value) for metric in summed]
 
         match source_table:
             case SourceTable.campaign:
-                time_query = select(AdMetric.date).join(Ad).where(Ad.campaign_id == source_id)
-                data_query = (select(AdMetric, value_field)
+                data_query = (select(AdMetric, *value_fields)
                     .join(Ad)
                     .where(Ad.campaign_id == source_id)
                 )
 
             case SourceTable.ad:
-                time_query = select(AdMetric.date).where(AdMetric.ad_id == source_id)
                 data_query = (
-                    select(AdMetric, value_field)
+                    select(AdMetric, *value_fields)
                     .where(AdMetric.ad_id == source_id)
                 )
 
-        start_time = await self.__session.scalar(
-            time_query.order_by(desc(AdMetric.date)).limit(1)
-        )
+        end_time = await session.scalar(latest_ad_metric_query(source_table, source_id))
 
         # there are no metrics for the given source
-        if start_time is None:
+        if end_time is None:
             return []
 
-        start_time -= timedelta_from_period(period)
+        start_time = end_time - timedelta_from_period(period)
+
+        if self.__aggregate_in_db:
+            return await self.__aggregate_ad_metrics(
+                session,
+                source_table=source_table,
+                source_id=source_id,
+                start_time=start_time,
+                end_time=end_time,
+                granularity=granularity,
+                metrics=metrics,
+                segment=segment,
+            )
 
         # here we can't use __session.scalars because we can't
-        raw_data = await self.__session.execute(
+        raw_data = await session.execute(
             data_query.where(AdMetric.date > start_time)
         )
 
-        dps = [ChartDataPoint(
-                    date=d.date,
-                    device=d.device,
-                    source_id=source_id,
-                    source_table=source_table,
-                    value=value,
-                    metric=metric,
-            ) for (d, value) in raw_data.all()]
-
-
-        grouped = group_by_date(dps, granularity)
+        rows = raw_data.all()
+        points = ColumnarDataPoints.concat([
+            ColumnarDataPoints.from_columns(
+                dates=(row[0].date for row in rows),
+                devices=(row[0].device for row in rows),
+                values=(row[index] for row in rows),
+                metric=metric,
+                source_table=source_table,
+                source_id=source_id,
+            )
+            for index, metric in enumerate(summed, start=1)
+        ]).group_by_date(granularity)
 
         # if we don't care about the device, set everything to device None
         if segment != ChartSegment.device:
-            grouped = group_by_device(grouped)
+            points = points.group_by_device()
 
-        # more grouping logic goes here
+        return combine_metrics(points.aggregate().to_data_points(), metrics)
 
+    async def __aggregate_ad_metrics(self, session: AsyncSession, **kwargs) -> list[ChartDataPoint]:
+        result = await session.execute(self.__ad_buckets_query(**kwargs))
 
-        aggregated = aggregate_data_points(grouped)
+        return list(ad_bucket_data_points(result.all(), **kwargs))
 
-        return aggregated
+    def __ad_buckets_query(
+        self,
+        *,
+        source_table: SourceTable,
+        source_id: str,
+        start_time: datetime,
+        end_time: datetime,
+        granularity: PeriodSchema,
+        metrics: list[ChartMetric],
+        segment: ChartSegment,
+    ) -> Select:
+        """Same result as grouping and aggregating the rows in python, but only the buckets leave the database.
+        All the metrics are aggregated in the same pass, one column each."""
+        rollup = pick_rollup(granularity) if self.__use_rollups else None
+        summed = summed_metrics(metrics)
+
+        # both bounds are plain comparisons on the partition key, so postgres only scans the months of the period
+        raw_rows = (
+            select(
+                AdMetric.date.label("date"),
+                AdMetric.device.label("device"),
+                *(ad_metric_column(metric).label(metric.value) for metric in summed),
+            )
+            .where(AdMetric.date > start_time)
+            .where(AdMetric.date <= end_time)
+        )
 
-    async def get_for_source(self, **kwargs) -> list[ChartDataPoint]:
-        data: list[ChartDataPoint] = []
+        match source_table:
+            case SourceTable.campaign: raw_rows = raw_rows.join(Ad).where(Ad.campaign_id == source_id)
+            case SourceTable.ad: raw_rows = raw_rows.where(AdMetric.ad_id == source_id)
 
-        if kwargs.get('source_table') == SourceTable.crm:
-            for metric in kwargs['metrics']:
-                data.extend(await self.get_for_crm_source_and_metric(**kwargs, metric=metric))
+        if rollup is None:
+            rows = raw_rows.subquery()
         else:
-            for metric in kwargs['metrics']:
-                data.extend(await self.get_for_source_and_metric(**kwargs, metric=metric))
+            # the period rarely starts on a rollup boundary, so the first (partial) rollup bucket
+            # is read from the raw rows and everything after it from the rollup
+            first_full_bucket = floor_datetime(start_time, rollup_step(rollup)) + rollup_step(rollup)
+
+            rolled_rows = (
+                select(
+                    AdMetricRollup.bucket_start.label("date"),
+                    AdMetricRollup.device.label("device"),
+                    *(ad_metric_column(metric, AdMetricRollup).label(metric.value) for metric in summed),
+                )
+                .where(AdMetricRollup.granularity == rollup)
+                .where(AdMetricRollup.bucket_start >= first_full_bucket)
+            )
+
+            match source_table:
+                case SourceTable.campaign: rolled_rows = rolled_rows.where(AdMetricRollup.campaign_id == source_id)
+                case SourceTable.ad: rolled_rows = rolled_rows.where(AdMetricRollup.ad_id == source_id)
+
+            rows = union_all(raw_rows.where(AdMetric.date < first_full_bucket), rolled_rows).subquery()
+
+        bucket = bucket_expression(rows.c.date, granularity).label("bucket")
+        device = rows.c.device if segment == ChartSegment.device else null()
+        group_by = [bucket, rows.c.device] if segment == ChartSegment.device else [bucket]
+
+        return (
+            select(
+                bucket,
+                device.label("device"),
+                *(metric_aggregate(metric, rows.c).label(metric.value) for metric in metrics),
+            )
+            .group_by(*group_by)
+        )
 
-        return data
+    async def get_for_source(self, **kwargs) -> list[ChartDataPoint]:
+        if self.__shared is None:
+            return await self.__load_source(**kwargs)
+
+        metrics = kwargs.pop('metrics')
+        keys = [data_request_key(metric, **kwargs) for metric in metrics]
+
+        # the metrics nobody asked for yet are loaded together, the others wait for whoever is loading them
+        missing = list(dict.fromkeys(metric for metric, key in zip(metrics, keys) if key not in self.__shared))
+        if missing:
+            task = create_task(self.__load_source(**kwargs, metrics=missing))
+            for metric in missing:
+                self.__shared[data_request_key(metric, **kwargs)] = task
+
+        results = await gather(*(self.__shared[key] for key in keys))
+
+        return [data_point for metric, result in zip(metrics, results) for data_point in result if data_point.metric == metric]
+
+    async def __load_source(self, **kwargs) -> list[ChartDataPoint]:
+        if kwargs.get('source_table') != SourceTable.crm:
+            return await self.get_for_source_and_metrics(**kwargs)
+
+        # every CRM metric reads its own table, they are loaded in parallel instead
+        results = await gather(*(
+            self.get_for_crm_source_and_metric(**kwargs, metric=metric) for metric in kwargs['metrics']
+        ))
+
+        return [data_point for result in results for data_point in result]
 
 
-    async def get_for_chart(self, chart: Chart) -> list[ChartDataPoint]:
+    async def get_for_chart(self, chart: Chart, max_points: int | None = None) -> list[ChartDataPoint]:
+        """Data of the chart, downsampled to `max_points` per series when given."""
+        if self.__cache is None:
+            data = await self.__load_chart(chart)
+        else:
+            [data] = await self.__cached(
+                [chart], lambda charts: gather(*(self.__load_chart(chart) for chart in charts))
+            )
+
+        # after the cache, which keeps every point for any max_points
+        return data if max_points is None else downsample_data_points(data, max_points)
+
+    async def __load_chart(self, chart: Chart) -> list[ChartDataPoint]:
         tasks = []
         for source in chart.sources:
 
@@ -221,6 +574,278 @@ class DataService:
         return [data_point for result in results for data_point in result]
 
 
+    async def stream_for_chart(self, chart: Chart) -> AsyncIterator[ChartDataPoint]:
+        """Data of the chart read through server-side cursors, one query at a time, so only a batch of rows is
+        held in memory however long the period is. Always aggregated by postgres, the python paths need every row."""
+        for source in chart.sources:
+            async with self.__session_scope() as session:
+                if source.source_table == SourceTable.crm:
+                    for metric in source.metrics or []:
+                        _, created_at = crm_metric_columns(metric)
+                        latest = await session.scalar(select(created_at).order_by(desc(created_at)).limit(1))
+                        if latest is None:
+                            continue
+
+                        query = crm_buckets_query(metric, latest - timedelta_from_period(chart.period), chart.granularity)
+                        async for rows in self.__stream_rows(session, query):
+                            for data_point in crm_bucket_data_points(rows, source_table=source.source_table, metric=metric):
+                                yield data_point
+                    continue
+
+                end_time = await session.scalar(latest_ad_metric_query(source.source_table, source.source_id))
+                if end_time is None:
+                    continue
+
+                query = self.__ad_buckets_query(
+                    source_table=source.source_table,
+                    source_id=source.source_id,
+                    start_time=end_time - timedelta_from_period(chart.period),
+                    end_time=end_time,
+                    granularity=chart.granularity,
+                    metrics=source.metrics or [],
+                    segment=chart.segment,
+                )
+                async for rows in self.__stream_rows(session, query):
+                    for data_point in ad_bucket_data_points(
+                        rows, source_table=source.source_table, source_id=source.source_id, metrics=source.metrics or []
+                    ):
+                        yield data_point
+
+    @staticmethod
+    async def __stream_rows(session: AsyncSession, query: Select):
+        result = await session.stream(query.execution_options(yield_per=settings.CHART_STREAM_BATCH_SIZE))
+
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_for_charts(self, charts: list[Chart], max_points: int | None = None) -> list[list[ChartDataPoint]]:
+        """Data of a whole dashboard, in the order of `charts`, downsampled to `max_points` per series when given.
+
+        The ad/campaign sources of every chart are planned together: one latest date lookup per source table,
+        then one aggregated `IN (...)` query per source table and granularity, sliced back into each chart.
+        So the queries grow with the distinct sources of the account, not with how many charts show them.
+        """
+        if self.__cache is None:
+            data = await self.__load_charts(charts)
+        else:
+            data = await self.__cached(charts, self.__load_charts)
+
+        if max_points is None:
+            return data
+
+        return [downsample_data_points(chart_data, max_points) for chart_data in data]
+
+    async def __load_charts(self, charts: list[Chart]) -> list[list[ChartDataPoint]]:
+        if not self.__aggregate_in_db:
+            return list(await gather(*(self.get_for_chart(chart) for chart in charts)))
+
+        requests = plan_chart_requests(charts)
+
+        by_table: defaultdict[SourceTable, list[SourceRequest]] = defaultdict(list)
+        for request in requests.values():
+            by_table[request.source_table].append(request)
+
+        await gather(*(self.__load_source_batch(table, batch) for table, batch in by_table.items()))
+
+        async def chart_data(chart: Chart) -> list[ChartDataPoint]:
+            results = await gather(*(
+                self.get_for_source(
+                    source_id=source.source_id,
+                    source_table=source.source_table,
+                    period=chart.period,
+                    granularity=chart.granularity,
+                    metrics=source.metrics,
+                    segment=chart.segment,
+                )
+                for source in chart.sources if source.source_table == SourceTable.crm
+            ))
+            crm = [data_point for result in results for data_point in result]
+
+            ads = [
+                data_point
+                for source in chart.sources if source.source_table != SourceTable.crm
+                for data_point in requests[source_request_key(chart, source)].data_points
+                if data_point.metric in (source.metrics or [])
+            ]
+
+            return ads + crm
+
+        return list(await gather(*(chart_data(chart) for chart in charts)))
+
+    async def __cached(self, charts: list[Chart], load) -> list[list[ChartDataPoint]]:
+        """Data of the charts from the cache, only the missing ones are loaded (all together) and stored."""
+        versions = await self.data_versions({chart.account_id for chart in charts})
+        keys = [chart_cache_key(chart, versions[chart.account_id]) for chart in charts]
+
+        data = [await self.__cache.get(key) for key in keys]
+        missing = [index for index, chart_data in enumerate(data) if chart_data is None]
+
+        if missing:
+            loaded = await load([charts[index] for index in missing])
+
+            for index, chart_data in zip(missing, loaded):
+                data[index] = chart_data
+                await self.__cache.set(keys[index], chart_data)
+
+        return data
+
+    async def data_versions(self, account_ids: set[str]) -> defaultdict[str, dict[str, int]]:
+        """Data version of every integration of the accounts, by account id and then integration id."""
+        async with self.__session_scope() as session:
+            result = await session.execute(
+                select(AccountConfig.account_id, AccountConfig.id, AccountConfig.data_version)
+                .where(AccountConfig.account_id.in_(account_ids))
+            )
+
+        versions: defaultdict[str, dict[str, int]] = defaultdict(dict)
+        for account_id, config_id, data_version in result.all():
+            versions[account_id][config_id] = data_version
+
+        return versions
+
+    async def __load_source_batch(
+        self,
+        source_table: SourceTable,
+        requests: list[SourceRequest],
+    ):
+        source_ids = list(dict.fromkeys(request.source_id for request in requests))
+        sources = values(column("source_id", String), name="sources").data([(source_id,) for source_id in source_ids])
+
+        # the same latest date query as a single source, correlated to each id, so every one of them is still
+        # a backwards index scan instead of a max() over all the rows
+        match source_table:
+            case SourceTable.campaign:
+                latest = select(AdMetric.date).join(Ad).where(Ad.campaign_id == sources.c.source_id)
+            case SourceTable.ad:
+                latest = select(AdMetric.date).where(AdMetric.ad_id == sources.c.source_id)
+
+        latest = latest.order_by(desc(AdMetric.date)).limit(1).scalar_subquery()
+
+        async with self.__session_scope() as session:
+            end_times = dict((await session.execute(select(sources.c.source_id, latest))).all())
+
+        # sources without any metric have no data points
+        requests = [request for request in requests if end_times.get(request.source_id) is not None]
+
+        by_granularity: defaultdict[tuple, list[SourceRequest]] = defaultdict(list)
+        for request in requests:
+            by_granularity[(request.granularity.type, request.granularity.amount)].append(request)
+
+        await gather(*(
+            self.__aggregate_source_batch(source_table, batch, end_times) for batch in by_granularity.values()
+        ))
+
+    async def __aggregate_source_batch(
+        self,
+        source_table: SourceTable,
+        requests: list[SourceRequest],
+        end_times: dict[str, datetime],
+    ):
+        """`__aggregate_ad_metrics` for several sources of the same granularity at once, filling their data points.
+        Each source keeps its own period window, they are joined in as a VALUES list."""
+        granularity = requests[0].granularity
+        rollup = pick_rollup(granularity) if self.__use_rollups else None
+        metrics = list(dict.fromkeys(metric for request in requests for metric in request.metrics))
+        summed = summed_metrics(metrics)
+
+        window_rows = []
+        for index, request in enumerate(requests):
+            end_time = end_times[request.source_id]
+            start_time = end_time - timedelta_from_period(request.period)
+            first_full_bucket = (
+                floor_datetime(start_time, rollup_step(rollup)) + rollup_step(rollup) if rollup else end_time
+            )
+            window_rows.append((index, request.source_id, start_time, end_time, first_full_bucket,
+                                request.segment == ChartSegment.device))
+
+        windows = values(
+            column("request", Integer),
+            column("source_id", String),
+            column("start_time", DateTime),
+            column("end_time", DateTime),
+            column("first_full_bucket", DateTime),
+            column("by_device", Boolean),
+            name="windows",
+        ).data(window_rows)
+
+        # plain bounds on the partition key, so postgres still only scans the months of the longest period
+        min_start = min(row[2] for row in window_rows)
+        max_end = max(row[3] for row in window_rows)
+
+        raw_rows = (
+            select(
+                windows.c.request.label("request"),
+                AdMetric.date.label("date"),
+                case((windows.c.by_device, AdMetric.device), else_=null()).label("device"),
+                *(ad_metric_column(metric).label(metric.value) for metric in summed),
+            )
+            .select_from(AdMetric)
+            .where(AdMetric.date > min_start)
+            .where(AdMetric.date <= max_end)
+        )
+        in_window = and_(AdMetric.date > windows.c.start_time, AdMetric.date <= windows.c.end_time)
+
+        match source_table:
+            case SourceTable.campaign:
+                raw_rows = raw_rows.join(Ad).join(windows, and_(Ad.campaign_id == windows.c.source_id, in_window))
+            case SourceTable.ad:
+                raw_rows = raw_rows.join(windows, and_(AdMetric.ad_id == windows.c.source_id, in_window))
+
+        if rollup is None:
+            rows = raw_rows.subquery()
+        else:
+            match source_table:
+                case SourceTable.campaign: rollup_source = AdMetricRollup.campaign_id
+                case SourceTable.ad: rollup_source = AdMetricRollup.ad_id
+
+            rolled_rows = (
+                select(
+                    windows.c.request.label("request"),
+                    AdMetricRollup.bucket_start.label("date"),
+                    case((windows.c.by_device, AdMetricRollup.device), else_=null()).label("device"),
+                    *(ad_metric_column(metric, AdMetricRollup).label(metric.value) for metric in summed),
+                )
+                .select_from(AdMetricRollup)
+                .join(windows, and_(
+                    rollup_source == windows.c.source_id,
+                    AdMetricRollup.bucket_start >= windows.c.first_full_bucket,
+                ))
+                .where(AdMetricRollup.granularity == rollup)
+            )
+
+            rows = union_all(raw_rows.where(AdMetric.date < windows.c.first_full_bucket), rolled_rows).subquery()
+
+        bucket = bucket_expression(rows.c.date, granularity).label("bucket")
+
+        query = (
+            select(
+                rows.c.request,
+                bucket,
+                rows.c.device,
+                *(metric_aggregate(metric, rows.c).label(metric.value) for metric in metrics),
+            )
+            .group_by(rows.c.request, bucket, rows.c.device)
+        )
+
+        async with self.__session_scope() as session:
+            result = await session.execute(query)
+
+        for (index, bucket, device, *metric_values) in result.all():
+            request = requests[index]
+            request.data_points.extend(ChartDataPoint(
+                date=datetime_from_bucket(bucket),
+                device=device,
+                source_id=request.source_id,
+                source_table=source_table,
+                value=value,
+                metric=metric,
+            ) for metric, value in zip(metrics, metric_values) if metric in request.metrics)
+
     @classmethod
     async def get_service(cls, db: AsyncSession = Depends(get_db)):
-        return cls(db)
\ No newline at end of file
+        return cls(
+            db,
+            session_factory=AsyncSessionLocal,
+            dedupe=settings.CHART_DEDUPE_REQUESTS,
+            cache=chart_data_cache if settings.CHART_CACHE_MAX_ENTRIES else None,
+        )
\ No newline at end of file
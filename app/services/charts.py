@@ -1,18 +1,84 @@
+import hashlib
+import json
 import uuid
+from datetime import timezone
+from typing import Any, AsyncIterator, Awaitable, Callable
 
+import pydantic_core
 from fastapi import Depends, HTTPException
 from starlette import status
 
 from app.models.chart import Chart
 from app.models.chart_source import ChartSource
 from app.models.period import Period
+from app.config.application import settings
 from app.repositories.chart import ChartRepository
 from app.repositories.chart_source import ChartSourceRepository
 from app.repositories.period import PeriodRepository
 from app.schemas.chart import ChartRequest, ChartResponse, UpdateChartOrderRequest, CompleteChart, PeriodResponse, \
-    SourceSchema
+    SourceSchema, ChartDataPoint, ChartFormat, ChartSeries, ColumnarChartResponse
 from app.services.accounts import AccountService
-from app.services.chart_data import DataService
+from app.services.chart_data import DataService, chart_cache_key
+from app.utils.cache import CacheBackend, MemoryCache
+from app.utils.compression import EncodedBody, encode_body, negotiate_encoding
+
+# data points per chunk written by the streaming endpoint
+STREAM_CHUNK_POINTS = 500
+
+# the chart responses vary with the format (Accept) and the compression (Accept-Encoding)
+VARY = "Accept, Accept-Encoding"
+
+# response bodies already compressed, by ETag and encoding
+chart_response_cache = MemoryCache(max_entries=settings.CHART_CACHE_MAX_ENTRIES, ttl_seconds=settings.CHART_CACHE_TTL_SECONDS)
+
+
+def chart_series(data: list[ChartDataPoint]) -> list[ChartSeries]:
+    """Data points grouped into one series per source, metric and device, sorted by date. Each of those
+    strings is written once per series instead of once per point."""
+    columns: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    for dp in sorted(data, key=lambda dp: dp.date):
+        dates, values = columns.setdefault((dp.source_table, dp.source_id, dp.metric, dp.device), ([], []))
+        # naive dates are UTC, like in the database
+        date = dp.date if dp.date.tzinfo else dp.date.replace(tzinfo=timezone.utc)
+        dates.append(int(date.timestamp()))
+        values.append(dp.value)
+
+    return [
+        ChartSeries(source_table=source_table, source_id=source_id, metric=metric, device=device, dates=dates, values=values)
+        for (source_table, source_id, metric, device), (dates, values) in columns.items()
+    ]
+
+
+def columnar_chart_response(response: ChartResponse) -> ColumnarChartResponse:
+    return ColumnarChartResponse(chart=response.chart, series=chart_series(response.data))
+
+
+def encoded_etag(etag: str, encoding: str | None) -> str:
+    """ETag of the response compressed with `encoding`: every content coding is a representation of its own,
+    so `"<hash>"` becomes `"<hash>-gzip"`."""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def etag_without_encoding(tag: str) -> str:
+    # the hashes are hex, a dash can only start the encoding suffix
+    base, dash, _ = tag.partition("-")
+    return f'{base}"' if dash else tag
+
+
+def if_none_match_tags(if_none_match: str | None) -> list[str]:
+    # If-None-Match uses the weak comparison, so a W/ prefix doesn't matter
+    if if_none_match is None:
+        return []
+
+    return [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether the client already has this version. The encoding suffix doesn't matter: it has it, whatever
+    encoding it was sent in."""
+    tags = [etag_without_encoding(tag) for tag in if_none_match_tags(if_none_match)]
+    return "*" in tags or etag in tags
 
 
 class ChartService:
@@ -23,17 +89,18 @@ class ChartService:
             chart_source_repository: ChartSourceRepository,
             account_service: AccountService,
             data_service: DataService,
+            response_cache: CacheBackend | None = None,
     ):
         self.__repository = chart_repository
         self.__period_repo = period_repository
         self.__source_repo = chart_source_repository
         self.__account_serivce = account_service
         self.__data_service = data_service
+        self.__response_cache = response_cache
 
-    async def _make_chart_response(self, chart: Chart) -> ChartResponse:
-        data = await self.__data_service.get_for_chart(chart)
-
-        complete_chart = CompleteChart(
+    @staticmethod
+    def __complete_chart(chart: Chart) -> CompleteChart:
+        return CompleteChart(
             id=chart.id,
             name=chart.name,
             position=chart.position,
@@ -44,7 +111,29 @@ class ChartService:
             segment=chart.segment
         )
 
-        return ChartResponse(chart=complete_chart, data=data)
+    async def _make_chart_response(
+        self, chart: Chart, data: list[ChartDataPoint] | None = None, max_points: int | None = None
+    ) -> ChartResponse:
+        if data is None:
+            data = await self.__data_service.get_for_chart(chart, max_points=max_points)
+
+        return ChartResponse(chart=self.__complete_chart(chart), data=data)
+
+    async def _etag(
+        self, charts: list[Chart], format: ChartFormat = ChartFormat.json, max_points: int | None = None
+    ) -> str:
+        """Strong ETag of the responses of the charts: what is shown of each chart plus the key of its data,
+        which changes with the chart definition and the data version of the account integrations.
+        Every format and downsampling is a different representation, so it has its own ETag.
+        Needs only the data versions lookup, none of the chart data queries."""
+        versions = await self.__data_service.data_versions({chart.account_id for chart in charts})
+
+        fingerprint = json.dumps([format, max_points] + [
+            [self.__complete_chart(chart).model_dump(mode="json"), chart_cache_key(chart, versions[chart.account_id])]
+            for chart in charts
+        ])
+
+        return f'"{hashlib.sha256(fingerprint.encode()).hexdigest()}"'
 
     async def get_chart(self, chart_id: str) -> ChartResponse:
         chart = await self.__repository.get(chart_id)
@@ -54,16 +143,151 @@ class ChartService:
 
         return await self._make_chart_response(chart)
 
-    async def list_charts(self, account_id: str) -> list[ChartResponse]:
+    async def stream_chart(self, chart_id: str) -> AsyncIterator[str]:
+        """The chart as NDJSON: `{"chart": ...}` on the first line, then one data point per line.
+        The chart is loaded (or the 404 raised) before anything is sent."""
+        chart = await self.__repository.get(chart_id)
+
+        if chart is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found.")
+
+        return self.__ndjson(chart)
+
+    async def __ndjson(self, chart: Chart) -> AsyncIterator[str]:
+        yield f'{{"chart": {self.__complete_chart(chart).model_dump_json()}}}\n'
+
+        lines = []
+        async for data_point in self.__data_service.stream_for_chart(chart):
+            lines.append(data_point.model_dump_json())
+
+            if len(lines) == STREAM_CHUNK_POINTS:
+                yield "\n".join(lines) + "\n"
+                lines = []
+
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    async def get_encoded_chart(
+        self,
+        chart_id: str,
+        if_none_match: str | None,
+        format: ChartFormat,
+        accept_encoding: str | None,
+        max_points: int | None = None,
+    ) -> tuple[EncodedBody, str]:
+        """`get_chart` in `format`, with at most `max_points` per series when given, as the JSON body compressed
+        for `accept_encoding`, and the ETag of the encoding it went out with.
+        Raises a 304 instead when the client already has this version of it."""
+        encoding = negotiate_encoding(accept_encoding)
+        chart = await self.__get_or_404(chart_id)
+        content = lambda: self.__formatted_chart(chart, format, max_points)
+        etag = await self.__etag_unless_matched([chart], if_none_match, format, max_points, encoding, content)
+        body = await self.__encoded(etag, encoding, content)
+
+        return body, encoded_etag(etag, body.encoding)
+
+    async def list_encoded_charts(
+        self,
+        account_id: str,
+        if_none_match: str | None,
+        format: ChartFormat,
+        accept_encoding: str | None,
+        max_points: int | None = None,
+    ) -> tuple[EncodedBody, str]:
+        """The charts of the account in `format`, with at most `max_points` per series when given, as the JSON
+        body compressed for `accept_encoding`, and the ETag of the encoding it went out with.
+        Raises a 304 instead when the client already has this version of it."""
+        encoding = negotiate_encoding(accept_encoding)
         charts = await self.__repository.list(account_id)
+        content = lambda: self.__formatted_charts(charts, format, max_points)
+        etag = await self.__etag_unless_matched(charts, if_none_match, format, max_points, encoding, content)
+        body = await self.__encoded(etag, encoding, content)
+
+        return body, encoded_etag(etag, body.encoding)
+
+    async def __get_or_404(self, chart_id: str) -> Chart:
+        chart = await self.__repository.get(chart_id)
+
+        if chart is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found.")
+
+        return chart
+
+    async def __etag_unless_matched(
+        self,
+        charts: list[Chart],
+        if_none_match: str | None,
+        format: ChartFormat,
+        max_points: int | None,
+        encoding: str | None,
+        content: Callable[[], Awaitable[Any]],
+    ) -> str:
+        """ETag of the charts, without the encoding suffix. Raises a 304 instead when the client already has this
+        version, with the ETag the body of `content` would go out with for `encoding`."""
+        etag = await self._etag(charts, format, max_points)
+
+        if etag_matches(if_none_match, etag):
+            if encoding is not None:
+                encoding = await self.__applied_encoding(etag, encoding, if_none_match, content)
+
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": encoded_etag(etag, encoding), "Vary": VARY},
+            )
 
-        chart_responses = []
+        return etag
 
-        for chart in charts:
-            response = await self._make_chart_response(chart)
-            chart_responses.append(response)
+    async def __applied_encoding(
+        self, etag: str, encoding: str, if_none_match: str, content: Callable[[], Awaitable[Any]]
+    ) -> str | None:
+        """`encoding`, or None when the body is too short to be compressed. Every encoding of a version has the
+        same body, so a client holding a compressed one shows it is long enough; otherwise the body tells."""
+        if any(tag != etag and etag_without_encoding(tag) == etag for tag in if_none_match_tags(if_none_match)):
+            return encoding
 
-        return chart_responses
+        return (await self.__encoded(etag, encoding, content)).encoding
+
+    async def __formatted_chart(
+        self, chart: Chart, format: ChartFormat, max_points: int | None
+    ) -> ChartResponse | ColumnarChartResponse:
+        response = await self._make_chart_response(chart, max_points=max_points)
+
+        return columnar_chart_response(response) if format == ChartFormat.columnar else response
+
+    async def __formatted_charts(
+        self, charts: list[Chart], format: ChartFormat, max_points: int | None
+    ) -> list[ChartResponse] | list[ColumnarChartResponse]:
+        responses = await self.__chart_responses(charts, max_points)
+
+        if format == ChartFormat.columnar:
+            responses = [columnar_chart_response(response) for response in responses]
+
+        return responses
+
+    async def __encoded(
+        self, etag: str, encoding: str | None, content: Callable[[], Awaitable[Any]]
+    ) -> EncodedBody:
+        """The body of `content` compressed with `encoding` (when it is long enough). With a response cache
+        it is kept by ETag and encoding, so a hit pays neither the data, the serialization nor the compression."""
+        key = f"{etag}:{encoding}"
+
+        if self.__response_cache is not None:
+            body = await self.__response_cache.get(key)
+            if body is not None:
+                return body
+
+        body = encode_body(pydantic_core.to_json(await content()), encoding)
+
+        if self.__response_cache is not None:
+            await self.__response_cache.set(key, body)
+
+        return body
+
+    async def __chart_responses(self, charts: list[Chart], max_points: int | None = None) -> list[ChartResponse]:
+        # the data of all the charts is planned together, so shared sources are only queried once
+        data = await self.__data_service.get_for_charts(charts, max_points=max_points)
+
+        return [await self._make_chart_response(chart, chart_data) for chart, chart_data in zip(charts, data)]
 
     async def create_chart(self, chart_req: ChartRequest):
         # this throws 404 if the account does not exist
@@ -205,4 +429,11 @@ class ChartService:
             account_service: AccountService = Depends(AccountService.get_service),
             data_service: DataService = Depends(DataService.get_service)
     ):
-        return cls(chart_repository, period_repository, chart_source_repository, account_service, data_service)
+        return cls(
+            chart_repository,
+            period_repository,
+            chart_source_repository,
+            account_service,
+            data_service,
+            response_cache=chart_response_cache if settings.CHART_CACHE_MAX_ENTRIES else None,
+        )
@@ -1,9 +1,11 @@
+import asyncio
+
 from fastapi import Depends, HTTPException
 from starlette import status
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from app.services.activecampaign_service import get_deals, get_contacts, get_messages
+from app.services.activecampaign_service import ActiveCampaignClient
 from app.models.deal import Deal
 from app.models.message import Message
 from app.models.contact import Contact
@@ -11,6 +13,19 @@ from app.repositories.account_config import AccountConfigRepository
 from app.repositories.deal import DealRepository
 from app.repositories.contact import ContactRepository
 from app.repositories.message import MessageRepository
+from app.repositories.sync_checkpoint import SyncCheckpointRepository
+
+# records changed up to this long before the checkpoint are fetched again, upserts make it harmless
+CHECKPOINT_OVERLAP = timedelta(hours=1)
+
+
+def latest_change(records: list[dict], field: str) -> datetime | None:
+    """Latest `field` date of the records, as the wall time of the CRM account's time zone.
+
+    That is the zone ActiveCampaign reads `filters[updated_after]` in, so a checkpoint taken from its own
+    dates doesn't depend on the clock or the time zone of this server."""
+    dates = [datetime.fromisoformat(record[field]) for record in records if record.get(field)]
+    return max(dates).replace(tzinfo=None) if dates else None
 
 
 class CrmService:
@@ -20,11 +35,15 @@ class CrmService:
         deal_repository: DealRepository,
         contact_repository: ContactRepository,
         message_repository: MessageRepository,
+        checkpoint_repository: SyncCheckpointRepository,
+        activecampaign_client: ActiveCampaignClient | None = None,
     ):
         self.__account_config_repository = account_config_repository
         self.__deal_repository = deal_repository
         self.__contact_repository = contact_repository
         self.__message_repository = message_repository
+        self.__checkpoint_repository = checkpoint_repository
+        self.__activecampaign_client = activecampaign_client or ActiveCampaignClient()
 
 
     async def fetch_new_data(self, config_id: str):
@@ -38,9 +57,17 @@ class CrmService:
             )
 
         # TODO: use the config.api_secret
-        deals = get_deals()
+        deals_since = await self.__since(config_id, "deals")
+        contacts_since = await self.__since(config_id, "contacts")
+
+        # the three lists are paged concurrently, the client bounds the requests in flight
+        deals, messages, contacts = await asyncio.gather(
+            self.__activecampaign_client.list_deals(updated_after=deals_since),
+            self.__activecampaign_client.list_messages(),
+            self.__activecampaign_client.list_contacts(updated_after=contacts_since),
+        )
 
-        await self.__deal_repository.create_many([
+        deals_result = await self.__deal_repository.upsert_many([
             Deal(
                 id=str(uuid.uuid4()),
                 integration_id=config_id,
@@ -53,11 +80,11 @@ class CrmService:
                 created_at=datetime.fromisoformat(deal.get("cdate")).replace(tzinfo=None) if deal.get("cdate") else None,
                 closed_at=datetime.fromisoformat(deal.get("edate")).replace(tzinfo=None) if deal.get("edate") else None,
             ) for deal in deals])
+        await self.__save_checkpoint(config_id, "deals", latest_change(deals, "mdate"))
 
-        messages = get_messages()
         print(f"messages: {len(messages)}")
 
-        await self.__message_repository.create_many([
+        messages_result = await self.__message_repository.upsert_many([
            Message(
                id=str(uuid.uuid4()),
                integration_id=config_id,
@@ -66,10 +93,8 @@ class CrmService:
                priority=int(message.get("priority", 0)),
                create_date=datetime.fromisoformat(message.get("cdate")).replace(tzinfo=None) if message.get("cdate") else None
            ) for message in messages])
-        
-        contacts = get_contacts()
 
-        await self.__contact_repository.create_many([
+        contacts_result = await self.__contact_repository.upsert_many([
             Contact(
                 id=str(uuid.uuid4()),
                 integration_id=config_id,
@@ -80,9 +105,20 @@ class CrmService:
                 created_at=datetime.fromisoformat(contact.get("cdate")).replace(tzinfo=None) if contact.get("cdate") else None,
                 source=contact.get("source", "unknown")
             ) for contact in contacts])
+        await self.__save_checkpoint(config_id, "contacts", latest_change(contacts, "udate"))
+
+        print(f"deals: {deals_result}, messages: {messages_result}, contacts: {contacts_result}")
 
-        pass
+    async def __since(self, config_id: str, resource: str) -> datetime | None:
+        """Checkpoint of the resource, minus an overlap for changes saved in the CRM in the same second or out
+        of order, and for daylight saving changes of the account's time zone."""
+        checkpoint = await self.__checkpoint_repository.get(config_id, resource)
+        return checkpoint - CHECKPOINT_OVERLAP if checkpoint else None
 
+    async def __save_checkpoint(self, config_id: str, resource: str, synced_until: datetime | None):
+        # nothing changed since the last checkpoint, it still holds
+        if synced_until is not None:
+            await self.__checkpoint_repository.save(config_id, resource, synced_until)
 
     @classmethod
     async def get_service(
@@ -91,5 +127,8 @@ class CrmService:
         deal_repository: DealRepository = Depends(DealRepository.get_service),
         contact_repository: ContactRepository = Depends(ContactRepository.get_service),
         message_repository: MessageRepository = Depends(MessageRepository.get_service),
+        checkpoint_repository: SyncCheckpointRepository = Depends(SyncCheckpointRepository.get_service),
+        activecampaign_client: ActiveCampaignClient = Depends(ActiveCampaignClient.get_service),
     ):
-        return cls(account_config_repository, deal_repository, contact_repository, message_repository)
\ No newline at end of file
+        return cls(account_config_repository, deal_repository, contact_repository, message_repository,
+                   checkpoint_repository, activecampaign_client)
\ No newline at end of file
@@ -1,4 +1,6 @@
+import asyncio
 import traceback
+from datetime import date, datetime, timedelta
 from logging import info, error
 
 from facebook_business.adobjects.ad import Ad
@@ -6,14 +8,42 @@ from facebook_business.adobjects.adaccount import AdAccount
 from facebook_business.adobjects.campaign import Campaign
 from facebook_business.api import FacebookAdsApi
 from fastapi import Depends
+from httpx import AsyncClient
 
+from app.config.application import settings
 from app.models.ad import Ad as AdModel
 from app.models.ad_metric import AdMetric
 from app.models.campaign import Campaign as CampaignModel
 from app.repositories.account_config import AccountConfigRepository
 from app.repositories.ad import AdRepository
-from app.repositories.ad_metric import AdMetricRepository
+from app.repositories.ad_metric import AdMetricRepository, UPSERT_CHUNK_SIZE
 from app.repositories.campaign import CampaignRepository
+from app.services.graph_api import GraphApiClient
+
+INSIGHTS_FIELDS = [
+    'impressions',
+    'reach',
+    'clicks',
+    'ctr',
+    'date_stop'
+]
+INSIGHTS_PARAMS = {
+    'breakdowns': ['device_platform'],
+    'time_increment': 1
+}
+
+
+def insights_params(latest_date: datetime | None) -> dict:
+    """Insights request params from the latest metric already stored (the high-water mark).
+
+    Without a mark the whole last year is requested. With one, only the days since the mark,
+    minus META_ATTRIBUTION_WINDOW_DAYS because Meta keeps attributing conversions to past days.
+    """
+    if latest_date is None:
+        return {**INSIGHTS_PARAMS, 'date_preset': 'last_year'}
+
+    since = latest_date.date() - timedelta(days=settings.META_ATTRIBUTION_WINDOW_DAYS)
+    return {**INSIGHTS_PARAMS, 'time_range': {'since': since.isoformat(), 'until': date.today().isoformat()}}
 
 
 class MetaAdsService:
@@ -21,11 +51,25 @@ class MetaAdsService:
                  campaign_repository: CampaignRepository,
                  account_config_repository: AccountConfigRepository,
                  ad_repository: AdRepository,
-                 ad_metrics_repository: AdMetricRepository):
+                 ad_metrics_repository: AdMetricRepository,
+                 http_client: AsyncClient | None = None):
         self.__campaign_repository = campaign_repository
         self.__account_config_repository = account_config_repository
         self.__ad_repository = ad_repository
         self.__ad_metrics_repository = ad_metrics_repository
+        self.__http_client = http_client
+        # the SDK is blocking, its calls run in worker threads and at most META_CONCURRENCY at once
+        self.__graph_semaphore = asyncio.Semaphore(settings.META_CONCURRENCY)
+        # the repositories share one session, which can't run two statements at once
+        self.__db_lock = asyncio.Lock()
+
+    async def __fetch(self, request, *args, **kwargs) -> list:
+        """Runs an SDK request and reads every page of its cursor in a worker thread."""
+        def fetch_all():
+            return [item.export_all_data() for item in request(*args, **kwargs)]
+
+        async with self.__graph_semaphore:
+            return await asyncio.to_thread(fetch_all)
 
     async def refresh_data(self):
         facebookConfigs = await self.__account_config_repository.get_by_type('facebook_ads')
@@ -38,26 +82,42 @@ class MetaAdsService:
                            Campaign.Field.stop_time,
                            Campaign.Field.daily_budget]
 
+        # in report mode the insights of every ad come from a single account report, after the ads are synced
+        report_mode = settings.META_INSIGHTS_MODE == 'report'
+
         try:
-            for campaign in AdAccount(facebookConfigs.account_id).get_campaigns(fields=campaign_fields):
-                campaign_aux = campaign.export_all_data()
-                campaign_model = CampaignModel(
-                    remote_id=campaign_aux.get('id'),
-                    integration_id=facebookConfigs.id,
-                    name=campaign_aux.get('name'),
-                    start_date=campaign_aux.get('start_time'),
-                    end_date=campaign_aux.get('stop_time'),
-                    daily_budget=campaign_aux.get('daily_budget'),
-                    monthly_budget=None)
-
-                campaign_model = await self.__campaign_repository.create_or_update(campaign_model)
-                await self.get_ads(campaign_model)
-        except Exception as e:
+            campaigns = await self.__fetch(AdAccount(facebookConfigs.account_id).get_campaigns, fields=campaign_fields)
+
+            async with asyncio.TaskGroup() as tasks:
+                campaign_tasks = [
+                    tasks.create_task(self.get_campaign(campaign_aux, facebookConfigs.id, with_insights=not report_mode))
+                    for campaign_aux in campaigns
+                ]
+
+            if report_mode:
+                ads = [ad for task in campaign_tasks for ad in task.result()]
+                await self.get_account_insights(facebookConfigs.account_id, facebookConfigs.access_token, ads)
+        except* Exception:
             error(f"MetaAdsService exception: {traceback.format_exc()}")
 
         info('MetaAdsService refreh_data finished')
 
-    async def get_ads(self, campaign):
+    async def get_campaign(self, campaign_aux: dict, integration_id: str, with_insights: bool = True) -> list[AdModel]:
+        campaign_model = CampaignModel(
+            remote_id=campaign_aux.get('id'),
+            integration_id=integration_id,
+            name=campaign_aux.get('name'),
+            start_date=campaign_aux.get('start_time'),
+            end_date=campaign_aux.get('stop_time'),
+            daily_budget=campaign_aux.get('daily_budget'),
+            monthly_budget=None)
+
+        async with self.__db_lock:
+            campaign_model = await self.__campaign_repository.create_or_update(campaign_model)
+
+        return await self.get_ads(campaign_model, with_insights)
+
+    async def get_ads(self, campaign, with_insights: bool = True) -> list[AdModel]:
         info('MetaAdsService get_ads starting')
         campaign_obj = Campaign(campaign.remote_id)
         ad_fields = [
@@ -65,50 +125,101 @@ class MetaAdsService:
             Ad.Field.name,
             Ad.Field.created_time
         ]
-        for ad in campaign_obj.get_ads(fields=ad_fields):
-            ad_aux = ad.export_all_data()
-            ad_model = AdModel(remote_id=ad_aux.get('id'),
-                               integration_id=campaign.integration_id,
-                               campaign_id=campaign.id,
-                               name=ad_aux.get('name'),
-                               created_at=ad_aux.get('created_time'),
-                               campaign=campaign)
-
-            ad_model = await self.__ad_repository.create_or_update(ad_model)
-            await self.get_insights(ad_model)
+        ads = await self.__fetch(campaign_obj.get_ads, fields=ad_fields)
+        ad_models = []
+
+        async with asyncio.TaskGroup() as tasks:
+            for ad_aux in ads:
+                ad_model = AdModel(remote_id=ad_aux.get('id'),
+                                   integration_id=campaign.integration_id,
+                                   campaign_id=campaign.id,
+                                   name=ad_aux.get('name'),
+                                   created_at=ad_aux.get('created_time'),
+                                   campaign=campaign)
+
+                async with self.__db_lock:
+                    ad_model = await self.__ad_repository.create_or_update(ad_model)
+
+                ad_models.append(ad_model)
+
+                if with_insights:
+                    tasks.create_task(self.get_insights(ad_model))
 
         info('MetaAdsService get_ads finished')
+        return ad_models
 
     async def get_insights(self, ad):
         info('MetaAdsService get_insights starting')
         ad_obj = Ad(ad.remote_id)
-        fields = [
-            'impressions',
-            'reach',
-            'clicks',
-            'ctr',
-            'date_stop'
+
+        async with self.__db_lock:
+            latest_dates = await self.__ad_metrics_repository.latest_dates([ad.id])
+
+        params = insights_params(latest_dates.get(ad.id))
+        insights = await self.__fetch(ad_obj.get_insights, fields=INSIGHTS_FIELDS, params=params)
+
+        ad_metrics = [
+            AdMetric.from_raw(ad_id=ad.id,
+                              ctr=insight.get('ctr'),
+                              impressions=insight.get('impressions'),
+                              views=insight.get('reach'),
+                              clicks=insight.get('clicks'),
+                              device=insight.get('device_platform'),
+                              date_raw=insight.get('date_stop'))
+            for insight in insights
         ]
-        params = {
-            'breakdowns': ['device_platform'],
-            'date_preset': 'last_year',
-            'time_increment': 1
-        }
-        insights = ad_obj.get_insights(fields=fields, params=params)
-
-        for insight in insights:
-            ad_metrics_model = AdMetric.from_raw(ad_id=ad.id,
-                                                 ctr=insight.get('ctr'),
-                                                 impressions=insight.get('impressions'),
-                                                 views=insight.get('reach'),
-                                                 clicks=insight.get('clicks'),
-                                                 device=insight.get('device_platform'),
-                                                 date_raw=insight.get('date_stop')
-                                                 )
-            await self.__ad_metrics_repository.create_or_update(ad_metrics_model)
+
+        async with self.__db_lock:
+            await self.__ad_metrics_repository.upsert_many(ad_metrics)
 
         info('MetaAdsService get_insights finished')
 
+    async def get_account_insights(self, account_id: str, access_token: str, ads: list[AdModel]):
+        """Pulls the daily, per device insights of every ad of the account with one async report job,
+        and upserts the result pages as they arrive."""
+        info('MetaAdsService get_account_insights starting')
+        graph = GraphApiClient(access_token, self.__http_client)
+        ad_ids = {ad.remote_id: ad.id for ad in ads}
+
+        # one report for the account, so it starts from the ad that is furthest behind
+        async with self.__db_lock:
+            latest_dates = await self.__ad_metrics_repository.latest_dates(list(ad_ids.values()))
+        account_latest_date = min(latest_dates.values()) if len(latest_dates) == len(ad_ids) else None
+
+        report_run_id = await graph.start_insights_report(account_id, ['ad_id', *INSIGHTS_FIELDS], {
+            **insights_params(account_latest_date),
+            'level': 'ad',
+            'breakdowns': ','.join(INSIGHTS_PARAMS['breakdowns']),
+        })
+        await graph.wait_for_report(report_run_id)
+
+        ad_metrics = []
+
+        async for page in graph.iter_report_pages(report_run_id):
+            ad_metrics.extend(
+                AdMetric.from_raw(ad_id=ad_ids[insight['ad_id']],
+                                  ctr=insight.get('ctr'),
+                                  impressions=insight.get('impressions'),
+                                  views=insight.get('reach'),
+                                  clicks=insight.get('clicks'),
+                                  device=insight.get('device_platform'),
+                                  date_raw=insight.get('date_stop'))
+                # ads that weren't synced (deleted, archived) have nowhere to go
+                for insight in page
+                if insight.get('ad_id') in ad_ids
+            )
+
+            if len(ad_metrics) >= UPSERT_CHUNK_SIZE:
+                async with self.__db_lock:
+                    await self.__ad_metrics_repository.upsert_many(ad_metrics)
+                ad_metrics = []
+
+        if ad_metrics:
+            async with self.__db_lock:
+                await self.__ad_metrics_repository.upsert_many(ad_metrics)
+
+        info('MetaAdsService get_account_insights finished')
+
     @classmethod
     async def get_service(cls,
                           campaign_repository: CampaignRepository = Depends(CampaignRepository.get_service),
@@ -56,6 +56,8 @@ class RefreshService:
 
             accountConfig.last_refresh = datetime.now()
             await self.__repository.update(accountConfig.id, accountConfig)
+            # cached charts of this integration are stale from now on
+            await self.__repository.bump_data_version(accountConfig.id)
 
         return
 
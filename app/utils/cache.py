@@ -0,0 +1,61 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+
+class CacheBackend(ABC):
+    """Where cached values live. Methods are async so a shared backend (redis, memcached...) can be plugged in
+    without touching the callers, such a backend is expected to serialize the values itself."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any): ...
+
+    @abstractmethod
+    async def delete(self, key: str): ...
+
+    @abstractmethod
+    async def clear(self): ...
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache: at most `max_entries` values, each one dropped `ttl_seconds` after it was set."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float | None = None):
+        self.__entries: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+        self.__max_entries = max_entries
+        self.__ttl_seconds = ttl_seconds
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    async def get(self, key: str) -> Any | None:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.__entries[key]
+            return None
+
+        self.__entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        expires_at = time.monotonic() + self.__ttl_seconds if self.__ttl_seconds else None
+
+        self.__entries[key] = (expires_at, value)
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self.__entries.pop(key, None)
+
+    async def clear(self):
+        self.__entries.clear()
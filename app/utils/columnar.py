@@ -0,0 +1,158 @@
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+
+from app.models.ad_metric import DeviceType
+from app.models.chart_source import ChartMetric, SourceTable
+from app.schemas.chart import ChartDataPoint, PeriodSchema
+from app.utils.period import timedelta_from_period
+
+# codes of the categorical columns are positions in these lists
+DEVICES: list[DeviceType | None] = [None, *DeviceType]
+METRICS: list[ChartMetric] = list(ChartMetric)
+DEVICE_CODES = {device: code for code, device in enumerate(DEVICES)}
+METRIC_CODES = {metric: code for code, metric in enumerate(METRICS)}
+
+
+class ColumnarDataPoints:
+    """Data points as parallel NumPy arrays instead of one ChartDataPoint each.
+
+    `date` is in microseconds since the epoch (naive datetimes read as UTC, like `bucket_expression`),
+    device and metric are codes of DEVICES and METRICS, source is the position in `sources`.
+    Grouping and aggregating are whole-array operations, ChartDataPoints are only built by `to_data_points`.
+    """
+
+    def __init__(self, date, device, source, metric, value, sources: list[tuple[SourceTable, str]]):
+        self.date = date
+        self.device = device
+        self.source = source
+        self.metric = metric
+        self.value = value
+        self.sources = sources
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    @classmethod
+    def from_columns(
+        cls,
+        *,
+        dates: Iterable[datetime],
+        devices: Iterable[DeviceType | None],
+        values: Iterable[float | None],
+        metric: ChartMetric,
+        source_table: SourceTable,
+        source_id: str,
+    ) -> "ColumnarDataPoints":
+        """Points of one metric of one source, straight from the query columns."""
+        date = np.array(list(dates), dtype="datetime64[us]").astype(np.int64)
+        size = len(date)
+
+        return cls(
+            date=date,
+            device=np.fromiter((DEVICE_CODES[device] for device in devices), dtype=np.int8, count=size),
+            source=np.zeros(size, dtype=np.int32),
+            metric=np.full(size, METRIC_CODES[metric], dtype=np.int8),
+            # a null value adds nothing, like sum() in postgres
+            value=np.fromiter((value or 0 for value in values), dtype=np.float64, count=size),
+            sources=[(source_table, source_id)],
+        )
+
+    @classmethod
+    def from_data_points(cls, data_points: list[ChartDataPoint]) -> "ColumnarDataPoints":
+        sources: dict[tuple[SourceTable, str], int] = {}
+        size = len(data_points)
+
+        return cls(
+            date=np.array([dp.date.replace(tzinfo=None) for dp in data_points], dtype="datetime64[us]").astype(np.int64),
+            device=np.fromiter((DEVICE_CODES[dp.device] for dp in data_points), dtype=np.int8, count=size),
+            source=np.fromiter(
+                (sources.setdefault((dp.source_table, dp.source_id), len(sources)) for dp in data_points),
+                dtype=np.int32,
+                count=size,
+            ),
+            metric=np.fromiter((METRIC_CODES[dp.metric] for dp in data_points), dtype=np.int8, count=size),
+            value=np.fromiter((dp.value for dp in data_points), dtype=np.float64, count=size),
+            sources=list(sources),
+        )
+
+    @classmethod
+    def concat(cls, parts: list["ColumnarDataPoints"]) -> "ColumnarDataPoints":
+        sources: list[tuple[SourceTable, str]] = []
+        source_columns = []
+
+        for part in parts:
+            source_columns.append(part.source + len(sources))
+            sources.extend(part.sources)
+
+        return cls(
+            date=np.concatenate([part.date for part in parts] or [np.empty(0, dtype=np.int64)]),
+            device=np.concatenate([part.device for part in parts] or [np.empty(0, dtype=np.int8)]),
+            source=np.concatenate(source_columns or [np.empty(0, dtype=np.int32)]),
+            metric=np.concatenate([part.metric for part in parts] or [np.empty(0, dtype=np.int8)]),
+            value=np.concatenate([part.value for part in parts] or [np.empty(0, dtype=np.float64)]),
+            sources=sources,
+        )
+
+    def __replace(self, **columns) -> "ColumnarDataPoints":
+        return ColumnarDataPoints(**{
+            "date": self.date,
+            "device": self.device,
+            "source": self.source,
+            "metric": self.metric,
+            "value": self.value,
+            "sources": self.sources,
+            **columns,
+        })
+
+    def group_by_date(self, period: PeriodSchema) -> "ColumnarDataPoints":
+        """`group_by_date` on every point at once: floors each date to the start of its bucket."""
+        step = int(timedelta_from_period(period).total_seconds() * 1_000_000)
+        return self.__replace(date=self.date // step * step)
+
+    def group_by_device(self) -> "ColumnarDataPoints":
+        return self.__replace(device=np.zeros_like(self.device))
+
+    def aggregate(self) -> "ColumnarDataPoints":
+        """`aggregate_data_points`: one point per source, date, device and metric, summing their values.
+        The keys are sorted together and every run of equal keys is reduced with a single add.reduceat."""
+        if len(self) == 0:
+            return self
+
+        order = np.lexsort((self.metric, self.device, self.date, self.source))
+        keys = [column[order] for column in (self.source, self.date, self.device, self.metric)]
+
+        changed = np.zeros(len(order), dtype=bool)
+        changed[0] = True
+        for column in keys:
+            changed[1:] |= column[1:] != column[:-1]
+
+        starts = np.flatnonzero(changed)
+        source, date, device, metric = (column[starts] for column in keys)
+
+        return ColumnarDataPoints(
+            date=date,
+            device=device,
+            source=source,
+            metric=metric,
+            value=np.add.reduceat(self.value[order], starts),
+            sources=self.sources,
+        )
+
+    def to_data_points(self) -> list[ChartDataPoint]:
+        dates = self.date.astype("datetime64[us]").tolist()
+
+        return [
+            ChartDataPoint(
+                date=date,
+                device=DEVICES[device],
+                source_table=self.sources[source][0],
+                source_id=self.sources[source][1],
+                value=value,
+                metric=METRICS[metric],
+            )
+            for date, device, source, metric, value in zip(
+                dates, self.device.tolist(), self.source.tolist(), self.metric.tolist(), self.value.tolist()
+            )
+        ]
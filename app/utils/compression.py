@@ -0,0 +1,191 @@
+import gzip
+import zlib
+from typing import NamedTuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config.application import settings
+
+try:
+    import brotli
+except ImportError:  # optional, without it only zstd and gzip are offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, without it only br and gzip are offered
+    zstandard = None
+
+GZIP_LEVEL = 6
+# the default (11) is meant for static files, too slow for every response
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# preferred first, when the client accepts several
+ENCODINGS = [
+    encoding for encoding, available in (("zstd", zstandard), ("br", brotli), ("gzip", gzip))
+    if available is not None
+]
+
+
+class EncodedBody(NamedTuple):
+    content: bytes
+    # Content-Encoding of `content`, None when it went out as it was
+    encoding: str | None
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """The preferred encoding of ENCODINGS the client accepts (q=0 means it doesn't), None for none of them."""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            accepted[name.strip().lower()] = float(q) if q else 1.0
+        except ValueError:
+            continue
+
+    return next(
+        (encoding for encoding in ENCODINGS if accepted.get(encoding, accepted.get("*", 0)) > 0),
+        None,
+    )
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    match encoding:
+        case "zstd":
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+        case "br":
+            return brotli.compress(content, quality=BROTLI_QUALITY)
+        case "gzip":
+            return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def encode_body(content: bytes, encoding: str | None, minimum_size: int | None = None) -> EncodedBody:
+    """`content` compressed with `encoding`, unless there is none or it is shorter than `minimum_size`."""
+    if minimum_size is None:
+        minimum_size = settings.COMPRESSION_MINIMUM_SIZE
+
+    if encoding is None or len(content) < minimum_size:
+        return EncodedBody(content, None)
+
+    return EncodedBody(compress(content, encoding), encoding)
+
+
+class StreamCompressor:
+    """Compresses a body sent in chunks. Every chunk is flushed, so a streamed response still arrives as it is
+    written instead of when the compressor's buffer fills."""
+
+    def __init__(self, encoding: str):
+        self.__encoding = encoding
+
+        match encoding:
+            case "zstd":
+                self.__compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            case "br":
+                self.__compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            case "gzip":
+                self.__compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            case _:
+                raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        match self.__encoding:
+            case "zstd":
+                return self.__compressor.compress(chunk) + self.__compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            case "br":
+                return self.__compressor.process(chunk) + self.__compressor.flush()
+            case _:
+                return self.__compressor.compress(chunk) + self.__compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        match self.__encoding:
+            case "br":
+                return self.__compressor.finish()
+            case _:
+                return self.__compressor.flush()
+
+
+class CompressionMiddleware:
+    """Compresses response bodies with the best encoding the client accepts.
+
+    Bodies sent at once are left alone below `minimum_size`, streamed ones are always compressed.
+    Responses that already have a Content-Encoding (like the cached chart bodies) go out untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int | None = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        await CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send | None = None
+        self.start_message: Message | None = None
+        self.compressor: StreamCompressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # held until the first body tells if it is worth compressing
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is None:
+            body = self.compressor.compress(body)
+            if not more_body:
+                body += self.compressor.finish()
+            return await self.send({**message, "body": body})
+
+        start, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start["headers"])
+
+        if "content-encoding" in headers or (not more_body and len(body) < max(self.minimum_size, 1)):
+            self.passthrough = True
+            await self.send(start)
+            return await self.send(message)
+
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+        if more_body:
+            # the compressed length isn't known before the end
+            del headers["Content-Length"]
+            self.compressor = StreamCompressor(self.encoding)
+            body = self.compressor.compress(body)
+        else:
+            body = compress(body, self.encoding)
+            headers["Content-Length"] = str(len(body))
+
+        await self.send(start)
+        await self.send({**message, "body": body})
@@ -0,0 +1,37 @@
+def lttb(xs: list[float], ys: list[float], threshold: int) -> list[int]:
+    """Largest-Triangle-Three-Buckets: positions of at most `threshold` points that keep the shape of the line.
+
+    The first and last points are always kept. The ones between are split in `threshold - 2` buckets, and from
+    each bucket the point making the largest triangle with the point kept before it and the average of the next
+    bucket is kept. Peaks and dips make large triangles, so they survive. `xs` must be sorted.
+    """
+    size = len(xs)
+
+    if threshold >= size or threshold < 3:
+        return list(range(size))
+
+    every = (size - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+
+        next_end = min(int((bucket + 2) * every) + 1, size)
+        next_size = next_end - end
+        average_x = sum(xs[end:next_end]) / next_size
+        average_y = sum(ys[end:next_end]) / next_size
+
+        best, best_area = start, -1.0
+        for point in range(start, end):
+            # twice the area of the triangle, only compared
+            area = abs((xs[a] - average_x) * (ys[point] - ys[a]) - (xs[a] - xs[point]) * (average_y - ys[a]))
+            if area > best_area:
+                best, best_area = point, area
+
+        kept.append(best)
+        a = best
+
+    kept.append(size - 1)
+    return kept
@@ -12,3 +12,8 @@ class Extension:
             return float(val)
         except (ValueError, TypeError):
             return None
+
+    @staticmethod
+    def chunked(items: list, size: int):
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from app.models.period import PeriodType
+from app.schemas.chart import PeriodSchema
+
+
+def timedelta_from_period(period: PeriodSchema) -> timedelta:
+    match period.type:
+        case PeriodType.month: return timedelta(days=30 * period.amount)
+        case PeriodType.week: return timedelta(weeks=period.amount)
+        case PeriodType.day: return timedelta(days=period.amount)
+        case PeriodType.hour: return timedelta(hours=period.amount)
+        case _: raise NotImplementedError(f"Unsupported period type: {period.type}")
+
+def bucket_expression(column, period: PeriodSchema):
+    """SQL equivalent of `group_by_date`: floors `column` to its bucket start, as epoch seconds."""
+    step_seconds = timedelta_from_period(period).total_seconds()
+
+    return func.floor(func.extract("epoch", column) / step_seconds) * step_seconds
+
+def datetime_from_bucket(epoch: float) -> datetime:
+    # timestamps are stored without time zone, postgres reads them as UTC when extracting the epoch
+    return datetime.fromtimestamp(float(epoch), tz=timezone.utc).replace(tzinfo=None)
+
+def floor_datetime(date: datetime, step: timedelta) -> datetime:
+    """Python side of `bucket_expression`, for naive datetimes stored as UTC."""
+    epoch = date.replace(tzinfo=timezone.utc).timestamp()
+    step_seconds = step.total_seconds()
+
+    return datetime_from_bucket(epoch // step_seconds * step_seconds)
@@ -0,0 +1,16 @@
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+
+
+class ModelResponse(JSONResponse):
+    """JSON response written straight from pydantic models (or lists and dicts of them) by pydantic-core.
+
+    Returned from a route it skips what FastAPI does with `response_model`: validating the models again,
+    dumping them to dicts and encoding those with json.dumps. Keep `response_model` on the route for the docs,
+    the content must already be the models it declares.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
@@ -0,0 +1,135 @@
+import pytest
+import sys
+import os
+import asyncio
+import httpx
+
+# Add the parent directory to the Python path to allow importing from 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.activecampaign_service import ActiveCampaignClient
+
+API_URL = "https://account.api-us1.com"
+
+
+class FakeActiveCampaignServer:
+    """Serves /api/3/contacts with offset/limit pagination, optionally answering 429 first."""
+
+    def __init__(self, total: int, rate_limited: int = 0, with_total: bool = True):
+        self.contacts = [{"id": str(i), "email": f"contact{i}@test.com"} for i in range(total)]
+        self.rate_limited = rate_limited
+        self.with_total = with_total
+        self.requests: list[httpx.Request] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        if request.headers.get("Api-Token") != "key":
+            return httpx.Response(403)
+
+        if self.rate_limited:
+            self.rate_limited -= 1
+            return httpx.Response(429, headers={"Retry-After": "0"})
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        limit = int(request.url.params["limit"])
+        offset = int(request.url.params["offset"])
+        body = {"contacts": self.contacts[offset:offset + limit]}
+        if self.with_total:
+            body["meta"] = {"total": str(len(self.contacts))}
+        return httpx.Response(200, json=body)
+
+
+def client_for(server: FakeActiveCampaignServer, http_client: httpx.AsyncClient, **kwargs) -> ActiveCampaignClient:
+    return ActiveCampaignClient(http_client, api_url=API_URL, api_key="key", page_size=10, backoff_seconds=0, **kwargs)
+
+# --- Test Cases ---
+
+@pytest.mark.asyncio
+async def test_get_contacts_reads_every_page_in_order():
+    """
+    Testa que todas as páginas são lidas (e não só as primeiras 100), na ordem.
+    """
+    server = FakeActiveCampaignServer(total=95)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        contacts = await client_for(server, http_client).get_contacts()
+
+    assert [contact["id"] for contact in contacts] == [str(i) for i in range(95)]
+    assert sorted(int(r.url.params["offset"]) for r in server.requests) == list(range(0, 100, 10))
+
+@pytest.mark.asyncio
+async def test_pages_are_prefetched_with_bounded_concurrency():
+    """
+    Testa que as páginas são buscadas em paralelo sem passar do limite de requisições simultâneas.
+    """
+    server = FakeActiveCampaignServer(total=200)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        contacts = await client_for(server, http_client, max_concurrent_requests=3).get_contacts()
+
+    assert len(contacts) == 200
+    assert 1 < server.max_in_flight <= 3
+
+@pytest.mark.asyncio
+async def test_prefetched_pages_are_awaited_when_the_reader_stops():
+    """
+    Testa que as páginas já pedidas são canceladas e esperadas quando a leitura para no meio.
+    """
+    server = FakeActiveCampaignServer(total=200)
+
+    async def slow_server(request: httpx.Request) -> httpx.Response:
+        # the pages after the second are still in flight when the reader stops
+        if int(request.url.params["offset"]) > 10:
+            await asyncio.Event().wait()
+        return await server(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(slow_server)) as http_client:
+        pages = client_for(server, http_client, max_concurrent_requests=3).iter_pages("/api/3/contacts", "contacts")
+        await anext(pages)
+        await anext(pages)
+        await pages.aclose()
+
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+@pytest.mark.asyncio
+async def test_rate_limited_requests_are_retried():
+    """
+    Testa que respostas 429 são repetidas respeitando o Retry-After.
+    """
+    server = FakeActiveCampaignServer(total=5, rate_limited=2)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        contacts = await client_for(server, http_client).get_contacts()
+
+    assert len(contacts) == 5
+    assert len(server.requests) == 3
+
+@pytest.mark.asyncio
+async def test_pages_without_total_are_read_until_a_short_page():
+    """
+    Testa a paginação de endpoints que não informam o total.
+    """
+    server = FakeActiveCampaignServer(total=25, with_total=False)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        pages = [page async for page in client_for(server, http_client).iter_pages("/api/3/contacts", "contacts")]
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+
+@pytest.mark.asyncio
+async def test_errors_return_an_empty_list():
+    """
+    Testa que erros da API continuam devolvendo lista vazia, como antes.
+    """
+    server = FakeActiveCampaignServer(total=5)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        client = ActiveCampaignClient(http_client, api_url=API_URL, api_key="wrong-key")
+        assert await client.get_contacts() == []
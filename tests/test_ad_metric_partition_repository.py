@@ -0,0 +1,40 @@
+import pytest
+from unittest.mock import AsyncMock
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.repositories.ad_metric_partition import AdMetricPartitionRepository, known_partitions
+
+
+@pytest.fixture
+def mock_session():
+    session = AsyncMock(spec=AsyncSession)
+    # a real (unbound) session, so commit and rollback fire the session events
+    session.sync_session = Session()
+    known_partitions.discard("ad_metrics_2031_07")
+    yield session
+    known_partitions.discard("ad_metrics_2031_07")
+
+
+@pytest.mark.asyncio
+async def test_ensure_creates_the_partition_again_after_a_rollback(mock_session):
+    """
+    Testa que uma partição criada numa transação desfeita não fica em cache e é criada de novo.
+    """
+    repository = AdMetricPartitionRepository(mock_session)
+    date = datetime(2031, 7, 3)
+
+    await repository.ensure(date, date)
+    mock_session.sync_session.rollback()
+    assert "ad_metrics_2031_07" not in known_partitions
+
+    await repository.ensure(date, date)
+    mock_session.sync_session.commit()
+    assert "ad_metrics_2031_07" in known_partitions
+    assert mock_session.execute.await_count == 2
+
+    # committed, the next write doesn't run the CREATE TABLE again
+    await AdMetricPartitionRepository(mock_session).ensure(date, date)
+    assert mock_session.execute.await_count == 2
@@ -0,0 +1,57 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories.ad_metric import AdMetricRepository
+
+
+@pytest.fixture
+def mock_session():
+    return AsyncMock(spec=AsyncSession)
+
+
+@pytest.fixture
+def mock_rollups():
+    with patch("app.repositories.ad_metric.AdMetricRollupRepository") as rollup_repository, \
+            patch("app.repositories.ad_metric.AdMetricPartitionRepository", return_value=AsyncMock()):
+        rollups = AsyncMock()
+        rollup_repository.return_value = rollups
+        yield rollups
+
+
+@pytest.mark.asyncio
+async def test_save_refreshes_the_rollups_and_the_data_version(mock_session, mock_rollups):
+    """
+    Testa que uma métrica salva fora do refresh atualiza os rollups e a versão dos dados da integração, antes do commit.
+    """
+    date = datetime(2025, 6, 15)
+    calls = []
+    mock_rollups.refresh.side_effect = lambda *args: calls.append("rollups")
+    mock_session.execute.side_effect = lambda stmt: calls.append(str(stmt).split()[0])
+    mock_session.commit.side_effect = lambda: calls.append("commit")
+
+    metric = await AdMetricRepository(mock_session).save(1, {"ad_id": "ad1", "clicks": 3, "date": date})
+
+    assert metric.ad_id == "ad1"
+    mock_rollups.refresh.assert_awaited_once_with(["ad1"], date, date)
+
+    bump = str(mock_session.execute.await_args.args[0])
+    assert "UPDATE account_configs SET data_version=(account_configs.data_version + " in bump
+    assert "ads.integration_id" in bump
+    assert calls == ["rollups", "UPDATE", "commit"]
+
+
+@pytest.mark.asyncio
+async def test_save_without_ad_has_no_rollup_to_refresh(mock_session, mock_rollups):
+    """
+    Testa que a métrica de uma campanha (sem anúncio) é salva sem rollup nem versão para atualizar.
+    """
+    date = datetime(2025, 6, 15)
+
+    await AdMetricRepository(mock_session).save(1, {"ad_id": None, "clicks": 3, "date": date})
+
+    mock_rollups.refresh.assert_awaited_once_with([], date, date)
+    mock_session.execute.assert_not_called()
+    mock_session.commit.assert_awaited_once()
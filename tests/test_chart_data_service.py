@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from datetime import datetime, timedelta, timezone
@@ -7,7 +8,12 @@ from app.schemas.chart import PeriodSchema, ChartDataPoint
 from app.models.chart_source import SourceTable, ChartMetric
 from app.models.chart import ChartSegment
 from app.models.period import PeriodType
-from app.services.chart_data import DataService
+from app.services.chart_data import DataService, pick_rollup, group_by_date, group_by_device, aggregate_data_points, \
+    summed_metrics, combine_metrics, downsample_data_points, ad_metric_column
+from app.models.ad_metric_rollup import AdMetricRollup
+from app.repositories.ad_metric_rollup import ROLLUP_COLUMNS
+from app.utils.columnar import ColumnarDataPoints
+from app.utils.cache import MemoryCache
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.engine import Result
@@ -18,13 +24,10 @@ async def test_get_for_source_and_metric_ad_with_clicks():
     mock_session = AsyncMock(spec=AsyncSession)
 
     now = datetime.now(timezone.utc)
-    sample_metric = MagicMock()
-    sample_metric.date = now
-    sample_metric.device = DeviceType.mobile
     mock_value = 42
     mock_session.scalar.return_value = now
     mock_result = MagicMock(spec=Result)
-    mock_result.all.return_value = [(sample_metric, mock_value)]
+    mock_result.all.return_value = [(now.timestamp(), None, mock_value)]
     mock_session.execute.return_value = mock_result
 
     service = DataService(mock_session)
@@ -45,6 +48,106 @@ async def test_get_for_source_and_metric_ad_with_clicks():
     assert dp.value == 42
     assert dp.device is None  
 
+@pytest.mark.asyncio
+async def test_get_for_source_and_metric_groups_in_database():
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    now = datetime(2025, 6, 15, 10, 0, 0)
+    mock_session.scalar.return_value = now
+    bucket = datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp()
+    mock_result = MagicMock(spec=Result)
+    mock_result.all.return_value = [(bucket, DeviceType.mobile, 7), (bucket, DeviceType.desktop, 3)]
+    mock_session.execute.return_value = mock_result
+
+    service = DataService(mock_session, use_rollups=False)
+
+    result = await service.get_for_source_and_metric(
+        source_table=SourceTable.campaign,
+        source_id="camp123",
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        metric=ChartMetric.impression,
+        segment=ChartSegment.device
+    )
+
+    query = str(mock_session.execute.await_args.args[0])
+    assert "GROUP BY" in query
+    assert "device" in query.split("GROUP BY")[1]
+    assert "ad_metric_rollups" not in query
+
+    assert [(dp.date, dp.device, dp.value) for dp in result] == [
+        (datetime(2025, 6, 15), DeviceType.mobile, 7),
+        (datetime(2025, 6, 15), DeviceType.desktop, 3),
+    ]
+
+@pytest.mark.parametrize("granularity, expected", [
+    (PeriodSchema(type=PeriodType.hour, amount=1), PeriodType.hour),
+    (PeriodSchema(type=PeriodType.hour, amount=48), PeriodType.day),
+    (PeriodSchema(type=PeriodType.day, amount=3), PeriodType.day),
+    (PeriodSchema(type=PeriodType.day, amount=14), PeriodType.week),
+    (PeriodSchema(type=PeriodType.month, amount=2), PeriodType.month),
+])
+def test_pick_rollup_uses_coarsest_compatible_rollup(granularity, expected):
+    assert pick_rollup(granularity) == expected
+
+
+@pytest.mark.asyncio
+async def test_get_for_source_and_metric_reads_rollup():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+
+    mock_result = MagicMock(spec=Result)
+    mock_result.all.return_value = [(datetime(2025, 6, 9, tzinfo=timezone.utc).timestamp(), None, 70)]
+    mock_session.execute.return_value = mock_result
+
+    service = DataService(mock_session)
+
+    result = await service.get_for_source_and_metric(
+        source_table=SourceTable.campaign,
+        source_id="camp123",
+        period=PeriodSchema(type=PeriodType.month, amount=3),
+        granularity=PeriodSchema(type=PeriodType.week, amount=1),
+        metric=ChartMetric.click,
+        segment=None
+    )
+
+    query = mock_session.execute.await_args.args[0]
+    params = query.compile().params
+    assert "ad_metric_rollups.granularity" in str(query)
+    assert PeriodType.week in params.values()
+
+    assert len(result) == 1
+    assert result[0].value == 70
+
+
+@pytest.mark.asyncio
+async def test_get_for_source_and_metric_aggregates_in_python():
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    now = datetime.now(timezone.utc)
+    sample_metric = MagicMock()
+    sample_metric.date = now
+    sample_metric.device = DeviceType.mobile
+    mock_session.scalar.return_value = now
+    mock_result = MagicMock(spec=Result)
+    mock_result.all.return_value = [(sample_metric, 40), (sample_metric, 2)]
+    mock_session.execute.return_value = mock_result
+
+    service = DataService(mock_session, aggregate_in_db=False)
+
+    result = await service.get_for_source_and_metric(
+        source_table=SourceTable.ad,
+        source_id="ad123",
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        metric=ChartMetric.click,
+        segment=None
+    )
+
+    assert len(result) == 1
+    assert result[0].value == 42
+    assert result[0].device is None
+
 @pytest.mark.asyncio
 async def test_get_for_source_and_metric_campaign_no_data():
     mock_session = AsyncMock(spec=AsyncSession)
@@ -70,12 +173,9 @@ async def test_get_for_source_multiple_metrics():
 
     mock_session.scalar.return_value = now
 
-    result_data = MagicMock()
-    result_data.date = now
-    result_data.device = DeviceType.desktop
-
     result_obj = MagicMock()
-    result_obj.all.return_value = [(result_data, 100)]
+    # one column per metric, in the order they were asked
+    result_obj.all.return_value = [(now.timestamp(), None, 100, 7)]
 
     mock_session.execute.return_value = result_obj
 
@@ -94,6 +194,11 @@ async def test_get_for_source_multiple_metrics():
     for dp in result:
         assert dp.device is None
         assert dp.source_id == "adX"
+    assert {dp.metric: dp.value for dp in result} == {ChartMetric.click: 100, ChartMetric.spend: 7}
+
+    # all the metrics come from a single latest date lookup and a single scan
+    mock_session.scalar.assert_awaited_once()
+    mock_session.execute.assert_awaited_once()
 
 
 @pytest.mark.asyncio
@@ -102,11 +207,8 @@ async def test_get_for_chart_runs_all_sources():
     now = datetime.now(timezone.utc)
     mock_session.scalar.return_value = now
 
-    result_data = MagicMock()
-    result_data.date = now
-    result_data.device = DeviceType.desktop
     mock_result = MagicMock()
-    mock_result.all.return_value = [(result_data, 10)]
+    mock_result.all.return_value = [(now.timestamp(), None, 10)]
     mock_session.execute.return_value = mock_result
 
     service = DataService(mock_session)
@@ -123,4 +225,429 @@ async def test_get_for_chart_runs_all_sources():
     chart.segment = None  
 
     result = await service.get_for_chart(chart)
-    assert len(result) == 2
\ No newline at end of file
+    assert len(result) == 2
+
+@pytest.mark.asyncio
+async def test_get_for_crm_source_and_metric_counts_in_database():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+
+    bucket = datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp()
+    mock_result = MagicMock(spec=Result)
+    mock_result.all.return_value = [(bucket, 12)]
+    mock_session.execute.return_value = mock_result
+
+    service = DataService(mock_session)
+
+    result = await service.get_for_crm_source_and_metric(
+        source_table=SourceTable.crm,
+        period=PeriodSchema(type=PeriodType.month, amount=1),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        metric=ChartMetric.contact,
+    )
+
+    query = str(mock_session.execute.await_args.args[0])
+    assert "count(*)" in query
+    assert "GROUP BY" in query
+
+    assert len(result) == 1
+    assert result[0].date == datetime(2025, 6, 15)
+    assert result[0].value == 12
+    assert result[0].metric == ChartMetric.contact
+
+
+@pytest.mark.asyncio
+async def test_get_for_crm_source_and_metric_sums_deal_values():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+
+    mock_result = MagicMock(spec=Result)
+    mock_result.all.return_value = [(datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp(), 1500.5)]
+    mock_session.execute.return_value = mock_result
+
+    service = DataService(mock_session)
+
+    result = await service.get_for_crm_source_and_metric(
+        source_table=SourceTable.crm,
+        period=PeriodSchema(type=PeriodType.month, amount=1),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        metric=ChartMetric.deal_value,
+    )
+
+    query = str(mock_session.execute.await_args.args[0])
+    assert "sum(deals.value)" in query
+
+    assert result[0].value == 1500.5
+    assert result[0].metric == ChartMetric.deal_value
+
+
+@pytest.mark.asyncio
+async def test_get_for_chart_loads_each_source_in_its_own_session():
+    sessions = []
+    in_flight = {"now": 0, "max": 0}
+
+    async def slow_execute(*args, **kwargs):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        mock_result = MagicMock(spec=Result)
+        mock_result.all.return_value = [(datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp(), None, 1, 10)]
+        return mock_result
+
+    def session_factory():
+        session = AsyncMock(spec=AsyncSession)
+        session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+        session.execute.side_effect = slow_execute
+        session.__aenter__.return_value = session
+        sessions.append(session)
+        return session
+
+    chart = MagicMock(
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        segment=None,
+        sources=[
+            MagicMock(source_table=SourceTable.ad, source_id=f"ad{i}", metrics=[ChartMetric.click, ChartMetric.impression])
+            for i in range(3)
+        ],
+    )
+    shared_session = AsyncMock(spec=AsyncSession)
+
+    service = DataService(shared_session, use_rollups=False, session_factory=session_factory, max_concurrency=2)
+    result = await service.get_for_chart(chart)
+
+    assert len(result) == 6
+    assert len(sessions) == 3
+    assert all(session.execute.await_count == 1 for session in sessions)
+    shared_session.execute.assert_not_called()
+    assert in_flight["max"] == 2
+
+
+@pytest.mark.asyncio
+async def test_get_for_chart_more_concurrent_requests_than_the_pool():
+    """
+    Testa que a sessão da requisição devolve a conexão antes de abrir outras no mesmo pool, então mais
+    requisições simultâneas do que conexões terminam em vez de ficarem esperando umas pelas outras.
+    """
+    pool = asyncio.Semaphore(3)
+
+    async def checkin(*args):
+        pool.release()
+
+    async def execute(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        mock_result = MagicMock(spec=Result)
+        mock_result.all.return_value = [(datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp(), None, 1, 10)]
+        return mock_result
+
+    def session_factory():
+        session = AsyncMock(spec=AsyncSession)
+        session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+        session.execute.side_effect = execute
+
+        async def checkout():
+            await pool.acquire()
+            return session
+
+        session.__aenter__.side_effect = checkout
+        session.__aexit__.side_effect = checkin
+        return session
+
+    async def request_session():
+        # like after ChartRepository.get: a transaction is open and holds a connection until it ends
+        session = AsyncMock(spec=AsyncSession)
+        await pool.acquire()
+        session.in_transaction.return_value = True
+
+        async def commit():
+            session.in_transaction.return_value = False
+            pool.release()
+
+        session.commit.side_effect = commit
+        return session
+
+    chart = MagicMock(
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        segment=None,
+        sources=[
+            MagicMock(source_table=SourceTable.ad, source_id=f"ad{i}", metrics=[ChartMetric.click, ChartMetric.impression])
+            for i in range(3)
+        ],
+    )
+
+    async def chart_request():
+        service = DataService(
+            await request_session(), use_rollups=False, session_factory=session_factory, max_concurrency=2,
+        )
+        return await service.get_for_chart(chart)
+
+    results = await asyncio.wait_for(asyncio.gather(*(chart_request() for _ in range(8))), timeout=5)
+
+    assert all(len(result) == 6 for result in results)
+
+
+@pytest.mark.asyncio
+async def test_get_for_chart_dedupe_loads_shared_metrics_once():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+    mock_result = MagicMock(spec=Result)
+    mock_result.all.return_value = [(datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp(), None, 3, 30)]
+    mock_session.execute.return_value = mock_result
+
+    def chart(metrics):
+        return MagicMock(
+            period=PeriodSchema(type=PeriodType.day, amount=7),
+            granularity=PeriodSchema(type=PeriodType.day, amount=1),
+            segment=None,
+            sources=[MagicMock(source_table=SourceTable.ad, source_id="ad1", metrics=metrics)],
+        )
+
+    service = DataService(mock_session, use_rollups=False, dedupe=True)
+    first, second = await asyncio.gather(
+        service.get_for_chart(chart([ChartMetric.click, ChartMetric.impression])),
+        service.get_for_chart(chart([ChartMetric.click])),
+    )
+
+    # the click of the second chart comes from the query of the first one
+    mock_session.scalar.assert_awaited_once()
+    mock_session.execute.assert_awaited_once()
+    assert {dp.metric: dp.value for dp in first} == {ChartMetric.click: 3, ChartMetric.impression: 30}
+    assert [(dp.metric, dp.value) for dp in second] == [(ChartMetric.click, 3)]
+
+
+@pytest.mark.asyncio
+async def test_get_for_charts_batches_the_sources_of_every_chart():
+    mock_session = AsyncMock(spec=AsyncSession)
+    latest_result = MagicMock(spec=Result)
+    latest_result.all.return_value = [("ad1", datetime(2025, 6, 15, 10, 0, 0)), ("ad2", None)]
+    data_result = MagicMock(spec=Result)
+    # request index, bucket, device, then one column per metric of the batch
+    data_result.all.return_value = [(0, datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp(), None, 3, 30)]
+    mock_session.execute.side_effect = [latest_result, data_result]
+
+    def chart(metrics, source_ids=("ad1",)):
+        return MagicMock(
+            period=PeriodSchema(type=PeriodType.day, amount=7),
+            granularity=PeriodSchema(type=PeriodType.day, amount=1),
+            segment=None,
+            sources=[MagicMock(source_table=SourceTable.ad, source_id=source_id, metrics=metrics) for source_id in source_ids],
+        )
+
+    service = DataService(mock_session, use_rollups=False)
+    clicks, impressions = await service.get_for_charts([
+        chart([ChartMetric.click], source_ids=("ad1", "ad2")),
+        chart([ChartMetric.impression]),
+    ])
+
+    # one latest date lookup and one aggregated query for the whole dashboard
+    assert mock_session.execute.await_count == 2
+    mock_session.scalar.assert_not_called()
+    assert [(dp.source_id, dp.metric, dp.value) for dp in clicks] == [("ad1", ChartMetric.click, 3)]
+    assert [(dp.source_id, dp.metric, dp.value) for dp in impressions] == [("ad1", ChartMetric.impression, 30)]
+
+
+@pytest.mark.asyncio
+async def test_get_for_chart_cache_hit_skips_the_metric_queries():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+    versions_result = MagicMock(spec=Result)
+    versions_result.all.return_value = [("acc1", "config1", 1)]
+    data_result = MagicMock(spec=Result)
+    data_result.all.return_value = [(datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp(), None, 3)]
+    mock_session.execute.side_effect = lambda query: versions_result if "account_configs" in str(query) else data_result
+
+    chart = MagicMock(
+        account_id="acc1",
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        segment=None,
+        sources=[MagicMock(source_table=SourceTable.ad, source_id="ad1", metrics=[ChartMetric.click])],
+    )
+    service = DataService(mock_session, use_rollups=False, cache=MemoryCache())
+
+    first = await service.get_for_chart(chart)
+    second = await service.get_for_chart(chart)
+
+    assert first == second
+    mock_session.scalar.assert_awaited_once()
+
+    # a refresh bumps the data version of the integration, the cached data isn't used anymore
+    versions_result.all.return_value = [("acc1", "config1", 2)]
+    await service.get_for_chart(chart)
+
+    assert mock_session.scalar.await_count == 2
+
+
+def test_downsample_data_points_keeps_the_peaks_of_each_series():
+    start = datetime(2025, 1, 1)
+
+    def point(hour: int, value: float, source_id: str = "ad1") -> ChartDataPoint:
+        return ChartDataPoint(source_table=SourceTable.ad, source_id=source_id, date=start + timedelta(hours=hour),
+                              device=None, metric=ChartMetric.click, value=value)
+
+    long = [point(hour, 1000 if hour == 500 else hour % 7) for hour in range(1000)]
+    short = [point(hour, hour, "ad2") for hour in range(10)]
+
+    result = downsample_data_points(list(reversed(long)) + short, 50)
+    sampled = [dp for dp in result if dp.source_id == "ad1"]
+
+    assert len(sampled) == 50
+    assert [dp.date for dp in sampled] == sorted(dp.date for dp in sampled)
+    assert sampled[0] == long[0] and sampled[-1] == long[-1]
+    assert long[500] in sampled
+    # series under the limit are left whole
+    assert [dp for dp in result if dp.source_id == "ad2"] == short
+
+
+@pytest.mark.asyncio
+async def test_get_for_chart_downsamples_after_the_cache():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+    versions_result = MagicMock(spec=Result)
+    versions_result.all.return_value = [("acc1", "config1", 1)]
+    data_result = MagicMock(spec=Result)
+    data_result.all.return_value = [
+        ((datetime(2025, 6, 1, tzinfo=timezone.utc) + timedelta(days=day)).timestamp(), None, day) for day in range(10)
+    ]
+    mock_session.execute.side_effect = lambda query: versions_result if "account_configs" in str(query) else data_result
+
+    chart = MagicMock(
+        account_id="acc1",
+        period=PeriodSchema(type=PeriodType.day, amount=30),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        segment=None,
+        sources=[MagicMock(source_table=SourceTable.ad, source_id="ad1", metrics=[ChartMetric.click])],
+    )
+    service = DataService(mock_session, use_rollups=False, cache=MemoryCache())
+
+    full = await service.get_for_chart(chart)
+    downsampled = await service.get_for_chart(chart, max_points=3)
+
+    assert len(full) == 10
+    assert len(downsampled) == 3
+    assert downsampled[0] == full[0] and downsampled[-1] == full[-1]
+    mock_session.scalar.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used_and_expired_entries():
+    cache = MemoryCache(max_entries=2)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    await cache.get("a")
+    await cache.set("c", 3)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+
+    expiring = MemoryCache(ttl_seconds=0.01)
+    await expiring.set("a", [])
+    assert await expiring.get("a") == []
+    await asyncio.sleep(0.02)
+    assert await expiring.get("a") is None
+    assert len(expiring) == 0
+
+
+def test_columnar_aggregation_matches_the_per_point_functions():
+    start = datetime(2025, 6, 1)
+    dps = [
+        ChartDataPoint(source_id=f"ad{i % 3}", source_table=SourceTable.ad, value=i, date=start + timedelta(hours=i * 5),
+                       metric=[ChartMetric.click, ChartMetric.ctr][i % 2], device=[DeviceType.mobile, DeviceType.desktop][i % 4 // 2])
+        for i in range(200)
+    ]
+    granularity = PeriodSchema(type=PeriodType.day, amount=1)
+
+    def key(dp):
+        return (dp.source_id, dp.date, dp.device, dp.metric, dp.value)
+
+    for by_device in (True, False):
+        expected = group_by_date(dps, granularity)
+        points = ColumnarDataPoints.from_data_points(dps).group_by_date(granularity)
+        if not by_device:
+            expected = group_by_device(expected)
+            points = points.group_by_device()
+
+        assert sorted(map(key, points.aggregate().to_data_points())) == sorted(map(key, aggregate_data_points(expected)))
+
+
+def test_ratio_metrics_are_recomputed_from_their_summed_parts():
+    assert summed_metrics([ChartMetric.ctr, ChartMetric.click, ChartMetric.spend]) == [
+        ChartMetric.click, ChartMetric.impression, ChartMetric.spend
+    ]
+
+    date = datetime(2025, 6, 15)
+    dps = [
+        ChartDataPoint(source_id="ad1", source_table=SourceTable.ad, value=value, date=date, metric=metric, device=None)
+        for metric, value in [(ChartMetric.click, 5), (ChartMetric.impression, 200)]
+    ]
+
+    combined = combine_metrics(dps, [ChartMetric.ctr, ChartMetric.click])
+
+    # 5 clicks in 200 impressions is a 2.5% CTR, whatever the CTR of each row was
+    assert {dp.metric: dp.value for dp in combined} == {ChartMetric.ctr: 2.5, ChartMetric.click: 5}
+
+
+def test_ratio_metrics_have_no_summed_column():
+    assert ad_metric_column(ChartMetric.click, AdMetricRollup) is AdMetricRollup.clicks
+    assert "ctr" not in ROLLUP_COLUMNS
+
+    with pytest.raises(ValueError):
+        ad_metric_column(ChartMetric.ctr)
+
+
+@pytest.mark.asyncio
+async def test_get_for_source_loads_the_parts_of_ctr_in_python():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+    mock_result = MagicMock(spec=Result)
+    # each row is the AdMetric, then its clicks and impressions
+    mock_result.all.return_value = [
+        (MagicMock(date=datetime(2025, 6, 15, 8), device=DeviceType.mobile), 1, 100),
+        (MagicMock(date=datetime(2025, 6, 15, 9), device=DeviceType.desktop), 3, 100),
+    ]
+    mock_session.execute.return_value = mock_result
+
+    service = DataService(mock_session, aggregate_in_db=False)
+    result = await service.get_for_source_and_metric(
+        source_table=SourceTable.ad,
+        source_id="ad1",
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        metric=ChartMetric.ctr,
+        segment=None,
+    )
+
+    assert [(dp.metric, dp.value) for dp in result] == [(ChartMetric.ctr, 2.0)]
+
+
+@pytest.mark.asyncio
+async def test_stream_for_chart_reads_buckets_from_a_server_side_cursor():
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = datetime(2025, 6, 15, 10, 0, 0)
+    bucket = datetime(2025, 6, 15, tzinfo=timezone.utc).timestamp()
+    partitions = [[(bucket, None, 1)], [(bucket + 86400, None, 2)]]
+
+    class StreamResult:
+        async def partitions(self):
+            for rows in partitions:
+                yield rows
+
+    mock_session.stream.return_value = StreamResult()
+
+    chart = MagicMock(
+        period=PeriodSchema(type=PeriodType.day, amount=7),
+        granularity=PeriodSchema(type=PeriodType.day, amount=1),
+        segment=None,
+        sources=[MagicMock(source_table=SourceTable.ad, source_id="ad1", metrics=[ChartMetric.click])],
+    )
+    service = DataService(mock_session, use_rollups=False)
+
+    result = [dp async for dp in service.stream_for_chart(chart)]
+
+    assert [(dp.date, dp.value) for dp in result] == [(datetime(2025, 6, 15), 1), (datetime(2025, 6, 16), 2)]
+    mock_session.stream.assert_awaited_once()
+    mock_session.execute.assert_not_called()
+    assert mock_session.stream.await_args.args[0].get_execution_options()["yield_per"] > 0
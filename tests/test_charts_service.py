@@ -3,6 +3,8 @@ import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, patch, call
 import sys
 import os
+import gzip
+import json
 import uuid
 from datetime import datetime
 
@@ -11,7 +13,8 @@ from starlette import status
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.services.charts import ChartService 
+from app.services.charts import ChartService, chart_series
+from app.utils.cache import MemoryCache
 from app.models.chart import Chart, ChartSegment, ChartType
 from app.models.period import Period, PeriodType
 from app.models.chart_source import ChartSource, ChartMetric, SourceTable
@@ -26,7 +29,9 @@ from app.schemas.chart import (
     CompleteChart,
     ChartDataPoint,
     PeriodResponse,
-    SourceResponse
+    SourceResponse,
+    ChartFormat,
+    ColumnarChartResponse,
 )
 
 # --- Fixtures ---
@@ -166,7 +171,7 @@ async def test_get_chart_not_found(service, mock_chart_repository):
     mock_chart_repository.get.assert_awaited_once_with(chart_id)
 
 @pytest.mark.asyncio
-async def test_list_charts_success(service, mock_chart_repository, mock_data_service):
+async def test_list_encoded_charts_success(service, mock_chart_repository, mock_data_service):
     """Testa a listagem bem-sucedida de gráficos para uma determinada conta."""
 
     account_id = "acc123"
@@ -201,6 +206,7 @@ async def test_list_charts_success(service, mock_chart_repository, mock_data_ser
         sources=[]
     )
     mock_chart_repository.list.return_value = [mock_chart_1, mock_chart_2]
+    mock_data_service.data_versions.return_value = {account_id: {}}
 
     mock_data_points_1 = [
         ChartDataPoint(source_id="s1_c1", source_table=SourceTable.ad, value=10, date=datetime(2025, 6, 15, 11, 0, 0), metric=ChartMetric.click, device=DeviceType.desktop)
@@ -210,25 +216,41 @@ async def test_list_charts_success(service, mock_chart_repository, mock_data_ser
     ]
 
     with patch.object(service, '_make_chart_response', new_callable=AsyncMock) as mock_make_chart_response_method:
-        mock_data_service.get_for_chart.side_effect = [mock_data_points_1, mock_data_points_2]
+        mock_data_service.get_for_charts.return_value = [mock_data_points_1, mock_data_points_2]
 
         mock_make_chart_response_method.side_effect = [
             await _make_mock_chart_response_object(mock_chart_1, mock_data_points_1),
             await _make_mock_chart_response_object(mock_chart_2, mock_data_points_2)
         ]
 
-        results = await service.list_charts(account_id)
+        body, etag = await service.list_encoded_charts(account_id, None, ChartFormat.json, None)
 
         mock_chart_repository.list.assert_awaited_once_with(account_id)
         assert mock_make_chart_response_method.call_count == 2
+        assert body.encoding is None
+        results = [ChartResponse.model_validate(result) for result in json.loads(body.content)]
         assert len(results) == 2
-        assert isinstance(results[0], ChartResponse)
         assert results[0].chart.name == "Chart 1"
         assert results[0].data == mock_data_points_1
-        assert isinstance(results[1], ChartResponse)
         assert results[1].chart.name == "Chart 2"
         assert results[1].data == mock_data_points_2
 
+@pytest.mark.asyncio
+async def test_list_encoded_charts_loads_all_the_data_at_once(service, mock_chart_repository, mock_data_service):
+    """Testa que os dados de todos os gráficos são buscados numa única chamada, mantendo a ordem."""
+    charts = [MagicMock(spec=Chart, id=f"chart{i}") for i in range(3)]
+    mock_chart_repository.list.return_value = charts
+    mock_data_service.get_for_charts.return_value = [["data0"], ["data1"], ["data2"]]
+
+    with patch.object(service, '_make_chart_response', new_callable=AsyncMock) as mock_make_chart_response_method, \
+            patch.object(service, '_etag', new_callable=AsyncMock, return_value='"etag"'):
+        mock_make_chart_response_method.side_effect = lambda chart, data: (chart.id, data)
+        body, _ = await service.list_encoded_charts("acc123", None, ChartFormat.json, None)
+
+    mock_data_service.get_for_charts.assert_awaited_once_with(charts, max_points=None)
+    mock_data_service.get_for_chart.assert_not_called()
+    assert json.loads(body.content) == [["chart0", ["data0"]], ["chart1", ["data1"]], ["chart2", ["data2"]]]
+
 
 @pytest.mark.asyncio
 async def test_create_chart_success(
@@ -652,11 +674,259 @@ async def test_make_chart_response(service, mock_data_service):
 
     response = await service._make_chart_response(mock_chart)
 
-    mock_data_service.get_for_chart.assert_awaited_once_with(mock_chart)
+    mock_data_service.get_for_chart.assert_awaited_once_with(mock_chart, max_points=None)
     assert isinstance(response, ChartResponse)
     assert response.chart.id == chart_id
     assert response.chart.name == "Test Chart"
     assert response.chart.period.type == PeriodType.day
     assert response.chart.granularity.type == PeriodType.day
     assert response.chart.sources[0].metrics == [ChartMetric.click]
-    assert response.data == mock_data_points
\ No newline at end of file
+    assert response.data == mock_data_points
+
+@pytest.mark.asyncio
+async def test_get_encoded_chart_returns_304_without_loading_data(service, mock_chart_repository, mock_data_service):
+    """Testa que um If-None-Match com o ETag atual responde 304 sem consultar os dados do gráfico."""
+    chart_id = str(uuid.uuid4())
+    period = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=7)
+    granularity = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=1)
+    chart = Chart(
+        id=chart_id,
+        account_id="acc123",
+        name="Test Chart",
+        position=1,
+        type=ChartType.line,
+        period_id=period.id,
+        granularity_id=granularity.id,
+        segment=None,
+        period=period,
+        granularity=granularity,
+        sources=[ChartSource(id="source1", chart_id=chart_id, metrics=[ChartMetric.click], source_id="s1",
+                             source_table=SourceTable.ad)],
+    )
+    mock_chart_repository.get.return_value = chart
+    mock_data_service.data_versions.return_value = {"acc123": {"config1": 1}}
+    mock_data_service.get_for_chart.return_value = []
+
+    body, etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, None)
+    assert json.loads(body.content)["chart"]["id"] == chart_id
+    assert etag.startswith('"') and etag.endswith('"')
+
+    mock_data_service.get_for_chart.reset_mock()
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_encoded_chart(chart_id, f'"other", W/{etag}', ChartFormat.json, None)
+
+    assert exc_info.value.status_code == status.HTTP_304_NOT_MODIFIED
+    assert exc_info.value.headers == {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    mock_data_service.get_for_chart.assert_not_called()
+
+    # a refresh of the integration changes the ETag
+    mock_data_service.data_versions.return_value = {"acc123": {"config1": 2}}
+    _, new_etag = await service.get_encoded_chart(chart_id, etag, ChartFormat.json, None)
+    assert new_etag != etag
+
+
+def test_chart_series_groups_points_by_source_metric_and_device():
+    """Testa que os pontos viram uma série por fonte, métrica e dispositivo, com datas (epoch) e valores em ordem."""
+    def point(date, value, metric=ChartMetric.click, device=DeviceType.mobile):
+        return ChartDataPoint(source_id="s1", source_table=SourceTable.ad, value=value, date=date, metric=metric,
+                              device=device)
+
+    series = chart_series([
+        point(datetime(2025, 1, 2), 2),
+        point(datetime(2025, 1, 1), 1),
+        point(datetime(2025, 1, 1), 10, device=DeviceType.desktop),
+        point(datetime(2025, 1, 1), 100, metric=ChartMetric.spend),
+    ])
+
+    assert [(s.metric, s.device, s.dates, s.values) for s in series] == [
+        (ChartMetric.click, DeviceType.mobile, [1735689600, 1735776000], [1, 2]),
+        (ChartMetric.click, DeviceType.desktop, [1735689600], [10]),
+        (ChartMetric.spend, DeviceType.mobile, [1735689600], [100]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_encoded_chart_columnar_has_its_own_etag(service, mock_chart_repository, mock_data_service):
+    """Testa que o formato colunar devolve séries e tem um ETag diferente do formato padrão."""
+    chart_id = str(uuid.uuid4())
+    period = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=7)
+    granularity = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=1)
+    mock_chart_repository.get.return_value = Chart(
+        id=chart_id,
+        account_id="acc123",
+        name="Test Chart",
+        position=1,
+        type=ChartType.line,
+        period_id=period.id,
+        granularity_id=granularity.id,
+        segment=None,
+        period=period,
+        granularity=granularity,
+        sources=[],
+    )
+    mock_data_service.data_versions.return_value = {"acc123": {}}
+    mock_data_service.get_for_chart.return_value = [
+        ChartDataPoint(source_id="s1", source_table=SourceTable.ad, value=3, date=datetime(2025, 1, 1),
+                       metric=ChartMetric.click, device=None),
+    ]
+
+    body, etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, None)
+    columnar_body, columnar_etag = await service.get_encoded_chart(chart_id, None, ChartFormat.columnar, None)
+
+    response = ChartResponse.model_validate_json(body.content)
+    columnar = ColumnarChartResponse.model_validate_json(columnar_body.content)
+    assert columnar.chart == response.chart
+    assert [(s.source_id, s.dates, s.values) for s in columnar.series] == [("s1", [1735689600], [3])]
+    assert columnar_etag != etag
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_encoded_chart(chart_id, columnar_etag, ChartFormat.columnar, None)
+    assert exc_info.value.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.asyncio
+async def test_stream_chart_writes_the_chart_then_one_data_point_per_line(service, mock_chart_repository, mock_data_service):
+    """Testa que o streaming envia o gráfico na primeira linha e depois um ponto por linha (NDJSON)."""
+    chart_id = str(uuid.uuid4())
+    period = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=7)
+    granularity = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=1)
+    mock_chart_repository.get.return_value = Chart(
+        id=chart_id,
+        account_id="acc123",
+        name="Test Chart",
+        position=1,
+        type=ChartType.line,
+        period_id=period.id,
+        granularity_id=granularity.id,
+        segment=None,
+        period=period,
+        granularity=granularity,
+        sources=[],
+    )
+    data_points = [
+        ChartDataPoint(source_id="s1", source_table=SourceTable.ad, value=i, date=datetime(2025, 6, 15, i),
+                       metric=ChartMetric.click, device=None)
+        for i in range(3)
+    ]
+
+    async def stream_for_chart(chart):
+        for data_point in data_points:
+            yield data_point
+
+    mock_data_service.stream_for_chart = stream_for_chart
+
+    chunks = [chunk async for chunk in await service.stream_chart(chart_id)]
+    lines = "".join(chunks).splitlines()
+
+    assert json.loads(lines[0])["chart"]["id"] == chart_id
+    assert [ChartDataPoint.model_validate_json(line) for line in lines[1:]] == data_points
+
+
+@pytest.mark.asyncio
+async def test_stream_chart_not_found(service, mock_chart_repository):
+    """Testa que o 404 acontece antes de começar o streaming."""
+    mock_chart_repository.get.return_value = None
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.stream_chart("missing")
+    assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_encoded_chart_caches_the_compressed_body(
+    mock_chart_repository, mock_period_repository, mock_chart_source_repository, mock_account_service, mock_data_service
+):
+    """Testa que o corpo comprimido fica em cache pelo ETag e encoding, sem recarregar nem recomprimir os dados."""
+    service = ChartService(
+        chart_repository=mock_chart_repository,
+        period_repository=mock_period_repository,
+        chart_source_repository=mock_chart_source_repository,
+        account_service=mock_account_service,
+        data_service=mock_data_service,
+        response_cache=MemoryCache(),
+    )
+    chart_id = str(uuid.uuid4())
+    period = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=7)
+    granularity = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=1)
+    mock_chart_repository.get.return_value = Chart(
+        id=chart_id,
+        account_id="acc123",
+        name="Test Chart",
+        position=1,
+        type=ChartType.line,
+        period_id=period.id,
+        granularity_id=granularity.id,
+        segment=None,
+        period=period,
+        granularity=granularity,
+        sources=[],
+    )
+    mock_data_service.data_versions.return_value = {"acc123": {}}
+    mock_data_service.get_for_chart.return_value = [
+        ChartDataPoint(source_id="s1", source_table=SourceTable.ad, value=i, date=datetime(2025, 1, 1),
+                       metric=ChartMetric.click, device=None)
+        for i in range(100)
+    ]
+
+    body, etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, "gzip")
+    assert body.encoding == "gzip"
+    assert json.loads(gzip.decompress(body.content))["chart"]["id"] == chart_id
+
+    with patch("app.services.charts.encode_body") as mock_encode_body:
+        cached, cached_etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, "gzip")
+
+    assert (cached, cached_etag) == (body, etag)
+    mock_encode_body.assert_not_called()
+    mock_data_service.get_for_chart.assert_awaited_once()
+
+    # without an accepted encoding the same version has its own entry, and its own ETag
+    plain, plain_etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, None)
+    assert plain.encoding is None
+    assert json.loads(plain.content) == json.loads(gzip.decompress(body.content))
+    assert etag == f'{plain_etag[:-1]}-gzip"'
+
+    # any encoding of the current version is still current
+    mock_data_service.get_for_chart.reset_mock()
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_encoded_chart(chart_id, etag, ChartFormat.json, "gzip")
+    assert exc_info.value.status_code == status.HTTP_304_NOT_MODIFIED
+    assert exc_info.value.headers == {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    mock_data_service.get_for_chart.assert_not_called()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_encoded_chart(chart_id, etag, ChartFormat.json, None)
+    assert exc_info.value.headers["ETag"] == plain_etag
+
+
+@pytest.mark.asyncio
+async def test_get_encoded_chart_small_body_keeps_the_identity_etag(service, mock_chart_repository, mock_data_service):
+    """Testa que um corpo curto demais para ser comprimido sai sem encoding e com o ETag sem sufixo, no 200 e no 304."""
+    chart_id = str(uuid.uuid4())
+    period = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=7)
+    granularity = Period(id=str(uuid.uuid4()), type=PeriodType.day, amount=1)
+    mock_chart_repository.get.return_value = Chart(
+        id=chart_id,
+        account_id="acc123",
+        name="Test Chart",
+        position=1,
+        type=ChartType.line,
+        period_id=period.id,
+        granularity_id=granularity.id,
+        segment=None,
+        period=period,
+        granularity=granularity,
+        sources=[],
+    )
+    mock_data_service.data_versions.return_value = {"acc123": {}}
+    mock_data_service.get_for_chart.return_value = []
+
+    body, etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, "gzip")
+    plain, plain_etag = await service.get_encoded_chart(chart_id, None, ChartFormat.json, None)
+
+    assert body.encoding is None
+    assert (body, etag) == (plain, plain_etag)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_encoded_chart(chart_id, etag, ChartFormat.json, "gzip")
+    assert exc_info.value.status_code == status.HTTP_304_NOT_MODIFIED
+    assert exc_info.value.headers == {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
@@ -0,0 +1,120 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+from datetime import datetime
+
+# Add the parent directory to the Python path to allow importing from 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.crm import CrmService, CHECKPOINT_OVERLAP, latest_change
+from app.services.activecampaign_service import ActiveCampaignClient
+from app.repositories.account_config import AccountConfigRepository
+from app.repositories.bulk import BulkWriteResult
+from app.repositories.contact import ContactRepository
+from app.repositories.deal import DealRepository
+from app.repositories.message import MessageRepository
+from app.repositories.sync_checkpoint import SyncCheckpointRepository
+from app.models.account_config import AccountConfig
+
+# --- Fixtures ---
+
+@pytest_asyncio.fixture
+def repositories():
+    """Mocks the repositories, with an existing config and no checkpoint."""
+    account_config_repository = AsyncMock(spec=AccountConfigRepository)
+    account_config_repository.get.return_value = MagicMock(spec=AccountConfig, id="config-1")
+
+    checkpoint_repository = AsyncMock(spec=SyncCheckpointRepository)
+    checkpoint_repository.get.return_value = None
+
+    deal_repository, contact_repository, message_repository = (
+        AsyncMock(spec=DealRepository), AsyncMock(spec=ContactRepository), AsyncMock(spec=MessageRepository)
+    )
+    for repository in (deal_repository, contact_repository, message_repository):
+        repository.upsert_many.return_value = BulkWriteResult()
+
+    return {
+        "account_config_repository": account_config_repository,
+        "deal_repository": deal_repository,
+        "contact_repository": contact_repository,
+        "message_repository": message_repository,
+        "checkpoint_repository": checkpoint_repository,
+    }
+
+@pytest_asyncio.fixture
+def mock_client():
+    """Mocks the ActiveCampaign client."""
+    client = AsyncMock(spec=ActiveCampaignClient)
+    client.list_deals.return_value = [
+        {"id": "deal-1", "title": "Deal", "status": "1", "value": "100", "cdate": "2025-01-01T10:00:00-03:00",
+         "mdate": "2025-01-02T22:30:00-03:00"},
+    ]
+    client.list_contacts.return_value = []
+    client.list_messages.return_value = []
+    return client
+
+@pytest_asyncio.fixture
+def crm_service(repositories, mock_client):
+    """Provides an instance of CrmService with mocked dependencies."""
+    return CrmService(**repositories, activecampaign_client=mock_client)
+
+# --- Test Cases for fetch_new_data ---
+
+@pytest.mark.asyncio
+async def test_fetch_new_data_first_sync_fetches_everything(crm_service, repositories, mock_client):
+    """
+    Testa que, sem checkpoint, tudo é buscado e o checkpoint é gravado depois da escrita.
+    """
+    await crm_service.fetch_new_data("config-1")
+
+    mock_client.list_deals.assert_awaited_once_with(updated_after=None)
+    mock_client.list_contacts.assert_awaited_once_with(updated_after=None)
+
+    deals = repositories["deal_repository"].upsert_many.await_args.args[0]
+    assert [(deal.remote_id, deal.status, deal.value) for deal in deals] == [("deal-1", "1", 100)]
+
+    # the latest change of the deals, in the account's time zone. No contact came, so there's no checkpoint for them
+    saved = {call.args[1]: call.args[2] for call in repositories["checkpoint_repository"].save.await_args_list}
+    assert saved == {"deals": datetime(2025, 1, 2, 22, 30, 0)}
+
+@pytest.mark.asyncio
+async def test_fetch_new_data_only_fetches_changes_since_the_checkpoint(crm_service, repositories, mock_client):
+    """
+    Testa que só os registros alterados desde o checkpoint (menos a margem) são buscados.
+    """
+    checkpoint = datetime(2025, 3, 1, 12, 0, 0)
+    repositories["checkpoint_repository"].get.return_value = checkpoint
+
+    await crm_service.fetch_new_data("config-1")
+
+    mock_client.list_deals.assert_awaited_once_with(updated_after=checkpoint - CHECKPOINT_OVERLAP)
+    mock_client.list_contacts.assert_awaited_once_with(updated_after=checkpoint - CHECKPOINT_OVERLAP)
+
+@pytest.mark.asyncio
+async def test_fetch_new_data_keeps_the_checkpoint_when_the_api_fails(crm_service, repositories, mock_client):
+    """
+    Testa que um erro da API não avança o checkpoint.
+    """
+    mock_client.list_deals.side_effect = Exception("API down")
+
+    with pytest.raises(Exception):
+        await crm_service.fetch_new_data("config-1")
+
+    repositories["checkpoint_repository"].save.assert_not_called()
+
+def test_latest_change_keeps_the_time_zone_of_the_api():
+    """
+    Testa que o checkpoint é a última alteração no fuso da conta, comparando os instantes e não o texto.
+    """
+    records = [
+        {"udate": "2025-03-01T20:00:00-03:00"},
+        # later instant, even if its wall time is earlier
+        {"udate": "2025-03-01T19:30:00-04:00"},
+        {"udate": None},
+        {},
+    ]
+
+    assert latest_change(records, "udate") == datetime(2025, 3, 1, 19, 30, 0)
+    assert latest_change([], "udate") is None
@@ -0,0 +1,100 @@
+import pytest
+import pytest_asyncio
+import sys
+import os
+import httpx
+
+# Add the parent directory to the Python path to allow importing from 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.graph_api import GraphApiClient, GraphApiError
+
+BASE_URL = "https://graph.test/v22.0"
+
+
+class FakeGraphServer:
+    """Answers the async insights report endpoints like the Graph API does."""
+
+    def __init__(self, rows: list[dict], page_size: int = 2, polls_until_done: int = 2, final_status: str = "Job Completed"):
+        self.rows = rows
+        self.page_size = page_size
+        self.polls_until_done = polls_until_done
+        self.final_status = final_status
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        if request.url.params.get("access_token") != "token":
+            return httpx.Response(400, json={"error": {"message": "Invalid OAuth access token."}})
+
+        match request.method, request.url.path:
+            case "POST", "/v22.0/act_123/insights":
+                return httpx.Response(200, json={"report_run_id": "report-1"})
+            case "GET", "/v22.0/report-1":
+                self.polls_until_done -= 1
+                status = self.final_status if self.polls_until_done <= 0 else "Job Running"
+                return httpx.Response(200, json={"id": "report-1", "async_status": status})
+            case "GET", "/v22.0/report-1/insights":
+                offset = int(request.url.params.get("after", 0))
+                page = {"data": self.rows[offset:offset + self.page_size], "paging": {}}
+                if offset + self.page_size < len(self.rows):
+                    page["paging"]["next"] = str(request.url.copy_merge_params({"after": offset + self.page_size}))
+                return httpx.Response(200, json=page)
+
+        return httpx.Response(404, json={"error": {"message": "Unknown path"}})
+
+# --- Fixtures ---
+
+@pytest_asyncio.fixture
+def rows():
+    return [{"ad_id": f"ad-{i}", "clicks": str(i), "device_platform": "desktop", "date_stop": "2025-01-01"} for i in range(5)]
+
+# --- Test Cases ---
+
+@pytest.mark.asyncio
+async def test_insights_report_is_started_polled_and_paged(rows):
+    """
+    Testa o ciclo completo do relatório assíncrono: criação, polling e paginação do resultado.
+    """
+    server = FakeGraphServer(rows)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        graph = GraphApiClient("token", http_client, base_url=BASE_URL)
+
+        report_run_id = await graph.start_insights_report("123", ["ad_id", "clicks"], {"level": "ad", "time_increment": 1})
+        await graph.wait_for_report(report_run_id, poll_interval=0)
+        pages = [page async for page in graph.iter_report_pages(report_run_id)]
+
+    assert report_run_id == "report-1"
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [row["ad_id"] for page in pages for row in page] == [row["ad_id"] for row in rows]
+
+    start = server.requests[0]
+    assert start.url.params["level"] == "ad"
+    assert start.url.params["fields"] == "ad_id,clicks"
+    assert sum(1 for request in server.requests if request.url.path == "/v22.0/report-1") == 2
+
+@pytest.mark.asyncio
+async def test_wait_for_report_raises_when_the_job_fails():
+    """
+    Testa que um relatório que falha no lado da Meta gera GraphApiError.
+    """
+    server = FakeGraphServer([], polls_until_done=1, final_status="Job Failed")
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as http_client:
+        graph = GraphApiClient("token", http_client, base_url=BASE_URL)
+
+        with pytest.raises(GraphApiError):
+            await graph.wait_for_report("report-1", poll_interval=0)
+
+@pytest.mark.asyncio
+async def test_request_errors_raise_graph_api_error():
+    """
+    Testa que respostas de erro da Graph API viram GraphApiError.
+    """
+    async with httpx.AsyncClient(transport=httpx.MockTransport(FakeGraphServer([]))) as http_client:
+        graph = GraphApiClient("wrong-token", http_client, base_url=BASE_URL)
+
+        with pytest.raises(GraphApiError):
+            await graph.start_insights_report("123", ["ad_id"], {})
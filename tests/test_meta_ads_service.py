@@ -0,0 +1,230 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, patch, MagicMock
+import sys
+import os
+import threading
+import time
+import httpx
+import json
+from datetime import datetime, date
+
+# Add the parent directory to the Python path to allow importing from 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from facebook_business.adobjects.ad import Ad as SdkAd
+from facebook_business.adobjects.adsinsights import AdsInsights
+
+from app.services.facebook import MetaAdsService, insights_params
+from app.repositories.account_config import AccountConfigRepository
+from app.repositories.ad import AdRepository
+from app.repositories.ad_metric import AdMetricRepository
+from app.repositories.campaign import CampaignRepository
+from app.models.ad import Ad
+from app.models.ad_metric import DeviceType
+from app.models.campaign import Campaign
+
+
+def sdk_object(cls, data: dict):
+    obj = cls()
+    obj._set_data(data)
+    return obj
+
+# --- Fixtures ---
+
+@pytest_asyncio.fixture
+def mock_ad_metrics_repository():
+    """Mocks the AdMetricRepository dependency, with no metric stored yet."""
+    repository = AsyncMock(spec=AdMetricRepository)
+    repository.latest_dates.return_value = {}
+    return repository
+
+@pytest_asyncio.fixture
+def mock_ad_repository():
+    """Mocks the AdRepository dependency, returning the ad it was given."""
+    repository = AsyncMock(spec=AdRepository)
+    repository.create_or_update.side_effect = lambda ad: ad
+    return repository
+
+@pytest_asyncio.fixture
+def meta_ads_service(mock_ad_repository, mock_ad_metrics_repository):
+    """Provides an instance of MetaAdsService with mocked dependencies."""
+    return MetaAdsService(
+        campaign_repository=AsyncMock(spec=CampaignRepository),
+        account_config_repository=AsyncMock(spec=AccountConfigRepository),
+        ad_repository=mock_ad_repository,
+        ad_metrics_repository=mock_ad_metrics_repository,
+    )
+
+# --- Test Cases for get_insights ---
+
+@pytest.mark.asyncio
+async def test_get_insights_upserts_all_rows_at_once(meta_ads_service, mock_ad_metrics_repository):
+    """
+    Testa que os insights de um anúncio são gravados num único upsert em lote.
+    """
+    ad = MagicMock(spec=Ad, id="ad-1", remote_id="remote-ad")
+    insights = [
+        sdk_object(AdsInsights, {'ctr': '1.5', 'impressions': '100', 'reach': '80', 'clicks': '3',
+                                 'device_platform': 'mobile_app', 'date_stop': '2025-01-01'}),
+        sdk_object(AdsInsights, {'ctr': '2.0', 'impressions': '50', 'reach': '40', 'clicks': '1',
+                                 'device_platform': 'desktop', 'date_stop': '2025-01-02'}),
+    ]
+
+    with patch('app.services.facebook.Ad') as mock_sdk_ad:
+        mock_sdk_ad.return_value.get_insights.return_value = insights
+        await meta_ads_service.get_insights(ad)
+
+    mock_sdk_ad.assert_called_once_with("remote-ad")
+    mock_ad_metrics_repository.upsert_many.assert_awaited_once()
+    mock_ad_metrics_repository.create_or_update.assert_not_called()
+
+    metrics = mock_ad_metrics_repository.upsert_many.await_args.args[0]
+    assert [(m.ad_id, m.device, m.date, m.clicks) for m in metrics] == [
+        ("ad-1", DeviceType.mobile, datetime(2025, 1, 1), 3),
+        ("ad-1", DeviceType.desktop, datetime(2025, 1, 2), 1),
+    ]
+
+@pytest.mark.asyncio
+async def test_get_insights_calls_the_sdk_outside_the_event_loop(meta_ads_service):
+    """
+    Testa que a chamada bloqueante do SDK roda numa thread de trabalho e não no event loop.
+    """
+    ad = MagicMock(spec=Ad, id="ad-1", remote_id="remote-ad")
+    sdk_threads = []
+
+    def get_insights(**kwargs):
+        sdk_threads.append(threading.current_thread())
+        return []
+
+    with patch('app.services.facebook.Ad') as mock_sdk_ad:
+        mock_sdk_ad.return_value.get_insights.side_effect = get_insights
+        await meta_ads_service.get_insights(ad)
+
+    assert sdk_threads and sdk_threads[0] is not threading.main_thread()
+
+@pytest.mark.asyncio
+async def test_get_insights_requests_only_the_days_since_the_latest_metric(meta_ads_service, mock_ad_metrics_repository):
+    """
+    Testa que, com métricas já gravadas, só os dias desde a última (menos a janela de atribuição) são pedidos.
+    """
+    ad = MagicMock(spec=Ad, id="ad-1", remote_id="remote-ad")
+    mock_ad_metrics_repository.latest_dates.return_value = {"ad-1": datetime(2025, 3, 10)}
+
+    with patch('app.services.facebook.Ad') as mock_sdk_ad, patch('app.services.facebook.settings') as mock_settings:
+        mock_settings.META_ATTRIBUTION_WINDOW_DAYS = 3
+        mock_sdk_ad.return_value.get_insights.return_value = []
+        await meta_ads_service.get_insights(ad)
+
+    mock_ad_metrics_repository.latest_dates.assert_awaited_once_with(["ad-1"])
+    params = mock_sdk_ad.return_value.get_insights.call_args.kwargs['params']
+    assert 'date_preset' not in params
+    assert params['time_range'] == {'since': '2025-03-07', 'until': date.today().isoformat()}
+
+def test_insights_params_without_metrics_requests_the_last_year():
+    """
+    Testa que sem métricas gravadas o último ano inteiro é pedido.
+    """
+    params = insights_params(None)
+
+    assert params['date_preset'] == 'last_year'
+    assert 'time_range' not in params
+
+# --- Test Cases for get_ads ---
+
+@pytest.mark.asyncio
+async def test_get_ads_bounds_concurrent_graph_requests(mock_ad_repository, mock_ad_metrics_repository):
+    """
+    Testa que os insights dos anúncios são buscados em paralelo, sem passar do limite de concorrência.
+    """
+    campaign = MagicMock(spec=Campaign, id="campaign-1", remote_id="remote-campaign", integration_id="integration")
+    ads = [sdk_object(SdkAd, {'id': f'remote-ad-{i}', 'name': f'Ad {i}'}) for i in range(10)]
+    lock = threading.Lock()
+    in_flight = {'now': 0, 'max': 0}
+
+    def get_insights(**kwargs):
+        with lock:
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        time.sleep(0.02)
+        with lock:
+            in_flight['now'] -= 1
+        return []
+
+    with patch('app.services.facebook.Campaign') as mock_sdk_campaign, \
+            patch('app.services.facebook.Ad') as mock_sdk_ad, \
+            patch('app.services.facebook.settings') as mock_settings:
+        mock_sdk_campaign.return_value.get_ads.return_value = ads
+        mock_sdk_ad.Field = SdkAd.Field
+        mock_sdk_ad.return_value.get_insights.side_effect = get_insights
+        mock_settings.META_CONCURRENCY = 3
+
+        service = MetaAdsService(
+            campaign_repository=AsyncMock(spec=CampaignRepository),
+            account_config_repository=AsyncMock(spec=AccountConfigRepository),
+            ad_repository=mock_ad_repository,
+            ad_metrics_repository=mock_ad_metrics_repository,
+        )
+        await service.get_ads(campaign)
+
+    assert mock_ad_repository.create_or_update.await_count == 10
+    assert mock_ad_metrics_repository.upsert_many.await_count == 10
+    assert 1 < in_flight['max'] <= 3
+
+# --- Test Cases for get_account_insights ---
+
+@pytest.mark.asyncio
+async def test_get_account_insights_streams_the_report_into_upserts(mock_ad_metrics_repository):
+    """
+    Testa que o relatório da conta é lido página a página e gravado com upsert em lote.
+    """
+    rows = [
+        {'ad_id': 'remote-ad-1', 'clicks': '3', 'device_platform': 'mobile_app', 'date_stop': '2025-01-01'},
+        {'ad_id': 'remote-ad-2', 'clicks': '1', 'device_platform': 'desktop', 'date_stop': '2025-01-01'},
+        {'ad_id': 'deleted-ad', 'clicks': '9', 'device_platform': 'desktop', 'date_stop': '2025-01-01'},
+    ]
+    requests = []
+
+    def graph(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        match request.url.path:
+            case '/v22.0/act_123/insights':
+                return httpx.Response(200, json={'report_run_id': 'report-1'})
+            case '/v22.0/report-1':
+                return httpx.Response(200, json={'async_status': 'Job Completed'})
+            case '/v22.0/report-1/insights':
+                return httpx.Response(200, json={'data': rows, 'paging': {}})
+
+    ads = [MagicMock(spec=Ad, id=f'ad-{i}', remote_id=f'remote-ad-{i}') for i in (1, 2)]
+    mock_ad_metrics_repository.latest_dates.return_value = {'ad-1': datetime(2025, 3, 10), 'ad-2': datetime(2025, 3, 1)}
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(graph)) as http_client:
+        service = MetaAdsService(
+            campaign_repository=AsyncMock(spec=CampaignRepository),
+            account_config_repository=AsyncMock(spec=AccountConfigRepository),
+            ad_repository=AsyncMock(spec=AdRepository),
+            ad_metrics_repository=mock_ad_metrics_repository,
+            http_client=http_client,
+        )
+        with patch('app.services.graph_api.settings') as mock_settings, \
+                patch('app.services.facebook.settings') as mock_facebook_settings:
+            mock_settings.META_GRAPH_URL = 'https://graph.test/v22.0'
+            mock_settings.META_REPORT_POLL_SECONDS = 0
+            mock_settings.META_REPORT_TIMEOUT_SECONDS = 5
+            mock_facebook_settings.META_ATTRIBUTION_WINDOW_DAYS = 3
+            await service.get_account_insights('123', 'token', ads)
+
+    start = requests[0]
+    assert start.method == 'POST'
+    assert start.url.params['level'] == 'ad'
+    assert start.url.params['breakdowns'] == 'device_platform'
+    assert start.url.params['time_increment'] == '1'
+    # the report starts from the ad that is furthest behind
+    assert json.loads(start.url.params['time_range']) == {'since': '2025-02-26', 'until': date.today().isoformat()}
+
+    mock_ad_metrics_repository.upsert_many.assert_awaited_once()
+    metrics = mock_ad_metrics_repository.upsert_many.await_args.args[0]
+    assert [(m.ad_id, m.device, m.clicks) for m in metrics] == [
+        ('ad-1', DeviceType.mobile, 3),
+        ('ad-2', DeviceType.desktop, 1),
+    ]
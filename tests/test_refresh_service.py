@@ -154,6 +154,7 @@ async def test_refresh_all_configs_updated(refresh_service, mock_account_config_
             mock_account_config_repository.update.assert_any_call(config_google.id, config_google)
             mock_account_config_repository.update.assert_any_call(config_facebook.id, config_facebook)
             mock_account_config_repository.update.assert_any_call(config_crm.id, config_crm)
+            assert mock_account_config_repository.bump_data_version.await_count == 3
 
             mock_print.assert_any_call("integração com google ads chamada")
             mock_print.assert_any_call("integração com facebook ads chamada")
@@ -192,6 +193,9 @@ async def test_refresh_some_configs_skipped(refresh_service, mock_account_config
             assert config_no_refresh.last_refresh == mock_current_time
             mock_account_config_repository.update.assert_any_call(config_old.id, config_old)
             mock_account_config_repository.update.assert_any_call(config_no_refresh.id, config_no_refresh)
+            mock_account_config_repository.bump_data_version.assert_has_awaits(
+                [call(config_old.id), call(config_no_refresh.id)], any_order=True
+            )
             mock_print.assert_any_call("integração com google ads chamada")
             mock_print.assert_any_call("integração com crm chamada")
             assert call("integração com facebook ads chamada") not in mock_print.call_args_list